@@ -0,0 +1,66 @@
+import json
+import os
+import pathlib
+
+import pytest
+
+from vegetation.model.lockstep import LockstepVegetation
+from vegetation.model.tiled import TiledVegetation
+from vegetation.model.vegetation import Vegetation
+
+TEST_CONFIGS_DIR = pathlib.Path(
+    os.getenv("TEST_CONFIGS_DIR", "/workspaces/mesa_abm_poc/tests/assets/configs")
+)
+
+MODEL_CLASSES = (Vegetation, LockstepVegetation, TiledVegetation)
+CLASS_PARAMETERS = (
+    "_aoi_bounds",
+    "_attribute_encodings",
+    "_cell_attributes_to_save",
+    "_save_to_zarr",
+)
+
+
+def _load_test_config(filename, key):
+    with open(TEST_CONFIGS_DIR.joinpath(filename)) as f:
+        return json.load(f)[key]
+
+
+@pytest.fixture(autouse=True)
+def restore_class_parameters():
+    """
+    Put the model classes' class parameters back after each test - batch runs
+    in the test process set them (e.g. `_save_to_zarr`) for the whole class.
+    """
+    saved = {
+        model_cls: {
+            name: vars(model_cls)[name]
+            for name in CLASS_PARAMETERS
+            if name in vars(model_cls)
+        }
+        for model_cls in MODEL_CLASSES
+    }
+    yield
+    for model_cls, class_parameters in saved.items():
+        for name in CLASS_PARAMETERS:
+            if name in class_parameters:
+                setattr(model_cls, name, class_parameters[name])
+            elif name in vars(model_cls):
+                delattr(model_cls, name)
+
+
+@pytest.fixture
+def aoi_bounds(monkeypatch):
+    """
+    The test AOI's bounds, set on the model classes for the test only (the
+    lockstep engines are not `Vegetation` subclasses, so get their own).
+    """
+    aoi_bounds = _load_test_config("test_aoi_bounds.json", "TST_JOTR_BOUNDS")
+    for model_cls in (Vegetation, LockstepVegetation):
+        monkeypatch.setattr(model_cls, "_aoi_bounds", aoi_bounds, raising=False)
+    return aoi_bounds
+
+
+@pytest.fixture
+def attribute_encodings():
+    return _load_test_config("test_attribute_encodings.json", "VegCell")
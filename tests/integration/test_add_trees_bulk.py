@@ -0,0 +1,41 @@
+from vegetation.config.life_stages import LifeStage
+from vegetation.model.vegetation import Vegetation
+
+
+def test_add_trees_bulk_places_trees_in_cells(aoi_bounds):
+    vegetation = Vegetation(num_steps=1)
+    vegetation.space.get_elevation()
+
+    raster_layer = vegetation.space.raster_layer
+    # Centers of the top-left and bottom-right cells, and a point outside
+    top_left = raster_layer.transform * (0.5, 0.5)
+    bottom_right = raster_layer.transform * (
+        raster_layer.width - 0.5,
+        raster_layer.height - 0.5,
+    )
+    outside = raster_layer.transform * (-1.5, 0.5)
+
+    agents = vegetation.add_trees_bulk(
+        [top_left, bottom_right, outside, top_left],
+        ages=[0, 2, 10, 40],
+        parent_ids=7,
+    )
+
+    assert [agent.age for agent in agents] == [0, 2, 40]
+    assert [agent.life_stage for agent in agents] == [
+        LifeStage.SEED,
+        None,
+        LifeStage.ADULT,
+    ]
+    assert [agent.indices for agent in agents] == [
+        (0, raster_layer.height - 1),
+        (raster_layer.width - 1, 0),
+        (0, raster_layer.height - 1),
+    ]
+    assert all(agent.parent_id == 7 for agent in agents)
+
+    index = vegetation.space.cell_agent_index
+    assert index.count_in_cell((0, raster_layer.height - 1)) == 2
+    assert agents[0].intersecting_cell.indices == (0, 0)
+    # Geometries are only added to the GeoSpace when asked for
+    assert len(vegetation.space.agents) == 0
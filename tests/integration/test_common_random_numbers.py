@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from vegetation.batch.batchrunner import get_iteration_seeds
+from vegetation.model.joshua_tree_agent import JoshuaTreeAgent
+from vegetation.model.vegetation import RANDOM_STREAMS, Vegetation
+
+
+def _run_vegetation(manage_at_step=None, **kwargs):
+    vegetation = Vegetation(num_steps=6, **kwargs)
+    while vegetation.running:
+        vegetation.step()
+        if vegetation.steps == manage_at_step:
+            _plant_management_area(vegetation)
+    return vegetation
+
+
+def _plant_management_area(vegetation):
+    raster_layer = vegetation.space.raster_layer
+    corners = [
+        raster_layer.transform * (x, y)
+        for x, y in [(1, 1), (raster_layer.width - 1, 1), (raster_layer.width - 1, 4)]
+    ]
+    polygon = {"type": "Polygon", "coordinates": [corners + corners[:1]]}
+    vegetation.add_agents_from_management_draw(
+        geo_json=[{"geometry": polygon}], action="create"
+    )
+
+
+def _get_background_trees(vegetation):
+    background = RANDOM_STREAMS.index("background")
+    return sorted(
+        (agent.seed_sequence.spawn_key, agent.age, agent.life_stage, agent.indices)
+        for agent in vegetation.agents_by_type[JoshuaTreeAgent]
+        if agent.seed_sequence.spawn_key[0] == background
+    )
+
+
+@pytest.mark.usefixtures("aoi_bounds")
+def test_background_trees_ignore_management():
+    unmanaged = _run_vegetation(seed=1234)
+    managed = _run_vegetation(
+        manage_at_step=2, management_planting_density=0.001, seed=1234
+    )
+
+    assert len(managed.agents_by_type[JoshuaTreeAgent]) > len(
+        unmanaged.agents_by_type[JoshuaTreeAgent]
+    )
+    assert _get_background_trees(managed) == _get_background_trees(unmanaged)
+
+
+@pytest.mark.usefixtures("aoi_bounds")
+def test_run_is_replayed_from_its_seed():
+    first = _run_vegetation()
+    replay = _run_vegetation(seed=first.seed)
+
+    pd.testing.assert_frame_equal(
+        first.datacollector.get_model_vars_dataframe(),
+        replay.datacollector.get_model_vars_dataframe(),
+    )
+
+
+def test_iteration_seeds_are_reproducible():
+    seeds = get_iteration_seeds(42, 5)
+
+    assert get_iteration_seeds(42, 5) == seeds
+    assert get_iteration_seeds(42, 3) == seeds[:3]
+    assert len(set(seeds)) == 5
+    assert all(0 <= seed < 2**63 for seed in seeds)
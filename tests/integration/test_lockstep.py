@@ -0,0 +1,267 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+import zarr
+
+from vegetation.batch.batchrunner import jotr_lockstep_batch_run
+from vegetation.model.lockstep import LockstepVegetation
+from vegetation.model.vegetation import ZARR_FILENAME
+from vegetation.utils.spatial import coords_to_raster_pos
+
+
+def test_lockstep_writes_replicate_block_to_zarr(
+    tmp_path, monkeypatch, aoi_bounds, attribute_encodings
+):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        LockstepVegetation,
+        "_attribute_encodings",
+        attribute_encodings,
+        raising=False,
+    )
+    monkeypatch.setattr(
+        LockstepVegetation,
+        "_cell_attributes_to_save",
+        ["jotr_max_life_stage"],
+        raising=False,
+    )
+    monkeypatch.setattr(LockstepVegetation, "_save_to_zarr", True, raising=False)
+
+    n_replicates, num_steps = 3, 4
+    vegetation = LockstepVegetation(
+        n_replicates=n_replicates,
+        num_steps=num_steps,
+        simulation_name="pytest",
+        seed=0,
+    )
+    while vegetation.running:
+        vegetation.step()
+
+    trees = vegetation.trees
+    expected_max_life_stages = np.full(
+        (n_replicates, vegetation.width, vegetation.height), -1, dtype=np.int8
+    )
+    for replicate, x, y, life_stage in zip(
+        trees["replicate"], trees["cell_x"], trees["cell_y"], trees["life_stage"]
+    ):
+        expected_max_life_stages[replicate, x, y] = max(
+            expected_max_life_stages[replicate, x, y], life_stage
+        )
+    np.testing.assert_array_equal(vegetation.max_life_stages, expected_max_life_stages)
+
+    sim_group = zarr.open_group(ZARR_FILENAME, mode="r")["pytest"]
+    max_life_stages = sim_group["jotr_max_life_stage"]
+    assert max_life_stages.shape == (
+        n_replicates,
+        num_steps + 1,
+        vegetation.width,
+        vegetation.height,
+    )
+    np.testing.assert_array_equal(
+        max_life_stages[:, num_steps], expected_max_life_stages
+    )
+    assert (
+        sim_group["jotr_max_life_stage_n_replicates_reached"].attrs["n_replicates"]
+        == n_replicates
+    )
+
+    df = vegetation.get_dataframe()
+    assert len(df) == n_replicates * num_steps
+    assert (
+        df["replicate_idx"].tolist()
+        == np.repeat(np.arange(n_replicates), num_steps).tolist()
+    )
+    last_step = df[df["Step"] == num_steps]
+    assert (
+        last_step["N Agents"].tolist()
+        == np.bincount(trees["replicate"], minlength=n_replicates).tolist()
+    )
+
+
+def test_lockstep_is_reproducible_from_seed(aoi_bounds):
+    dfs = []
+    for __run in range(2):
+        vegetation = LockstepVegetation(n_replicates=2, num_steps=8, seed=42)
+        while vegetation.running:
+            vegetation.step()
+        dfs.append(vegetation.get_dataframe())
+
+    pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_lockstep_batch_run_matches_batch_run_layout(aoi_bounds):
+    results = jotr_lockstep_batch_run(
+        LockstepVegetation,
+        model_parameters={
+            "num_steps": [3],
+            "management_planting_density": [0.1, 0.2],
+        },
+        class_parameters_dict={
+            "aoi_bounds": aoi_bounds,
+            "attribute_encodings": None,
+            "cell_attributes_to_save": None,
+        },
+        iterations=2,
+        data_collection_period=1,
+        display_progress=False,
+    )
+
+    assert list(results.columns[:6]) == [
+        "RunId",
+        "iteration",
+        "num_steps",
+        "management_planting_density",
+        "seed",
+        "Step",
+    ]
+    # Every combination simulates the same replicates
+    assert results["seed"].nunique() == 1
+    assert len(results) == 2 * 2 * 3
+    runs = results.groupby("RunId")[["iteration", "management_planting_density"]]
+    assert runs.first().to_dict("index") == {
+        0: {"iteration": 0, "management_planting_density": 0.1},
+        1: {"iteration": 0, "management_planting_density": 0.2},
+        2: {"iteration": 1, "management_planting_density": 0.1},
+        3: {"iteration": 1, "management_planting_density": 0.2},
+    }
+
+
+def test_raster_dispersal_places_seeds_around_adults(aoi_bounds):
+    n_replicates = 40
+    vegetation = LockstepVegetation(
+        n_replicates=n_replicates, num_steps=1, seed=0, dispersal_mode="raster"
+    )
+    vegetation._on_start()
+    vegetation._keep_trees(np.zeros(len(vegetation.trees["age"]), dtype=bool))
+    center = vegetation._transform * (vegetation.width / 2, vegetation.height / 2)
+    vegetation.add_trees([center], ages=40)
+    adult_x_utm, adult_y_utm = (
+        vegetation.trees["x_utm"][0],
+        vegetation.trees["y_utm"][0],
+    )
+
+    vegetation.step()
+
+    trees = vegetation.trees
+    is_seed = trees["age"] == 0
+    n_survivors = (~is_seed).sum()
+    assert 0 < n_survivors <= n_replicates
+    # 100 expected seeds per adult, none of which leave the raster
+    assert is_seed.sum() / n_survivors == pytest.approx(100, rel=0.1)
+    # Within the dispersal distance of the adult, give or take a cell diagonal
+    # (~40 m) either side
+    distances = np.hypot(
+        trees["x_utm"][is_seed] - adult_x_utm, trees["y_utm"][is_seed] - adult_y_utm
+    )
+    assert distances.max() < 30 + 2 * 40
+    assert vegetation.step_profiler.get_dataframe()["n_raster_dispersals"].sum() == 1
+
+
+def test_dense_cells_switch_to_cohorts_and_back(aoi_bounds):
+    vegetation = LockstepVegetation(
+        n_replicates=4, num_steps=8, seed=0, cohort_density_threshold=20
+    )
+    while vegetation.running:
+        vegetation.step()
+
+    trees, cohorts = vegetation.trees, vegetation.cohorts
+    cohort_cells = vegetation.cohort_cells
+    assert cohort_cells.any()
+    assert not cohort_cells[trees["replicate"], trees["cell_x"], trees["cell_y"]].any()
+    assert cohort_cells[
+        cohorts["replicate"], cohorts["cell_x"], cohorts["cell_y"]
+    ].all()
+
+    n_live = len(trees["age"]) + cohorts["count"].sum()
+    df = vegetation.get_dataframe()
+    assert df.groupby("iteration")["N Agents"].last().sum() == n_live
+
+    # Released cohorts become trees of the same stages and ages, in their cell
+    stage_ages = sorted(
+        zip(
+            np.repeat(cohorts["life_stage"], cohorts["count"]),
+            np.repeat(cohorts["age"], cohorts["count"]),
+        )
+    )
+    n_trees = len(trees["age"])
+    vegetation.release_cohorts(*np.nonzero(cohort_cells))
+
+    assert len(vegetation.cohorts["age"]) == 0
+    assert not vegetation.cohort_cells.any()
+    released = {field: values[n_trees:] for field, values in vegetation.trees.items()}
+    assert sorted(zip(released["life_stage"], released["age"])) == stage_ages
+    cell_xs, cell_ys = coords_to_raster_pos(
+        vegetation._transform,
+        vegetation.height,
+        *vegetation._utm_to_wgs84.transform(released["x_utm"], released["y_utm"]),
+    )
+    np.testing.assert_array_equal(cell_xs, released["cell_x"])
+    np.testing.assert_array_equal(cell_ys, released["cell_y"])
+
+
+def test_climate_drivers_modify_germination_each_step(tmp_path, aoi_bounds):
+    # Germination all but stops in a dry first year, and all seeds germinate
+    # in a wet second one
+    transition_rates_path = tmp_path / "transition_rates.json"
+    transition_rates_path.write_text(
+        json.dumps(
+            {
+                "germination_rate": 0.5,
+                "survival_rates": {"SEEDLING": 0.38, "JUVENILE": 0.975, "ADULT": 0.97},
+                "modifiers": [
+                    {
+                        "rate": "germination",
+                        "covariate": "precipitation",
+                        "coefficient": 1.0,
+                    }
+                ],
+            }
+        )
+    )
+    min_lon, min_lat, max_lon, max_lat = aoi_bounds
+    precipitation_path = str(tmp_path / "precipitation.tif")
+    with rasterio.open(
+        precipitation_path,
+        "w",
+        driver="GTiff",
+        width=4,
+        height=4,
+        count=2,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=rasterio.transform.from_bounds(
+            min_lon - 0.01, min_lat - 0.01, max_lon + 0.01, max_lat + 0.01, 4, 4
+        ),
+    ) as dataset:
+        dataset.write(np.stack([np.full((4, 4), -50.0), np.full((4, 4), 50.0)]))
+
+    vegetation = LockstepVegetation(
+        n_replicates=2,
+        num_steps=2,
+        seed=0,
+        transition_rates_path=transition_rates_path,
+        climate_driver_paths={"precipitation": precipitation_path},
+    )
+    vegetation._on_start()
+    center = vegetation._transform * (vegetation.width / 2, vegetation.height / 2)
+    vegetation.add_trees([center] * 5, ages=40)
+    vegetation.step()
+    vegetation.step()
+
+    df = vegetation.get_dataframe()
+    first_year, second_year = df[df["Step"] == 1], df[df["Step"] == 2]
+    assert (first_year["N Seeds"] > 100).all()
+    assert (first_year["N Seedlings"] == 0).all()
+    assert (
+        second_year["N Seedlings"].to_numpy() >= first_year["N Seeds"].to_numpy()
+    ).all()
+    profile = vegetation.step_profiler.get_dataframe()
+    assert "time_climate" in profile.columns
+    assert profile["n_climate_prefetch_misses"].iat[0] == 1
+    assert vegetation.climate_drivers is None
+
+    with pytest.raises(ValueError, match="climate_driver_paths"):
+        LockstepVegetation(n_replicates=1, transition_rates_path=transition_rates_path)
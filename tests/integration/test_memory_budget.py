@@ -0,0 +1,71 @@
+import pytest
+
+from vegetation.config.life_stages import LifeStage
+from vegetation.model.joshua_tree_agent import JoshuaTreeAgent
+from vegetation.model.vegetation import Vegetation
+from vegetation.utils.memory import MEMORY_REPORTERS, MemoryBudgetExceededError
+
+pytestmark = pytest.mark.usefixtures("aoi_bounds")
+
+
+def _make_vegetation_with_dead_tree(**kwargs):
+    vegetation = Vegetation(num_steps=1, **kwargs)
+    vegetation.space.get_elevation()
+
+    center = vegetation.space.raster_layer.transform * (0.5, 0.5)
+    agents = vegetation.add_trees_bulk([center, center, center], ages=[0, 40, 40])
+    agents[0]._die(survival_rate=0.0)
+    # Normally counted by `update_metrics`, which needs refugia from `_on_start`
+    vegetation.n_dead = 1
+    return vegetation
+
+
+def test_memory_budget_compacts_dead_agents():
+    # Any process is over a 1 MB budget, so every check compacts
+    vegetation = _make_vegetation_with_dead_tree(memory_budget_mb=1)
+    tracker = vegetation.memory_tracker
+
+    tracker.check_budget(vegetation, JoshuaTreeAgent)
+
+    trees = vegetation.agents_by_type[JoshuaTreeAgent]
+    assert len(trees) == 2
+    assert all(agent.life_stage == LifeStage.ADULT for agent in trees)
+    assert tracker.last_sample["agents_mb"] > 0
+    assert tracker.last_sample["cell_agent_index_mb"] > 0
+
+    # Nothing left to drop on the next check
+    with pytest.raises(MemoryBudgetExceededError, match="Memory Agents"):
+        tracker.check_budget(vegetation, JoshuaTreeAgent)
+
+    reporters = vegetation.datacollector.model_reporters
+    assert set(MEMORY_REPORTERS) <= set(reporters)
+    assert reporters["N Dead Agents"](vegetation) == 0
+
+
+def test_memory_budget_raise_keeps_agents():
+    vegetation = _make_vegetation_with_dead_tree(
+        memory_budget_mb=1, memory_budget_action="raise"
+    )
+
+    with pytest.raises(MemoryBudgetExceededError, match="N Dead Agents: 1"):
+        vegetation.memory_tracker.check_budget(vegetation, JoshuaTreeAgent)
+
+    assert len(vegetation.agents_by_type[JoshuaTreeAgent]) == 3
+
+
+def test_memory_tracking_is_off_by_default():
+    vegetation = _make_vegetation_with_dead_tree()
+
+    assert vegetation.memory_tracker is None
+    assert not set(MEMORY_REPORTERS) & set(vegetation.datacollector.model_reporters)
+
+
+def test_only_live_trees_are_counted_as_stepped():
+    vegetation = _make_vegetation_with_dead_tree()
+    vegetation._on_start()
+    n_live_trees = len(vegetation.agents_by_type[JoshuaTreeAgent]) - 1
+
+    vegetation.step()
+
+    profile = vegetation.step_profiler.get_dataframe()
+    assert profile["n_agents_stepped"].iat[0] == n_live_trees
@@ -0,0 +1,26 @@
+import numpy as np
+
+from vegetation.config.life_stages import LifeStage
+from vegetation.model.vegetation import Vegetation
+from vegetation.viz.simple_raster_map import LifeStageRasterRenderer, _rgba_to_uint8
+
+
+def test_vectorized_render_matches_cell_portrayal(aoi_bounds):
+    vegetation = Vegetation(num_steps=1)
+    vegetation.space.get_elevation()
+    vegetation.space.get_refugia_status()
+
+    raster_layer = vegetation.space.raster_layer
+    rng = np.random.default_rng(0)
+    for cell in raster_layer:
+        cell.jotr_max_life_stage = rng.choice(
+            [None, LifeStage.DEAD, LifeStage.SEED, LifeStage.ADULT]
+        )
+
+    renderer = LifeStageRasterRenderer()
+    rgba = renderer.render_rgba(raster_layer, vegetation)
+
+    expected = raster_layer.to_image(
+        colormap=lambda cell: _rgba_to_uint8(renderer(cell))
+    ).values
+    np.testing.assert_array_equal(np.moveaxis(rgba, -1, 0), expected)
@@ -0,0 +1,48 @@
+import threading
+
+import numpy as np
+import pytest
+
+from vegetation.model.vegetation import Vegetation
+from vegetation.viz.simulation_runner import BackgroundSimulationRunner
+
+
+@pytest.fixture
+def vegetation_model(aoi_bounds):
+    return Vegetation(num_steps=3)
+
+
+def test_runner_steps_in_background_and_publishes_snapshots(vegetation_model):
+    runner = BackgroundSimulationRunner(vegetation_model)
+
+    snapshots = []
+    published = threading.Event()
+
+    def on_snapshot(snapshot):
+        snapshots.append(snapshot)
+        if snapshot.step == 2:
+            published.set()
+
+    runner.subscribe(on_snapshot)
+    actions_run_at_step = []
+    runner.submit(lambda model: actions_run_at_step.append(model.steps))
+    runner.step(2)
+    runner.start()
+
+    assert published.wait(timeout=60)
+    runner.stop(timeout=60)
+
+    assert runner.error is None
+    assert actions_run_at_step == [0]
+    assert [snapshot.step for snapshot in snapshots] == [0, 1, 2]
+
+    latest = runner.latest_snapshot
+    assert latest.running
+    assert [row["Step"] for row in latest.model_vars] == [1, 2]
+    assert latest.max_life_stage.shape == latest.elevation.shape
+    assert not latest.max_life_stage.flags.writeable
+    np.testing.assert_array_equal(
+        latest.max_life_stage, vegetation_model.space.get_max_life_stage_raster()
+    )
+    # Static rasters are shared rather than copied into every snapshot
+    assert snapshots[0].elevation is latest.elevation
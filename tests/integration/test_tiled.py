@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vegetation.model.tiled import TiledVegetation
+
+
+def _run_tiled(**kwargs):
+    vegetation = TiledVegetation(num_steps=6, seed=0, **kwargs)
+    while vegetation.running:
+        vegetation.step()
+    return vegetation
+
+
+def test_tiles_keep_their_own_trees(aoi_bounds):
+    vegetation = _run_tiled(n_tiles=3)
+
+    expected_max_life_stages = np.full(
+        (1, vegetation.width, vegetation.height), -1, dtype=np.int8
+    )
+    n_trees = 0
+    for tile in vegetation._tiles:
+        trees = tile.trees
+        assert (trees["cell_x"] >= tile.x_start).all()
+        assert (trees["cell_x"] < tile.x_stop).all()
+        np.maximum.at(
+            expected_max_life_stages[0],
+            (trees["cell_x"], trees["cell_y"]),
+            trees["life_stage"],
+        )
+        n_trees += len(trees["age"])
+
+    np.testing.assert_array_equal(vegetation.max_life_stages, expected_max_life_stages)
+    df = vegetation.get_dataframe()
+    assert df["N Agents"].iat[-1] == n_trees
+    # Seeds crossed tile edges
+    assert vegetation.step_profiler.get_dataframe()["n_seeds_created"].sum() > 0
+
+
+def test_tiles_in_worker_processes_match_in_process_tiles(aoi_bounds):
+    in_process = _run_tiled(n_tiles=3, number_processes=1)
+    in_workers = _run_tiled(n_tiles=3, number_processes=2)
+
+    pd.testing.assert_frame_equal(
+        in_process.get_dataframe(), in_workers.get_dataframe()
+    )
+    np.testing.assert_array_equal(
+        in_process.max_life_stages, in_workers.max_life_stages
+    )
+    assert in_workers._workers is None
+
+
+def test_more_tiles_than_columns_raises(aoi_bounds):
+    vegetation = TiledVegetation(num_steps=1, n_tiles=10_000)
+
+    with pytest.raises(ValueError, match="raster columns"):
+        vegetation.step()
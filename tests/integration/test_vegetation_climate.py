@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import rasterio
+
+from vegetation.model.vegetation import Vegetation
+
+
+def test_climate_drivers_are_profiled_each_step(tmp_path, aoi_bounds):
+    transition_rates_path = tmp_path / "transition_rates.json"
+    transition_rates_path.write_text(
+        json.dumps(
+            {
+                "germination_rate": 0.5,
+                "survival_rates": {"SEEDLING": 0.38, "JUVENILE": 0.975, "ADULT": 0.97},
+                "modifiers": [
+                    {
+                        "rate": "survival",
+                        "life_stages": ["ADULT"],
+                        "covariate": "temperature",
+                        "coefficient": 1.0,
+                    }
+                ],
+            }
+        )
+    )
+    min_lon, min_lat, max_lon, max_lat = aoi_bounds
+    temperature_path = str(tmp_path / "temperature.tif")
+    with rasterio.open(
+        temperature_path,
+        "w",
+        driver="GTiff",
+        width=3,
+        height=3,
+        count=3,
+        dtype="float32",
+        crs="EPSG:4326",
+        transform=rasterio.transform.from_bounds(
+            min_lon - 0.01, min_lat - 0.01, max_lon + 0.01, max_lat + 0.01, 3, 3
+        ),
+    ) as dataset:
+        dataset.write(np.stack([np.full((3, 3), value) for value in [-20, 0, 20]]))
+
+    vegetation = Vegetation(
+        num_steps=3,
+        seed=0,
+        transition_rates_path=transition_rates_path,
+        climate_driver_paths={"temperature": temperature_path},
+        ignore_zarr_warning=True,
+        ignore_attribute_encodings_warning=True,
+    )
+    vegetation.step()
+    # Closed once the run ends
+    climate_drivers = vegetation.climate_drivers
+    while vegetation.running:
+        vegetation.step()
+
+    profile = vegetation.step_profiler.get_dataframe()
+    assert "time_climate" in profile.columns
+    # The first step always waits on its read
+    assert profile["n_climate_prefetch_misses"].iat[0] == 1
+    assert (
+        profile["n_climate_prefetch_misses"].sum() == climate_drivers.n_prefetch_misses
+    )
+    assert vegetation.climate_drivers is None
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from vegetation.space.cell_agent_index import CellAgentIndex
+
+
+def make_agent(unique_id, indices=None):
+    return SimpleNamespace(unique_id=unique_id, indices=indices)
+
+
+def test_add_remove_and_move_agents():
+    index = CellAgentIndex(width=4, height=3)
+    agents = [make_agent(unique_id) for unique_id in range(3)]
+
+    index.add(agents[0], (1, 2))
+    index.add(agents[1], (1, 2))
+    index.add(agents[2], (3, 0))
+    assert len(index) == 3
+    assert [agent.unique_id for agent in index.agents_in_cell((1, 2))] == [0, 1]
+
+    # Re-adding an agent moves it rather than duplicating it
+    index.add(agents[1], (3, 0))
+    assert list(index.agents_in_cell((1, 2))) == [agents[0]]
+    assert index.count_in_cell((3, 0)) == 2
+    assert len(index) == 3
+
+    index.remove(agents[0])
+    index.remove(agents[0])
+    assert agents[0] not in index
+    assert index.count_in_cell((1, 2)) == 0
+    assert list(index.agents_in_cell((1, 2))) == []
+
+    with pytest.raises(ValueError):
+        index.add(agents[0], (4, 0))
+
+
+def test_neighborhood_queries_and_count_raster():
+    index = CellAgentIndex(width=4, height=3)
+    index.rebuild(
+        [
+            make_agent(0, (0, 0)),
+            make_agent(1, (1, 1)),
+            make_agent(2, (1, 1)),
+            make_agent(3, (2, 2)),
+            make_agent(4, (3, 2)),
+        ]
+    )
+
+    assert index.count_in_neighborhood((0, 0), radius=1) == 3
+    assert index.count_in_neighborhood((0, 0), radius=1, include_center=False) == 2
+    assert index.count_in_neighborhood((1, 2), radius=1, moore=False) == 3
+    assert {
+        agent.unique_id for agent in index.iter_agents_in_neighborhood((3, 2), radius=1)
+    } == {3, 4}
+
+    # (height, width), north up - y counts up from the bottom row
+    np.testing.assert_array_equal(
+        index.get_count_raster(),
+        [
+            [0, 0, 1, 1],
+            [0, 2, 0, 0],
+            [1, 0, 0, 0],
+        ],
+    )
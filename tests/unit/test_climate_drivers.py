@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+import rasterio
+import zarr
+from affine import Affine
+
+from vegetation.space.climate_drivers import ClimateDriverStack
+
+# Study area grid of 6 x 4 cells of 0.01 degrees, and climate rasters at
+# twice its resolution (0.02 degrees) covering it
+GRID_TRANSFORM = Affine(0.01, 0, -116.4, 0, -0.01, 34.1)
+GRID_WIDTH, GRID_HEIGHT = 6, 4
+DRIVER_TRANSFORM = Affine(0.02, 0, -116.4, 0, -0.02, 34.1)
+N_TIMESTEPS = 5
+
+
+def _get_driver_values():
+    # (time, row, col) - each timestep adds 100, each row 10 and each column 1
+    times, rows, cols = np.meshgrid(
+        np.arange(N_TIMESTEPS), np.arange(2), np.arange(3), indexing="ij"
+    )
+    return (100 * times + 10 * rows + cols).astype(np.float32)
+
+
+def _write_geotiff_stack(path, values):
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=values.shape[2],
+        height=values.shape[1],
+        count=values.shape[0],
+        dtype=values.dtype,
+        crs="EPSG:4326",
+        transform=DRIVER_TRANSFORM,
+    ) as dataset:
+        dataset.write(values)
+
+
+def _write_zarr_stack(path, values):
+    array = zarr.open_array(path, mode="w", shape=values.shape, dtype=values.dtype)
+    array[:] = values
+    array.attrs["transform"] = list(DRIVER_TRANSFORM)[:6]
+    array.attrs["crs"] = "EPSG:4326"
+
+
+def _expected_raster(timestep_idx):
+    # Each climate cell covers 2 x 2 grid cells - in cells[x][y] order, y up
+    values = _get_driver_values()[timestep_idx]
+    north_up = np.repeat(np.repeat(values, 2, axis=0), 2, axis=1)
+    return north_up[::-1].T
+
+
+@pytest.mark.parametrize("extension", [".tif", ".zarr"])
+def test_drivers_are_resampled_onto_the_grid(tmp_path, extension):
+    path = str(tmp_path / f"precipitation{extension}")
+    if extension == ".tif":
+        _write_geotiff_stack(path, _get_driver_values())
+    else:
+        _write_zarr_stack(path, _get_driver_values())
+
+    climate_drivers = ClimateDriverStack(
+        {"precipitation": path},
+        transform=GRID_TRANSFORM,
+        width=GRID_WIDTH,
+        height=GRID_HEIGHT,
+        crs="EPSG:4326",
+        resampling="nearest",
+    )
+    assert climate_drivers.n_timesteps == N_TIMESTEPS
+
+    for step in range(1, N_TIMESTEPS + 1):
+        rasters = climate_drivers.get_rasters(step)
+        assert rasters["precipitation"].shape == (GRID_WIDTH, GRID_HEIGHT)
+        np.testing.assert_array_equal(
+            rasters["precipitation"], _expected_raster(step - 1)
+        )
+
+    with pytest.raises(ValueError, match="steps 1 to 5"):
+        climate_drivers.get_rasters(N_TIMESTEPS + 1)
+    climate_drivers.close()
+
+
+def test_next_step_is_prefetched(tmp_path):
+    path = str(tmp_path / "temperature.tif")
+    _write_geotiff_stack(path, _get_driver_values())
+    climate_drivers = ClimateDriverStack(
+        {"temperature": path},
+        transform=GRID_TRANSFORM,
+        width=GRID_WIDTH,
+        height=GRID_HEIGHT,
+        crs="EPSG:4326",
+    )
+
+    climate_drivers.get_rasters(1)
+    assert list(climate_drivers._pending) == [1]
+    climate_drivers._pending[1].result()
+    climate_drivers.get_rasters(2)
+    assert (climate_drivers.n_prefetch_hits, climate_drivers.n_prefetch_misses) == (
+        1,
+        1,
+    )
+
+    # Skipping ahead drops the stale prefetch
+    climate_drivers.get_rasters(4)
+    assert list(climate_drivers._pending) == [4]
+    climate_drivers.close()
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vegetation.batch.batchrunner import jotr_batch_run
+from vegetation.batch.convergence import (
+    ConvergenceCriteria,
+    get_max_cell_probability_half_width,
+    get_reporter_intervals,
+)
+from vegetation.utils.datacollector import ColumnarDataCollector
+
+
+class NoisyModel:
+    """Reports a constant plus noise of a given scale - no landscape needed."""
+
+    def __init__(self, noise, num_steps=2, seed=None):
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.num_steps = num_steps
+        self.steps = 0
+        self.running = True
+        self.value = 0.0
+        self.datacollector = ColumnarDataCollector({"Value": "value"})
+
+    @classmethod
+    def set_aoi_bounds(cls, aoi_bounds):
+        cls._aoi_bounds = aoi_bounds
+
+    def step(self):
+        self.steps += 1
+        self.value = 10 + self.noise * self.rng.normal()
+        self.datacollector.collect(self)
+        self.running = self.steps < self.num_steps
+
+
+def test_reporter_intervals_use_t_distribution():
+    final_values = pd.DataFrame({"a": [1.0, 2.0, 3.0, 4.0]})
+
+    intervals = get_reporter_intervals(final_values, confidence=0.95)
+
+    # t(0.975, 3) = 3.182, sd = 1.291
+    assert intervals.loc["a", "mean"] == 2.5
+    assert intervals.loc["a", "half_width"] == pytest.approx(
+        3.182446 * 1.290994 / 2, rel=1e-5
+    )
+    assert np.isinf(get_reporter_intervals(final_values[:1]).loc["a", "half_width"])
+
+
+def test_cell_probability_half_width_is_never_zero():
+    never_reached = np.zeros((20, 3, 4), dtype=bool)
+    half_reached = np.zeros((20, 3, 4), dtype=bool)
+    half_reached[:10, 0, 0] = True
+
+    never_reached_half_width = get_max_cell_probability_half_width(never_reached)
+    half_reached_half_width = get_max_cell_probability_half_width(half_reached)
+    assert 0 < never_reached_half_width < half_reached_half_width
+    assert half_reached_half_width == pytest.approx(0.2, abs=0.02)
+
+
+def test_sequential_batch_run_stops_converged_combinations():
+    convergence = ConvergenceCriteria(
+        reporters=("Value",), relative_precision=0.01, min_iterations=3, wave_size=2
+    )
+
+    results = jotr_batch_run(
+        NoisyModel,
+        model_parameters={"noise": [0.0, 5.0]},
+        class_parameters_dict={
+            "aoi_bounds": None,
+            "attribute_encodings": None,
+            "cell_attributes_to_save": None,
+        },
+        iterations=9,
+        data_collection_period=1,
+        display_progress=False,
+        convergence=convergence,
+        seed=0,
+    )
+
+    status = results.attrs["convergence"].set_index("noise")
+    assert status.loc[0.0, "n_iterations"] == 3
+    assert status.loc[0.0, "converged"]
+    assert status.loc[5.0, "n_iterations"] == 9
+    assert not status.loc[5.0, "converged"]
+
+    # Run ids match a fixed-size batch run of the iterations that did run
+    run_ids = results.groupby(["noise", "iteration"])["RunId"].first()
+    assert run_ids.loc[0.0].tolist() == [0, 2, 4]
+    assert run_ids.loc[5.0].tolist() == [2 * i + 1 for i in range(9)]
+    assert len(results) == 2 * (3 + 9)
@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from vegetation.utils.datacollector import ColumnarDataCollector
+
+
+def test_columns_grow_and_widen():
+    datacollector = ColumnarDataCollector(
+        model_reporters={
+            "N Agents": "n_agents",
+            "Mean Age": "mean_age",
+            "replicate_idx": "replicate_idx",
+            "Doubled": lambda model: model.n_agents * 2,
+        },
+        n_rows=2,
+    )
+
+    for step, (n_agents, mean_age) in enumerate([(3, 1), (5, 2.5), (8, np.nan)], 1):
+        model = SimpleNamespace(
+            steps=step, n_agents=n_agents, mean_age=mean_age, replicate_idx=None
+        )
+        datacollector.collect(model)
+
+    assert len(datacollector) == 3
+    model_vars = datacollector.model_vars
+    assert model_vars["N Agents"].dtype == np.int64
+    # First value was an int, widened to float once a float came in
+    assert model_vars["Mean Age"].dtype == np.float64
+    np.testing.assert_array_equal(model_vars["Mean Age"], [1.0, 2.5, np.nan])
+    assert model_vars["replicate_idx"].tolist() == [None, None, None]
+    assert model_vars["Doubled"].tolist() == [6, 10, 16]
+
+    df = datacollector.get_model_vars_dataframe()
+    assert list(df.columns) == ["N Agents", "Mean Age", "replicate_idx", "Doubled"]
+    assert len(df) == 3
+
+
+def test_get_dataframe_broadcasts_constant_columns():
+    datacollector = ColumnarDataCollector(model_reporters={"N Agents": "n_agents"})
+    for step in range(1, 5):
+        datacollector.collect(SimpleNamespace(steps=step, n_agents=step * 10))
+
+    df = datacollector.get_dataframe(
+        rows=[0, 3], constant_columns={"RunId": 2, "num_steps": 4}
+    )
+
+    assert list(df.columns) == ["RunId", "num_steps", "Step", "N Agents"]
+    assert df["RunId"].tolist() == [2, 2]
+    assert df["Step"].tolist() == [1, 4]
+    assert df["N Agents"].tolist() == [10, 40]
+
+
+def test_get_arrow_table_matches_dataframe():
+    datacollector = ColumnarDataCollector(
+        model_reporters={"N Agents": "n_agents", "Mean Age": "mean_age"}
+    )
+    for step in range(1, 4):
+        datacollector.collect(
+            SimpleNamespace(steps=step, n_agents=step * 10, mean_age=step / 2)
+        )
+
+    table = datacollector.get_arrow_table(rows=[1, 2], constant_columns={"RunId": 7})
+
+    assert table.column_names == ["RunId", "Step", "N Agents", "Mean Age"]
+    assert str(table.schema.field("N Agents").type) == "int64"
+    assert str(table.schema.field("Mean Age").type) == "double"
+    assert table.to_pydict() == {
+        "RunId": [7, 7],
+        "Step": [2, 3],
+        "N Agents": [20, 30],
+        "Mean Age": [1.0, 1.5],
+    }
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from vegetation.utils import dispersal
+from vegetation.utils.dispersal import get_dispersal_kernel, get_expected_arrivals
+from vegetation.utils.spatial import generate_points_in_utm
+
+
+def test_dispersal_kernel_matches_dispersed_points():
+    cell_size = (20.0, 30.0)
+    kernel = get_dispersal_kernel(50.0, cell_size)
+
+    assert kernel.sum() == pytest.approx(1.0)
+    # Reaches 3 cells along x (50 m from anywhere in a 20 m cell), 2 along y
+    radius = kernel.shape[0] // 2
+    assert radius == 3
+    assert kernel[radius - 3 : radius + 4, radius].min() > 0
+    assert kernel[radius, : radius - 2].sum() == 0
+    np.testing.assert_allclose(kernel, kernel[::-1, ::-1], atol=1e-12)
+
+    # Seeds of parents spread uniformly over their cell
+    rng = np.random.default_rng(0)
+    n_points = 200_000
+    parent_xs = rng.uniform(0, cell_size[0], n_points)
+    parent_ys = rng.uniform(0, cell_size[1], n_points)
+    xs, ys = generate_points_in_utm(parent_xs, parent_ys, 50.0, n_points, rng=rng)
+    dxs = np.floor(xs / cell_size[0]).astype(int) + radius
+    dys = np.floor(ys / cell_size[1]).astype(int) + radius
+    sampled_kernel = np.zeros_like(kernel)
+    np.add.at(sampled_kernel, (dxs, dys), 1 / n_points)
+
+    np.testing.assert_allclose(kernel, sampled_kernel, atol=0.005)
+
+
+@pytest.mark.parametrize("max_kernel_size", [0, 10_000])
+def test_expected_arrivals_spread_each_replicate(monkeypatch, max_kernel_size):
+    # By FFT, then directly
+    monkeypatch.setattr(
+        dispersal, "DIRECT_CONVOLUTION_MAX_KERNEL_SIZE", max_kernel_size
+    )
+    kernel = get_dispersal_kernel(50.0, (20.0, 30.0))
+    fecundity = np.zeros((2, 12, 10))
+    fecundity[0, 5, 5] = 100
+    fecundity[1, 0, 0] = 100
+
+    arrivals = get_expected_arrivals(fecundity, kernel)
+
+    assert arrivals.shape == fecundity.shape
+    assert (arrivals >= 0).all()
+    radius = kernel.shape[0] // 2
+    np.testing.assert_allclose(
+        arrivals[0, 5 - radius : 5 + radius + 1, 5 - radius : 5 + radius + 1],
+        100 * kernel,
+        atol=1e-9,
+    )
+    # Seeds dispersed beyond the raster's corner are lost
+    assert arrivals[1].sum() == pytest.approx(100 * kernel[radius:, radius:].sum())
@@ -0,0 +1,61 @@
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from vegetation.config.life_stages import LifeStage
+from vegetation.logging.event_log import AgentEventLog, EVENT_TYPE_CODES
+from vegetation.logging.logging import AgentEventType
+
+
+def _make_agent(model, unique_id, parent_id=None, life_stage=LifeStage.SEED):
+    return SimpleNamespace(
+        model=model,
+        unique_id=unique_id,
+        parent_id=parent_id,
+        life_stage=life_stage,
+        intersecting_cell=SimpleNamespace(indices=(unique_id, unique_id + 1)),
+    )
+
+
+def test_event_log_flushes_batches_to_parquet(tmp_path):
+    model = SimpleNamespace(steps=3, replicate_idx=None)
+    event_log = AgentEventLog(str(tmp_path), batch_size=4)
+
+    for unique_id in range(10):
+        agent = _make_agent(model, unique_id, parent_id=100)
+        event_log.record(agent, AgentEventType.ON_CREATE)
+        event_log.record(agent, AgentEventType.ON_SURVIVE)
+
+    adult = _make_agent(model, 42, life_stage=LifeStage.ADULT)
+    event_log.record(adult, AgentEventType.ON_DEATH)
+    event_log.close()
+
+    events = pd.read_parquet(tmp_path)
+    assert len(events) == len(event_log) == 11
+
+    # Survival events are not recorded by default
+    assert set(events["event_type"]) == {
+        EVENT_TYPE_CODES[AgentEventType.ON_CREATE],
+        EVENT_TYPE_CODES[AgentEventType.ON_DEATH],
+    }
+
+    death = events[events["event_type"] == EVENT_TYPE_CODES[AgentEventType.ON_DEATH]]
+    assert death.iloc[0].to_dict() == {
+        "step": 3,
+        "replicate": -1,
+        "agent_id": 42,
+        "parent_id": -1,
+        "event_type": EVENT_TYPE_CODES[AgentEventType.ON_DEATH],
+        "stage": int(LifeStage.ADULT),
+        "cell_row": 42,
+        "cell_col": 43,
+    }
+
+
+def test_event_log_without_pyarrow_fails_on_creation(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    with pytest.raises(ImportError, match="pyarrow"):
+        AgentEventLog(str(tmp_path))
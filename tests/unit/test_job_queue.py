@@ -0,0 +1,125 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vegetation.batch.batchrunner import jotr_batch_run
+from vegetation.batch.job_queue import JobQueue, jotr_queue_batch_run, run_worker
+from vegetation.utils.datacollector import ColumnarDataCollector
+
+CLASS_PARAMETERS = {
+    "aoi_bounds": [0, 0, 1, 1],
+    "attribute_encodings": None,
+    "cell_attributes_to_save": None,
+}
+
+
+class NoisyModel:
+    """Reports noise around its parameter - fails on request, to test retries."""
+
+    def __init__(self, value, num_steps=2, seed=None):
+        if value < 0:
+            raise ValueError("Negative value")
+        self.value = value
+        self.base_value = value
+        self.rng = np.random.default_rng(seed)
+        self.num_steps = num_steps
+        self.steps = 0
+        self.running = True
+        self.datacollector = ColumnarDataCollector({"Value": "value"})
+
+    @classmethod
+    def set_aoi_bounds(cls, aoi_bounds):
+        cls._aoi_bounds = aoi_bounds
+
+    def step(self):
+        self.steps += 1
+        self.value = self.base_value + self.rng.normal()
+        self.datacollector.collect(self)
+        self.running = self.steps < self.num_steps
+
+
+def test_queue_batch_run_matches_batch_run(tmp_path):
+    batch_parameters = dict(
+        model_parameters={"value": [1.0, 2.0, 3.0]},
+        class_parameters_dict=CLASS_PARAMETERS,
+        iterations=2,
+        data_collection_period=1,
+        display_progress=False,
+        seed=3,
+    )
+
+    expected = jotr_batch_run(NoisyModel, **batch_parameters)
+    results = jotr_queue_batch_run(
+        NoisyModel,
+        queue_path=str(tmp_path / "queue.sqlite"),
+        number_processes=2,
+        **batch_parameters,
+    )
+
+    pd.testing.assert_frame_equal(
+        results, expected.sort_values(["RunId", "Step"], ignore_index=True)
+    )
+    progress = JobQueue(tmp_path / "queue.sqlite").get_progress()
+    assert progress == {"pending": 0, "running": 0, "done": 6, "failed": 0}
+
+
+def test_expired_leases_are_claimed_again(tmp_path):
+    job_queue = JobQueue(tmp_path / "queue.sqlite", lease_seconds=0.2, max_attempts=2)
+    job_queue.submit(NoisyModel, {"value": [1.0]}, CLASS_PARAMETERS, seed=0)
+
+    run_id, iteration, kwargs = job_queue.claim("lost")
+    assert (run_id, iteration) == (0, 0)
+    assert kwargs["value"] == 1.0 and "seed" in kwargs
+    assert job_queue.claim("other") is None
+
+    time.sleep(0.3)
+    assert job_queue.claim("other")[0] == run_id
+    assert not job_queue.heartbeat(run_id, "lost")
+    assert job_queue.heartbeat(run_id, "other")
+
+    # Out of attempts once the second lease expires too
+    time.sleep(0.3)
+    assert job_queue.claim("third") is None
+    assert job_queue.get_progress()["failed"] == 1
+
+
+def test_failed_runs_are_retried_then_reported(tmp_path):
+    queue_path = tmp_path / "queue.sqlite"
+    job_queue = JobQueue(queue_path, max_attempts=2)
+    job_queue.submit(NoisyModel, {"value": [1.0, -1.0]}, CLASS_PARAMETERS, seed=0)
+
+    assert run_worker(queue_path, worker_id="pytest", max_attempts=2) == 1
+
+    failures = job_queue.get_failures()
+    assert failures["run_id"].tolist() == [1]
+    assert failures["n_attempts"].tolist() == [2]
+    assert "Negative value" in failures["error"].iat[0]
+    assert job_queue.get_results()["value"].unique().tolist() == [1.0]
+
+
+def test_queue_batch_run_returns_empty_when_every_run_fails(tmp_path):
+    results = jotr_queue_batch_run(
+        NoisyModel,
+        model_parameters={"value": [-1.0, -2.0]},
+        class_parameters_dict=CLASS_PARAMETERS,
+        queue_path=str(tmp_path / "queue.sqlite"),
+        display_progress=False,
+        seed=0,
+        max_attempts=2,
+    )
+
+    assert results.empty
+    failures = JobQueue(tmp_path / "queue.sqlite").get_failures()
+    assert failures["n_attempts"].tolist() == [2, 2]
+
+
+def test_queue_holds_one_sweep(tmp_path):
+    job_queue = JobQueue(tmp_path / "queue.sqlite")
+    job_queue.submit(NoisyModel, {"value": [1.0]}, CLASS_PARAMETERS, seed=0)
+    job_queue.submit(NoisyModel, {"value": [1.0]}, CLASS_PARAMETERS, seed=0)
+    assert sum(job_queue.get_progress().values()) == 1
+
+    with pytest.raises(ValueError, match="different sweep"):
+        job_queue.submit(NoisyModel, {"value": [2.0]}, CLASS_PARAMETERS, seed=0)
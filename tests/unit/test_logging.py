@@ -0,0 +1,88 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from vegetation.config.global_paths import PACKAGE_PATH
+from vegetation.config.life_stages import LifeStage
+from vegetation.logging.logging import (
+    STD_FORMATTERS,
+    AgentEventType,
+    AgentLogger,
+    CompiledTemplate,
+    FallbackFormatter,
+    LogConfig,
+)
+
+LOG_CONFIG_PATH = PACKAGE_PATH / "logging" / "logging_config.json"
+
+
+class JoshuaTreeAgent(SimpleNamespace):
+    pass
+
+
+def _make_agent(log_level=logging.INFO):
+    return JoshuaTreeAgent(
+        unique_id=7,
+        indices=(3, 4),
+        life_stage=LifeStage.JUVENILE,
+        log_level=log_level,
+    )
+
+
+@pytest.fixture
+def agent_logger():
+    LogConfig.initialize(LOG_CONFIG_PATH)
+    agent_logger = AgentLogger()
+    level = agent_logger.logger.level
+    yield agent_logger
+    agent_logger.logger.setLevel(level)
+
+
+def test_compiled_templates_match_fallback_formatter():
+    agent = _make_agent()
+    context = {"survival_rate": 0.975, "n_seeds": 101}
+
+    with open(LOG_CONFIG_PATH, "r") as f:
+        agent_templates = json.load(f)["agent"]["JoshuaTreeAgent"]
+
+    for template in agent_templates.values():
+        expected = FallbackFormatter().format(
+            template, agent=agent, **context, **STD_FORMATTERS
+        )
+        assert CompiledTemplate(template, "agent").format(agent, context) == expected
+
+
+def test_compiled_template_reports_missing_fields():
+    compiled_template = CompiledTemplate("{agent.unique_id} {n_seeds}", "agent")
+    with pytest.raises(ValueError):
+        compiled_template.format(_make_agent(), {})
+
+
+def test_disabled_level_skips_formatting(agent_logger):
+    agent_logger.logger.setLevel(logging.WARNING)
+
+    # A missing context key would raise if the template were ever rendered
+    agent_logger.log_agent_event(_make_agent(), AgentEventType.ON_DEATH)
+
+
+def test_enabled_level_defers_rendering_to_handler(agent_logger):
+    records = []
+    handler = logging.Handler()
+    handler.emit = lambda record: records.append(record)
+    agent_logger.logger.addHandler(handler)
+
+    try:
+        agent = _make_agent()
+        agent_logger.log_agent_event(
+            agent, AgentEventType.ON_DISPERSE, context={"n_seeds": 12}
+        )
+    finally:
+        agent_logger.logger.removeHandler(handler)
+
+    assert len(records) == 1
+    assert not isinstance(records[0].msg, str)
+    assert records[0].getMessage().strip() == (
+        "🌰 Agent 7 (JUVENILE) is dispersing 12 seeds..."
+    )
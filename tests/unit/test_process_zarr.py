@@ -0,0 +1,108 @@
+import imageio
+import matplotlib.pyplot as plt
+import numpy as np
+import xarray as xr
+
+from vegetation.analysis.process_zarr import (
+    aggregate_by_encoding,
+    at_least_dict_from_aggregate,
+    binary_minimum_by_encoding,
+    create_gifs_from_xarrays,
+)
+
+ATTRIBUTE_ENCODING = {
+    "description": "the max life stage of any jotr agent within this VegCell",
+    "encoding": {"ABSENT": -1, "SEED": 0, "SEEDLING": 1, "JUVENILE": 2, "ADULT": 3},
+}
+
+
+def _make_attribute_xarray(n_replicates=7, n_timesteps=5, width=4, height=3):
+    rng = np.random.default_rng(0)
+    values = rng.integers(
+        -1, 4, size=(n_replicates, n_timesteps, width, height), dtype=np.int8
+    )
+    attribute_xarray = xr.DataArray(
+        values,
+        dims=["replicate_id", "timestep", "x", "y"],
+        name="jotr_max_life_stage",
+    )
+    attribute_xarray.attrs["attribute_encoding"] = ATTRIBUTE_ENCODING
+    return attribute_xarray
+
+
+def test_aggregate_matches_per_stage_reduction():
+    attribute_xarray = _make_attribute_xarray()
+
+    aggregate = aggregate_by_encoding(
+        attribute_xarray,
+        quantiles=[0.0, 0.25, 0.5, 1.0],
+        replicate_chunk_size=3,
+        timestep_chunk_size=2,
+        display_progress=False,
+    )
+
+    for life_stage_key in ["SEED", "SEEDLING", "JUVENILE", "ADULT"]:
+        expected = binary_minimum_by_encoding(attribute_xarray, life_stage_key)
+        result = at_least_dict_from_aggregate(aggregate, life_stage_key)
+        np.testing.assert_allclose(
+            result["aggregated_xarray"].values, expected["aggregated_xarray"].values
+        )
+        assert result["aggregation"] == expected["aggregation"]
+
+    np.testing.assert_allclose(
+        aggregate["mean"].values, attribute_xarray.values.mean(axis=0), rtol=1e-6
+    )
+    np.testing.assert_array_equal(
+        aggregate["quantile_value"].values,
+        np.quantile(
+            attribute_xarray.values,
+            [0.0, 0.25, 0.5, 1.0],
+            axis=0,
+            method="inverted_cdf",
+        ),
+    )
+
+
+def test_aggregate_writes_to_zarr(tmp_path):
+    attribute_xarray = _make_attribute_xarray()
+
+    in_memory = aggregate_by_encoding(attribute_xarray, display_progress=False)
+    on_disk = aggregate_by_encoding(
+        attribute_xarray,
+        replicate_chunk_size=2,
+        output_path=str(tmp_path / "aggregate.zarr"),
+        display_progress=False,
+    )
+
+    xr.testing.assert_allclose(in_memory.load(), on_disk.load())
+
+
+def test_create_gifs_streams_every_frame(tmp_path):
+    attribute_xarray = _make_attribute_xarray(n_timesteps=4)
+    aggregate = aggregate_by_encoding(attribute_xarray, display_progress=False)
+
+    render_jobs = [
+        (
+            at_least_dict_from_aggregate(aggregate, life_stage_key),
+            str(tmp_path / f"{life_stage_key}.gif"),
+        )
+        for life_stage_key in ["ABSENT", "ADULT"]
+    ]
+    output_paths = create_gifs_from_xarrays(
+        render_jobs, number_processes=2, display_progress=False, vmin=0, vmax=1
+    )
+    assert sorted(output_paths) == sorted(path for __, path in render_jobs)
+
+    frames = imageio.mimread(str(tmp_path / "ADULT.gif"))
+    assert len(frames) == 4
+    assert frames[0].shape[:2] == (4, 3)
+
+    # Every replicate is at least ABSENT, so every cell should be colored with
+    # the top of the colormap
+    expected_top = (np.array(plt.get_cmap("viridis")(255)[:3]) * 255).astype(int)
+    absent_frames = imageio.mimread(str(tmp_path / "ABSENT.gif"))
+    np.testing.assert_allclose(
+        absent_frames[0][..., :3].reshape(-1, 3),
+        np.broadcast_to(expected_top, (12, 3)),
+        atol=8,
+    )
@@ -0,0 +1,28 @@
+import time
+
+from vegetation.utils.profiling import StepProfiler
+
+
+def test_step_profiler_records_phases_and_counters():
+    profiler = StepProfiler()
+
+    with profiler.phase("agent_step"):
+        with profiler.phase("dispersal"):
+            time.sleep(0.01)
+    profiler.increment("n_deaths", 3)
+    profiler.increment("n_deaths")
+    profiler.end_step(1)
+
+    with profiler.phase("agent_step"):
+        pass
+    profiler.end_step(2)
+
+    df = profiler.get_dataframe()
+    assert df["Step"].tolist() == [1, 2]
+    assert df["n_deaths"].tolist() == [4, 0]
+    assert df.loc[0, "time_agent_step"] >= df.loc[0, "time_dispersal"] >= 0.01
+    assert df["time_dispersal"].isna().tolist() == [False, True]
+
+    summary = profiler.get_summary()
+    assert summary.index.tolist() == ["agent_step", "dispersal"]
+    assert summary.loc["dispersal", "total"] >= 0.01
@@ -0,0 +1,115 @@
+import numpy as np
+
+from vegetation.viz.simple_raster_map import (
+    LifeStageRasterRenderer,
+    RasterTileCache,
+    _render_raster_overlays,
+)
+
+TOTAL_BOUNDS = [-116.4, 33.9, -116.2, 34.1]
+
+
+def _render_tile_bounds(rows, cols, tile_bounds):
+    # Stands in for coloring and reprojecting - the url records what was drawn
+    min_x, min_y, max_x, max_y = tile_bounds
+    return {
+        "url": f"{rows.start}:{rows.stop},{cols.start}:{cols.stop}",
+        "bounds": [[min_y, min_x], [max_y, max_x]],
+    }
+
+
+def test_only_dirty_tiles_are_redrawn():
+    rng = np.random.default_rng(0)
+    max_life_stage = rng.integers(-1, 6, size=(70, 50), dtype=np.int8)
+    tile_cache = RasterTileCache(tile_size=32)
+    drawn = []
+
+    def render_tile(rows, cols, tile_bounds):
+        drawn.append((rows.start, cols.start))
+        return _render_tile_bounds(rows, cols, tile_bounds)
+
+    first_tiles = tile_cache.get_tiles(0, max_life_stage, TOTAL_BOUNDS, render_tile)
+    assert tile_cache.n_dirty_tiles == len(first_tiles) == len(drawn) == 3 * 2
+
+    drawn.clear()
+    unchanged_tiles = tile_cache.get_tiles(
+        0, max_life_stage.copy(), TOTAL_BOUNDS, render_tile
+    )
+    assert tile_cache.n_dirty_tiles == 0
+    assert drawn == []
+    assert unchanged_tiles == first_tiles
+
+    # Changed in place, as a model's raster might be
+    max_life_stage[65, 40] = 6
+    changed_tiles = tile_cache.get_tiles(0, max_life_stage, TOTAL_BOUNDS, render_tile)
+    assert tile_cache.n_dirty_tiles == 1
+    assert drawn == [(64, 32)]
+    assert [tile["key"] for tile in changed_tiles] == [
+        tile["key"] for tile in first_tiles
+    ]
+
+    # A new background redraws every tile
+    drawn.clear()
+    tile_cache.get_tiles(0, max_life_stage, TOTAL_BOUNDS, render_tile, static_key=1)
+    assert len(drawn) == 3 * 2
+
+
+def test_tile_bounds_cover_total_bounds():
+    max_life_stage = np.zeros((70, 50), dtype=np.int8)
+    tiles = RasterTileCache(tile_size=32).get_tiles(
+        0, max_life_stage, TOTAL_BOUNDS, _render_tile_bounds
+    )
+
+    min_x, min_y, max_x, max_y = TOTAL_BOUNDS
+    south = min(tile["bounds"][0][0] for tile in tiles)
+    west = min(tile["bounds"][0][1] for tile in tiles)
+    north = max(tile["bounds"][1][0] for tile in tiles)
+    east = max(tile["bounds"][1][1] for tile in tiles)
+    np.testing.assert_allclose([south, west, north, east], [min_y, min_x, max_y, max_x])
+
+    # Tiles within a row share edges
+    top_left, top_right = tiles[0], tiles[1]
+    assert top_left["bounds"][1][1] == top_right["bounds"][0][1]
+
+
+def test_tiled_overlays_only_color_changed_tiles(monkeypatch):
+    renderer = LifeStageRasterRenderer()
+    background = renderer.render_background(
+        np.full((70, 50), 1000.0), np.zeros((70, 50), dtype=bool)
+    )
+    max_life_stage = np.full((70, 50), -1, dtype=np.int8)
+    tile_cache = RasterTileCache(tile_size=32)
+
+    render_array = renderer.render_array
+    colored_shapes = []
+
+    def counting_render_array(background, max_life_stage):
+        colored_shapes.append(max_life_stage.shape)
+        return render_array(background, max_life_stage)
+
+    monkeypatch.setattr(renderer, "render_array", counting_render_array)
+
+    def render_overlays():
+        return _render_raster_overlays(
+            renderer=renderer,
+            background=background,
+            max_life_stage=max_life_stage,
+            crs="epsg:4326",
+            total_bounds=TOTAL_BOUNDS,
+            map_crs="epsg:4326",
+            tile_cache=tile_cache,
+        )
+
+    first_tiles = render_overlays()
+    assert len(colored_shapes) == len(first_tiles) == 3 * 2
+
+    colored_shapes.clear()
+    max_life_stage[0, 0] = 4
+    changed_tiles = render_overlays()
+    assert colored_shapes == [(32, 32)]
+    changed_urls = [
+        new["key"]
+        for old, new in zip(first_tiles, changed_tiles)
+        if old["url"] != new["url"]
+    ]
+    assert changed_urls == ["0-0-0"]
@@ -0,0 +1,164 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vegetation.batch.batchrunner import jotr_batch_run
+from vegetation.batch import result_cache as result_cache_module
+from vegetation.batch.result_cache import CachedRun, RunResultCache, get_code_version
+from vegetation.utils.datacollector import ColumnarDataCollector
+
+CLASS_PARAMETERS = {
+    "aoi_bounds": [0, 0, 1, 1],
+    "attribute_encodings": None,
+    "cell_attributes_to_save": None,
+}
+
+
+class CountingModel:
+    """Reports noise around its parameter, counting how many runs it simulates."""
+
+    n_simulated = 0
+
+    def __init__(self, value, num_steps=2, seed=None):
+        self.base_value = value
+        self.rng = np.random.default_rng(seed)
+        self.num_steps = num_steps
+        self.steps = 0
+        self.running = True
+        self.value = 0.0
+        self.datacollector = ColumnarDataCollector({"Value": "value"})
+        CountingModel.n_simulated += 1
+
+    @classmethod
+    def set_aoi_bounds(cls, aoi_bounds):
+        cls._aoi_bounds = aoi_bounds
+
+    def step(self):
+        self.steps += 1
+        self.value = self.base_value + self.rng.normal()
+        self.datacollector.collect(self)
+        self.running = self.steps < self.num_steps
+
+
+def _batch_run(values, result_cache):
+    CountingModel.n_simulated = 0
+    return jotr_batch_run(
+        CountingModel,
+        model_parameters={"value": values},
+        class_parameters_dict=CLASS_PARAMETERS,
+        iterations=2,
+        data_collection_period=1,
+        display_progress=False,
+        seed=7,
+        result_cache=result_cache,
+    )
+
+
+def test_batch_run_only_simulates_new_runs(tmp_path):
+    result_cache = RunResultCache(tmp_path)
+
+    first = _batch_run([1.0, 2.0], result_cache)
+    assert CountingModel.n_simulated == 4
+
+    extended = _batch_run([0.0, 1.0, 2.0], result_cache)
+    assert CountingModel.n_simulated == 2
+    assert result_cache.get_summary()["n_entries"] == 6
+
+    # Cached runs are relabelled with their run id in the extended grid
+    key_columns = ["value", "iteration", "Step"]
+    pd.testing.assert_frame_equal(
+        first.drop(columns="RunId").sort_values(key_columns, ignore_index=True),
+        extended[extended["value"] > 0]
+        .drop(columns="RunId")
+        .sort_values(key_columns, ignore_index=True),
+    )
+    run_ids = extended.groupby(["iteration", "value"])["RunId"].first()
+    assert run_ids.tolist() == list(range(6))
+
+
+def test_key_depends_on_parameters_and_code_version(tmp_path):
+    result_cache = RunResultCache(tmp_path, code_version="a")
+    key = result_cache.get_key(CountingModel, CLASS_PARAMETERS, {"value": 1.0})
+
+    assert key == result_cache.get_key(
+        CountingModel, dict(reversed(CLASS_PARAMETERS.items())), {"value": 1.0}
+    )
+    assert key != result_cache.get_key(
+        CountingModel, CLASS_PARAMETERS, {"value": 1.0, "seed": 1}
+    )
+    assert key != RunResultCache(tmp_path, code_version="b").get_key(
+        CountingModel, CLASS_PARAMETERS, {"value": 1.0}
+    )
+
+
+@pytest.mark.parametrize("source_dir", ["model", "batch"])
+def test_code_version_covers_run_and_collection_code(tmp_path, monkeypatch, source_dir):
+    monkeypatch.setattr(result_cache_module, "PACKAGE_PATH", tmp_path)
+    (tmp_path / source_dir).mkdir()
+    source_path = tmp_path / source_dir / "module.py"
+    source_path.write_text("COLUMNS = ['N Agents']\n")
+    get_code_version.cache_clear()
+    code_version = get_code_version()
+
+    source_path.write_text("COLUMNS = ['N Agents', 'N Seeds']\n")
+    get_code_version.cache_clear()
+    try:
+        assert get_code_version() != code_version
+    finally:
+        get_code_version.cache_clear()
+
+
+def test_least_recently_used_runs_are_evicted(tmp_path):
+    result_cache = RunResultCache(tmp_path, max_entries=2)
+    for key in ["a", "b"]:
+        result_cache.put(key, CachedRun(data=pd.DataFrame({"Value": [key]})))
+
+    # "a" is now more recently used than "b"
+    assert result_cache.get("a").data["Value"].tolist() == ["a"]
+    result_cache.put(
+        "c",
+        CachedRun(
+            data=pd.DataFrame({"Value": ["c"]}),
+            zarr_filename="vegetation.zarr",
+            zarr_group="pytest",
+            replicate_idx=3,
+        ),
+    )
+
+    assert result_cache.get("b") is None
+    assert result_cache.get("a") is not None
+    assert result_cache.get("c").replicate_idx == 3
+    assert sorted(path.name for path in tmp_path.glob("*.pkl")) == ["a.pkl", "c.pkl"]
+
+
+def test_size_limit_must_be_positive(tmp_path):
+    with pytest.raises(ValueError, match="max_size_mb"):
+        RunResultCache(tmp_path, max_size_mb=0)
+
+
+def test_index_connections_are_closed(tmp_path, monkeypatch):
+    connect = sqlite3.connect
+    connections = []
+
+    def tracked_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(sqlite3, "connect", tracked_connect)
+    result_cache = RunResultCache(tmp_path, max_entries=1)
+    result_cache.put("a", CachedRun(data=pd.DataFrame({"Value": [1]})))
+    assert result_cache.get("a") is not None
+    assert result_cache.get_summary()["n_entries"] == 1
+
+    # Creation, put and its eviction, get and the summary
+    assert len(connections) == 5
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            connection.execute("SELECT 1")
+
+    # WAL is only set on creation, and kept by the index file itself
+    index = connect(tmp_path / RunResultCache.INDEX_FILENAME)
+    assert index.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    index.close()
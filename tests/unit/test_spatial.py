@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import shapely
+import shapely.geometry as sg
+from affine import Affine
+
+from vegetation.utils.spatial import (
+    coords_to_raster_pos,
+    generate_points_in_utm,
+    sample_points_in_polygon,
+)
+
+# 4 columns x 3 rows of 0.5 degree cells, upper left corner at (-117, 35)
+TRANSFORM = Affine(0.5, 0, -117.0, 0, -0.5, 35.0)
+HEIGHT = 3
+
+
+def test_coords_to_raster_pos_counts_y_up_from_bottom_row():
+    # Cell centers of the top-left, bottom-left and top-right cells
+    xs = np.array([-116.75, -116.75, -115.25])
+    ys = np.array([34.75, 33.75, 34.75])
+
+    x, y = coords_to_raster_pos(TRANSFORM, HEIGHT, xs, ys)
+
+    np.testing.assert_array_equal(x, [0, 0, 3])
+    np.testing.assert_array_equal(y, [2, 0, 2])
+
+    scalar_x, scalar_y = coords_to_raster_pos(TRANSFORM, HEIGHT, -116.25, 34.25)
+    assert (int(scalar_x), int(scalar_y)) == (1, 1)
+
+
+def test_generate_points_in_utm_stays_within_distance():
+    xs, ys = generate_points_in_utm(1000.0, 2000.0, max_distance=50.0, n_points=500)
+
+    assert xs.shape == ys.shape == (500,)
+    assert np.all(np.hypot(xs - 1000.0, ys - 2000.0) <= 50.0)
+
+
+@pytest.mark.parametrize("layout", ["random", "stratified", "grid"])
+def test_sample_points_in_polygon_layouts(layout):
+    # L-shaped polygon, so a good share of bounding box candidates are rejected
+    polygon = sg.Polygon([(0, 0), (100, 0), (100, 40), (40, 40), (40, 100), (0, 100)])
+    rng = np.random.default_rng(0)
+
+    xs, ys = sample_points_in_polygon(polygon, 500, layout=layout, rng=rng)
+
+    assert shapely.contains_xy(polygon, xs, ys).all()
+    if layout == "grid":
+        assert abs(xs.size - 500) < 50
+        # Regular lattice - all points share the same spacing
+        column_spacing = np.diff(np.unique(np.round(xs, 6)))
+        assert np.allclose(column_spacing, column_spacing[0], atol=1e-5)
+    else:
+        assert xs.size == ys.size == 500
+
+
+def test_sample_points_in_polygon_rejects_unknown_layout():
+    with pytest.raises(ValueError):
+        sample_points_in_polygon(sg.box(0, 0, 1, 1), 10, layout="hexagonal")
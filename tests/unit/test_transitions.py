@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+import pytest
+
+from vegetation.config.life_stages import LifeStage
+from vegetation.config.transitions import (
+    TransitionRateModifier,
+    TransitionRates,
+    get_jotr_germination_rate,
+    get_jotr_survival_rate,
+)
+
+
+def test_default_rates_match_config():
+    transition_rates = TransitionRates.from_config()
+
+    assert get_jotr_germination_rate() == pytest.approx(0.004)
+    assert get_jotr_survival_rate(LifeStage.SEEDLING) == pytest.approx(0.38)
+    assert get_jotr_survival_rate(LifeStage.JUVENILE) == pytest.approx(0.975)
+    assert get_jotr_survival_rate(LifeStage.ADULT) == pytest.approx(0.97)
+    assert np.isnan(transition_rates.survival_rates[LifeStage.SEED])
+
+    # Without modifiers, binding doesn't make rates vary by cell
+    transition_rates.bind({"elevation": np.arange(12.0).reshape(3, 4)})
+    life_stages = np.array([LifeStage.SEEDLING, LifeStage.ADULT, LifeStage.ADULT])
+    np.testing.assert_allclose(
+        transition_rates.get_survival_rates(life_stages, [0, 1, 2], [3, 2, 0]),
+        [0.38, 0.97, 0.97],
+    )
+
+
+def test_refugia_modifier_only_changes_refugia_cells(tmp_path):
+    config = {
+        "germination_rate": 0.004,
+        "survival_rates": {"SEEDLING": 0.38, "JUVENILE": 0.975, "ADULT": 0.97},
+        "modifiers": [
+            {
+                "rate": "survival",
+                "life_stages": ["SEEDLING"],
+                "covariate": "refugia_status",
+                "coefficient": 1.0,
+            }
+        ],
+    }
+    config_path = tmp_path / "transition_rates.json"
+    config_path.write_text(json.dumps(config))
+    transition_rates = TransitionRates.from_config(config_path)
+
+    with pytest.raises(ValueError, match="bind"):
+        transition_rates.get_survival_rates(LifeStage.SEEDLING, 0, 0)
+
+    refugia_status = np.array([[0, 1], [1, 0]])
+    transition_rates.bind({"refugia_status": refugia_status})
+
+    seedling_rates = transition_rates.get_survival_rates(
+        np.full(4, LifeStage.SEEDLING), [0, 0, 1, 1], [0, 1, 0, 1]
+    )
+    odds = 0.38 / 0.62 * np.e
+    np.testing.assert_allclose(
+        seedling_rates, [0.38, odds / (1 + odds), odds / (1 + odds), 0.38]
+    )
+    np.testing.assert_allclose(
+        transition_rates.get_survival_rates(
+            np.full(4, LifeStage.ADULT), [0, 0, 1, 1], [0, 1, 0, 1]
+        ),
+        0.97,
+    )
+    np.testing.assert_allclose(
+        transition_rates.get_germination_rates([0, 1], [1, 1]), 0.004
+    )
+
+
+def test_invalid_modifiers_raise():
+    with pytest.raises(ValueError, match="covariate"):
+        TransitionRateModifier(rate="survival", covariate="slope", coefficient=1.0)
+
+    with pytest.raises(ValueError, match="no survival rate"):
+        TransitionRates(
+            survival_rates={LifeStage.ADULT: 0.97},
+            germination_rate=0.004,
+            modifiers=[
+                TransitionRateModifier(
+                    rate="survival",
+                    covariate="elevation",
+                    coefficient=0.001,
+                    life_stages=(LifeStage.SEED,),
+                )
+            ],
+        )
+
+
+def test_climate_modifiers_apply_each_step():
+    transition_rates = TransitionRates(
+        survival_rates={LifeStage.SEEDLING: 0.38, LifeStage.ADULT: 0.97},
+        germination_rate=0.004,
+        modifiers=[
+            TransitionRateModifier(
+                rate="germination",
+                covariate="precipitation",
+                coefficient=0.01,
+                reference=150.0,
+            )
+        ],
+    )
+    assert transition_rates.climate_covariates == ["precipitation"]
+
+    transition_rates.bind({"elevation": np.zeros((2, 2))})
+    with pytest.raises(ValueError, match="update_climate"):
+        transition_rates.get_germination_rates(0, 0)
+
+    for precipitation in [150.0, 250.0]:
+        transition_rates.update_climate(
+            {"precipitation": np.array([[precipitation, np.nan], [50.0, 150.0]])}
+        )
+        odds = 0.004 / 0.996 * np.exp(0.01 * (precipitation - 150.0))
+        np.testing.assert_allclose(
+            transition_rates.get_germination_rates([0, 0, 1, 1], [0, 1, 0, 1]),
+            [
+                odds / (1 + odds),
+                0.004,
+                0.004 / 0.996 / np.e / (1 + 0.004 / 0.996 / np.e),
+                0.004,
+            ],
+        )
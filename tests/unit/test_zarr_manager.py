@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from vegetation.analysis.process_zarr import pct_reached_by_timestep
+from vegetation.config.global_paths import PACKAGE_PATH
+from vegetation.config.life_stages import LifeStage
+from vegetation.utils.zarr_manager import ZarrManager, get_encoding_levels
+
+ATTRIBUTE_ENCODINGS = {
+    "jotr_max_life_stage": {
+        "description": "the max life stage of any jotr agent within this VegCell",
+        "encoding": {
+            "ABSENT": -1,
+            "SEED": 0,
+            "SEEDLING": 1,
+            "JUVENILE": 2,
+            "ADULT": 3,
+        },
+    }
+}
+
+
+def _run_replicate(filename, timestep_arrays):
+    zarr_manager = ZarrManager(
+        width=4,
+        height=3,
+        max_timestep=len(timestep_arrays),
+        filename=filename,
+        attribute_list=["jotr_max_life_stage"],
+        attribute_encodings=ATTRIBUTE_ENCODINGS,
+        run_parameter_dict={"num_steps": len(timestep_arrays)},
+    )
+    zarr_manager.set_group_name("pytest")
+    zarr_manager.resize_array_for_next_replicate()
+
+    for timestep_idx, timestep_array in enumerate(timestep_arrays, start=1):
+        zarr_manager.append_synchronized_timestep(
+            timestep_idx=timestep_idx,
+            timestep_array_dict={"jotr_max_life_stage": timestep_array},
+        )
+
+    zarr_manager.write_replicate_summaries()
+    zarr_manager.consolidate_metadata()
+
+
+def test_replicate_summaries_match_full_cube(tmp_path):
+    filename = str(tmp_path / "vegetation.zarr")
+    rng = np.random.default_rng(0)
+    n_replicates, n_timesteps = 3, 5
+
+    for __replicate_idx in range(n_replicates):
+        timestep_arrays = rng.integers(-1, 4, size=(n_timesteps, 4, 3), dtype=np.int8)
+        _run_replicate(filename, timestep_arrays)
+
+    sim_xarray = xr.open_zarr(
+        filename, group="pytest", chunks=None, mask_and_scale=False
+    )
+    cube = sim_xarray["jotr_max_life_stage"].values[:, 1:]
+
+    occupancy_time = sim_xarray["jotr_max_life_stage_occupancy_time"].values
+    np.testing.assert_array_equal(occupancy_time, (cube > -1).sum(axis=1))
+
+    n_replicates_reached = sim_xarray["jotr_max_life_stage_n_replicates_reached"]
+    assert n_replicates_reached.attrs["n_replicates"] == n_replicates
+    np.testing.assert_array_equal(
+        n_replicates_reached.values[-1], (cube >= 3).any(axis=1).sum(axis=0)
+    )
+
+    for timestep in [1, 3, None]:
+        last_timestep = n_timesteps if timestep is None else timestep
+        expected = (cube[:, :last_timestep] >= 2).any(axis=1).mean(axis=0)
+        result = pct_reached_by_timestep(
+            sim_xarray, "jotr_max_life_stage", "JUVENILE", timestep=timestep
+        )
+        np.testing.assert_allclose(result.values, expected)
+
+
+def test_summaries_reject_values_missing_from_encoding(tmp_path):
+    # e.g. BREEDING (5) written against an encoding that stops at ADULT
+    timestep_arrays = np.full((1, 4, 3), 5, dtype=np.int8)
+
+    with pytest.raises(ValueError, match=r"values \[5\] missing from its encoding"):
+        _run_replicate(str(tmp_path / "vegetation.zarr"), timestep_arrays)
+
+
+def test_life_stage_encoding_matches_life_stages():
+    with open(PACKAGE_PATH / "config" / "attribute_encodings.json") as f:
+        attribute_encoding = json.load(f)["VegCell"]["jotr_max_life_stage"]
+
+    level_names, level_values = get_encoding_levels(attribute_encoding["encoding"])
+    assert dict(zip(level_names, level_values.tolist())) == {
+        "ABSENT": -1,
+        **{life_stage.name: life_stage.value for life_stage in LifeStage},
+    }
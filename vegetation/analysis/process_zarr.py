@@ -3,10 +3,16 @@ import argparse
 import matplotlib.pyplot as plt
 import numpy as np
 import imageio
+from functools import partial
+from multiprocessing import Pool
+import zarr
+from tqdm.auto import tqdm
 
-ZARR_PATH = "vegetation.zarr"
+from vegetation.utils.zarr_manager import get_encoding_levels
 
-sim_xarray = xr.open_zarr(ZARR_PATH)
+ZARR_PATH = "vegetation.zarr"
+DEFAULT_REPLICATE_CHUNK_SIZE = 16
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
 
 
 def ingest_zarr(zarr_path, group_name=None):
@@ -23,9 +29,21 @@ def ingest_zarr(zarr_path, group_name=None):
         print(f"Error opening Zarr dataset: {e}")
 
 
+def get_colormap_lut(cmap="viridis"):
+    """Return a (256, 4) uint8 RGBA lookup table for a matplotlib colormap."""
+    return (plt.get_cmap(cmap)(np.arange(256)) * 255).astype(np.uint8)
+
+
 def create_gif_from_xarray(
     aggregated_dict, output_path, fps=10, cmap="viridis", vmin=None, vmax=None
 ):
+    """Render an aggregated (timestep, x, y) array to a GIF / MP4, one frame at a time.
+
+    Frames are loaded, normalized and colored one timestep at a time and
+    appended to a streaming writer, so memory use is a single frame regardless
+    of the number of timesteps. The output format follows the extension of
+    `output_path` (MP4 requires the `imageio-ffmpeg` plugin).
+    """
     sim_xarray = aggregated_dict["aggregated_xarray"]
 
     if vmin is None:
@@ -33,18 +51,54 @@ def create_gif_from_xarray(
     if vmax is None:
         vmax = sim_xarray.max().values
 
-    normalized = ((sim_xarray - vmin) * 255 / (vmax - vmin)).astype(np.uint8)
+    colormap_lut = get_colormap_lut(cmap)
+    scale = 255 / (vmax - vmin) if vmax != vmin else 0
+
+    with imageio.get_writer(output_path, fps=fps) as writer:
+        for timestep_idx in range(sim_xarray.sizes["timestep"]):
+            frame_values = sim_xarray.isel(timestep=timestep_idx).values
+            lut_idx = np.clip((frame_values - vmin) * scale, 0, 255)
+            lut_idx = np.nan_to_num(lut_idx).astype(np.uint8)
+            writer.append_data(colormap_lut[lut_idx])
+
+
+def _create_gif_from_render_job(render_job, **kwargs):
+    aggregated_dict, output_path = render_job
+    create_gif_from_xarray(aggregated_dict, output_path, **kwargs)
+    return output_path
+
+
+def create_gifs_from_xarrays(
+    render_jobs, number_processes=None, display_progress=True, **kwargs
+):
+    """Render several (aggregated_dict, output_path) jobs, in parallel if requested.
+
+    Args:
+        render_jobs (list[tuple[dict, str]]): Aggregated dicts (as returned by
+            `binary_minimum_by_encoding`) and the output path for each
+        number_processes (int, optional): Number of processes used. Set to 1 to
+            render serially, or None to use all CPUs
+        display_progress (bool, optional): Display rendering progress
+        **kwargs: Passed to `create_gif_from_xarray` (fps, cmap, vmin, vmax)
 
-    frames = []
-    for timestep_idx in sim_xarray.timestep:
-        # Convert to RGB using colormap
-        frame = plt.get_cmap(cmap)(normalized[timestep_idx].values)
-        # Convert to 0-255 uint8
-        frame = (frame * 255).astype(np.uint8)
-        frames.append(frame)
+    Returns:
+        List[str] of written output paths
+    """
+    process_func = partial(_create_gif_from_render_job, **kwargs)
 
-    # Save as GIF
-    imageio.mimsave(output_path, frames, fps=fps)
+    output_paths = []
+    with tqdm(total=len(render_jobs), disable=not display_progress) as pbar:
+        if number_processes == 1:
+            for render_job in render_jobs:
+                output_paths.append(process_func(render_job))
+                pbar.update()
+        else:
+            with Pool(number_processes) as p:
+                for output_path in p.imap_unordered(process_func, render_jobs):
+                    output_paths.append(output_path)
+                    pbar.update()
+
+    return output_paths
 
 
 def binary_minimum_by_encoding(attribute_xarray, attribute_minimum_key):
@@ -76,6 +130,213 @@ def binary_minimum_by_encoding(attribute_xarray, attribute_minimum_key):
     return result
 
 
+def aggregate_by_encoding(
+    attribute_xarray,
+    quantiles=DEFAULT_QUANTILES,
+    replicate_chunk_size=DEFAULT_REPLICATE_CHUNK_SIZE,
+    timestep_chunk_size=None,
+    output_path=None,
+    display_progress=True,
+):
+    """Aggregate an encoded attribute over replicates in a single pass.
+
+    The cube is streamed in blocks of `replicate_chunk_size` replicates (and
+    optionally `timestep_chunk_size` timesteps), so each block is read from the
+    store exactly once and peak memory does not depend on the number of
+    replicates. Per-cell counts of replicates at or above each encoding level
+    are accumulated per block, and the fraction at or above every level, the
+    mean and the requested quantiles are all derived from those counts.
+
+    Args:
+        attribute_xarray (xr.DataArray): Attribute with dims
+            (replicate_id, timestep, x, y) and an `attribute_encoding` attribute
+        quantiles (Sequence[float], optional): Quantiles to compute. Since the
+            attribute is categorical, these use the inverted CDF (no interpolation)
+        replicate_chunk_size (int, optional): Number of replicates read per block
+        timestep_chunk_size (int, optional): Number of timesteps held in memory
+            at once, by default all of them
+        output_path (str, optional): If provided, results are written to a Zarr
+            store at this path as they are computed rather than held in memory
+        display_progress (bool, optional): Display aggregation progress
+
+    Returns:
+        xr.Dataset with `pct_at_least` (level, timestep, x, y), `mean`
+        (timestep, x, y) and `quantile_value` (quantile, timestep, x, y)
+    """
+    attribute_encoding = attribute_xarray.attribute_encoding
+
+    description = attribute_encoding.get("description", None)
+    attribute_encoding = attribute_encoding.get("encoding", None)
+
+    if attribute_encoding is None:
+        raise ValueError(
+            "Target attribute does not have an encoding, so it cannot be aggregated."
+        )
+
+    level_names, level_values = get_encoding_levels(attribute_encoding)
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=float))
+
+    n_replicates = attribute_xarray.sizes["replicate_id"]
+    n_timesteps = attribute_xarray.sizes["timestep"]
+    width, height = attribute_xarray.sizes["x"], attribute_xarray.sizes["y"]
+    if n_replicates == 0:
+        raise ValueError("Target attribute has no replicates to aggregate.")
+
+    timestep_chunk_size = timestep_chunk_size or n_timesteps
+
+    level_shape = (len(level_values), n_timesteps, width, height)
+    mean_shape = (n_timesteps, width, height)
+    quantile_shape = (len(quantiles), n_timesteps, width, height)
+
+    if output_path is None:
+        pct_at_least = np.empty(level_shape, dtype=np.float32)
+        mean = np.empty(mean_shape, dtype=np.float32)
+        quantile_value = np.empty(quantile_shape, dtype=np.int8)
+    else:
+        output_group = zarr.open_group(output_path, mode="w")
+        pct_at_least = output_group.create_dataset(
+            "pct_at_least",
+            shape=level_shape,
+            chunks=(1, timestep_chunk_size, width, height),
+            dtype=np.float32,
+            fill_value=None,
+        )
+        mean = output_group.create_dataset(
+            "mean",
+            shape=mean_shape,
+            chunks=(timestep_chunk_size, width, height),
+            dtype=np.float32,
+            fill_value=None,
+        )
+        quantile_value = output_group.create_dataset(
+            "quantile_value",
+            shape=quantile_shape,
+            chunks=(1, timestep_chunk_size, width, height),
+            dtype=np.int8,
+            fill_value=None,
+        )
+
+    timestep_blocks = range(0, n_timesteps, timestep_chunk_size)
+    replicate_blocks = range(0, n_replicates, replicate_chunk_size)
+
+    with tqdm(
+        total=len(timestep_blocks) * len(replicate_blocks),
+        disable=not display_progress,
+    ) as pbar:
+        for timestep_start in timestep_blocks:
+            timestep_slice = slice(timestep_start, timestep_start + timestep_chunk_size)
+            n_block_timesteps = len(range(n_timesteps)[timestep_slice])
+
+            at_least_counts = np.zeros(
+                (len(level_values), n_block_timesteps, width, height), dtype=np.int32
+            )
+            value_sum = np.zeros((n_block_timesteps, width, height), dtype=np.float64)
+
+            for replicate_start in replicate_blocks:
+                block = attribute_xarray.isel(
+                    replicate_id=slice(
+                        replicate_start, replicate_start + replicate_chunk_size
+                    ),
+                    timestep=timestep_slice,
+                ).values
+
+                for level_idx, level_value in enumerate(level_values):
+                    at_least_counts[level_idx] += (block >= level_value).sum(
+                        axis=0, dtype=np.int32
+                    )
+                value_sum += block.sum(axis=0, dtype=np.float64)
+                pbar.update()
+
+            pct_at_least[:, timestep_slice] = at_least_counts / n_replicates
+            mean[timestep_slice] = value_sum / n_replicates
+
+            # Number of replicates at or below each level - the count at or above
+            # the next level up is exactly the count strictly above this one
+            at_most_counts = n_replicates - np.concatenate(
+                [at_least_counts[1:], np.zeros_like(at_least_counts[:1])]
+            )
+            for quantile_idx, quantile in enumerate(quantiles):
+                min_count = max(quantile * n_replicates, 1)
+                level_idx = np.argmax(at_most_counts >= min_count, axis=0)
+                quantile_value[quantile_idx, timestep_slice] = level_values[level_idx]
+
+    coords = {
+        "level": level_names,
+        "quantile": quantiles,
+        "timestep": attribute_xarray["timestep"].values,
+    }
+    attrs = {
+        "description": description,
+        "n_replicates": n_replicates,
+        "level_values": level_values.tolist(),
+    }
+
+    if output_path is not None:
+        for array_name, dims in [
+            ("pct_at_least", ["level", "timestep", "x", "y"]),
+            ("mean", ["timestep", "x", "y"]),
+            ("quantile_value", ["quantile", "timestep", "x", "y"]),
+        ]:
+            output_group[array_name].attrs["_ARRAY_DIMENSIONS"] = dims
+        output_group.attrs.update(attrs)
+        zarr.consolidate_metadata(output_path)
+
+        aggregated_dataset = xr.open_zarr(output_path, chunks=None)
+        return aggregated_dataset.assign_coords(coords)
+
+    return xr.Dataset(
+        data_vars={
+            "pct_at_least": (["level", "timestep", "x", "y"], pct_at_least),
+            "mean": (["timestep", "x", "y"], mean),
+            "quantile_value": (["quantile", "timestep", "x", "y"], quantile_value),
+        },
+        coords=coords,
+        attrs=attrs,
+    )
+
+
+def at_least_dict_from_aggregate(aggregated_dataset, attribute_minimum_key):
+    if attribute_minimum_key not in aggregated_dataset["level"]:
+        raise ValueError(
+            f"Minimum key {attribute_minimum_key} not found in attribute encoding."
+        )
+
+    return {
+        "aggregated_xarray": aggregated_dataset["pct_at_least"].sel(
+            level=attribute_minimum_key, drop=True
+        ),
+        "description": aggregated_dataset.attrs.get("description", None),
+        "aggregation": f"Percent of simulations with at least {attribute_minimum_key}",
+    }
+
+
+def pct_reached_by_timestep(
+    sim_xarray, attribute_name, attribute_minimum_key, timestep=None
+):
+    """Fraction of replicates reaching `attribute_minimum_key` in each cell, by
+    `timestep` (or by the end of the run if None).
+
+    Uses the per-replicate first-arrival summaries written by `ZarrManager`
+    at simulation time, rather than rescanning the full attribute cube.
+    """
+    first_arrival = sim_xarray[f"{attribute_name}_first_arrival"]
+    level_names = list(first_arrival.attrs["level_names"])
+
+    if attribute_minimum_key not in level_names:
+        raise ValueError(
+            f"Minimum key {attribute_minimum_key} not found in attribute encoding."
+        )
+
+    level_first_arrival = first_arrival.isel(
+        {f"{attribute_name}_level": level_names.index(attribute_minimum_key)}
+    )
+    reached = level_first_arrival >= 0
+    if timestep is not None:
+        reached = reached & (level_first_arrival <= timestep)
+
+    return reached.astype(float).mean(dim="replicate_id")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ingest Zarr data")
     parser.add_argument(
@@ -90,41 +351,49 @@ if __name__ == "__main__":
         default=None,
         help="Name of simulation group name",
     )
+    parser.add_argument(
+        "--replicate_chunk_size",
+        type=int,
+        default=DEFAULT_REPLICATE_CHUNK_SIZE,
+        help="Number of replicates read from the Zarr store at once",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=None,
+        help="Optional Zarr path to write aggregates to (for cubes larger than RAM)",
+    )
+    parser.add_argument(
+        "--number_processes",
+        type=int,
+        default=None,
+        help="Number of processes used to render GIFs (default: all CPUs)",
+    )
     args = parser.parse_args()
     sim_xarray = ingest_zarr(zarr_path=args.zarr_path, group_name=args.group_name)
 
     jotr_max_life_stage_xarray = sim_xarray["jotr_max_life_stage"]
 
     print(
-        f"Aggregating {jotr_max_life_stage_xarray.name} (n = {sim_xarray.dims['replicate_id']})..."
+        f"Aggregating {jotr_max_life_stage_xarray.name} (n = {sim_xarray.sizes['replicate_id']})..."
     )
 
-    pct_sim_at_least_seed = binary_minimum_by_encoding(
-        jotr_max_life_stage_xarray,
-        "SEED",
-    )
-    pct_sim_at_least_seedling = binary_minimum_by_encoding(
+    jotr_max_life_stage_aggregate = aggregate_by_encoding(
         jotr_max_life_stage_xarray,
-        "SEEDLING",
-    )
-    pct_sim_at_least_juvenile = binary_minimum_by_encoding(
-        jotr_max_life_stage_xarray,
-        "JUVENILE",
-    )
-    pct_sim_at_least_adult = binary_minimum_by_encoding(
-        jotr_max_life_stage_xarray,
-        "ADULT",
+        replicate_chunk_size=args.replicate_chunk_size,
+        output_path=args.output_path,
     )
 
-    create_gif_from_xarray(
-        pct_sim_at_least_seed, "pct_at_least_seed.gif", vmin=0, vmax=1
-    )
-    create_gif_from_xarray(
-        pct_sim_at_least_seedling, "pct_at_least_seedling.gif", vmin=0, vmax=1
-    )
-    create_gif_from_xarray(
-        pct_sim_at_least_juvenile, "pct_at_least_juvenile.gif", vmin=0, vmax=1
-    )
-    create_gif_from_xarray(
-        pct_sim_at_least_adult, "pct_at_least_adult.gif", vmin=0, vmax=1
+    render_jobs = [
+        (
+            at_least_dict_from_aggregate(jotr_max_life_stage_aggregate, life_stage_key),
+            f"pct_at_least_{life_stage_key.lower()}.gif",
+        )
+        for life_stage_key in ["SEED", "SEEDLING", "JUVENILE", "ADULT"]
+    ]
+    create_gifs_from_xarrays(
+        render_jobs,
+        number_processes=args.number_processes,
+        vmin=0,
+        vmax=1,
     )
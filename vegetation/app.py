@@ -1,108 +1,172 @@
+import json
+import time
+
+import pandas as pd
+import solara
 from ipyleaflet.leaflet import GeomanDrawControl
+from matplotlib.figure import Figure
 
-from mesa.visualization import Slider, SolaraViz, make_plot_component
-from vegetation.model.joshua_tree_agent import Vegetation, JoshuaTreeAgent
-from vegetation.space.veg_cell import VegCell
-from vegetation.viz.simple_raster_map import make_simple_raster_geospace_component
 from vegetation.cache_manager import CacheManager
+from vegetation.config.global_paths import PACKAGE_PATH
+from vegetation.model.vegetation import Vegetation
+from vegetation.viz.simple_raster_map import (
+    LifeStageRasterRenderer,
+    SnapshotRasterLeaflet,
+)
+from vegetation.viz.simulation_runner import BackgroundSimulationRunner
 
 # from patch.management import init_tree_management_control
-from vegetation.config.life_stages import LIFE_STAGE_RGB_VIZ_MAP
 
 # TODO: Push working build to artifact registry, or dockerhub, or something, while
 # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/10
 # we wait on mesa-geo PR
 
+with open(f"{PACKAGE_PATH}/config/aoi_bounds.json", "r") as f:
+    AOI_BOUNDS = json.load(f)["TST_JOTR_BOUNDS"]
+LOG_CONFIG_PATH = f"{PACKAGE_PATH}/logging/logging_config.json"
+
+# How often the page checks for a new snapshot. The simulation steps as fast as
+# it can on its own thread regardless - snapshots published in between two
+# checks are simply never drawn
+UI_FRAME_RATE = 4
+
+PLOTTED_MODEL_VARS = [
+    [
+        "Mean Age",
+        "N Agents",
+        "N Seeds",
+        "N Seedlings",
+        "N Juveniles",
+        "N Adults",
+    ],
+    ["% Refugia Cells Occupied"],
+]
 
-model_params = {
-    "num_steps": Slider("total number of steps", 20, 1, 100, 1),
-    "management_planting_density": Slider(
-        "management planting density", 0.1, 0.01, 1.0, 0.01
-    ),
-    "export_data": False,
-    "bounds": TST_JOTR_BOUNDS,
-}
-
-
-def cell_portrayal(agent):
-    if isinstance(agent, VegCell):
-        # This is very primitive, but essentially we color based on the furthest
-        # life stage of any Joshua Tree agent in the cell. If there are no agents,
-        # we color based on elevation.
-
-        if agent.jotr_max_life_stage and agent.jotr_max_life_stage > 0:
-            rgba = LIFE_STAGE_RGB_VIZ_MAP[agent.jotr_max_life_stage]
+Vegetation.set_aoi_bounds(AOI_BOUNDS)
 
-        else:
-            if not agent.refugia_status:
-                debug_normalized_elevation = int((agent.elevation / 5000) * 255)
-                rgba = (
-                    debug_normalized_elevation,
-                    debug_normalized_elevation,
-                    debug_normalized_elevation,
-                    0.25,
-                )
-            else:
-                rgba = (0, 255, 0, 1)
-        return rgba
-
-    if isinstance(agent, JoshuaTreeAgent):
-        portrayal = {}
-        portrayal["shape"] = "circle"
-        portrayal["color"] = "red"
-        portrayal["opacity"] = 0.0
-        portrayal["fillOpacity"] = 0.0
-        portrayal["stroke"] = False
-        portrayal["radius"] = 0
-
-        portrayal["description"] = f"Agent ID: {agent.unique_id}"
-
-        return portrayal
+# Colors cells by the furthest life stage of any Joshua Tree agent within them,
+# or by elevation / refugia status if there are none - rendered as whole arrays
+# rather than calling a portrayal function per cell
+raster_renderer = LifeStageRasterRenderer()
 
 
 # TODO: Circular issue between vegetation model and cache generation
 # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/24
-# manually trigger `_on_start` for now to ensure init is the same as before,
-# but we ideally want this to not kick when the solara viz is created. I suppose
-# maybe we need an `_on_viz` hook or something?
-vegetation_model = Vegetation(
-    bounds=TST_JOTR_BOUNDS, log_config_path="vegetation/config/logging_config.json"
-)
-cache_manager = CacheManager(bounds=TST_JOTR_BOUNDS, epsg=4326, model=vegetation_model)
-
-cache_manager.populate_elevation_cache_if_not_exists()
-vegetation_model._on_start()
+# The elevation cache is populated on the simulation thread, right before
+# `_on_start`, so neither runs at import or blocks the page from rendering
+def _populate_elevation_cache(vegetation_model):
+    cache_manager = CacheManager(bounds=AOI_BOUNDS, epsg=4326, model=vegetation_model)
+    cache_manager.populate_elevation_cache_if_not_exists()
+
+
+def make_simulation_runner(num_steps, management_planting_density):
+    vegetation_model = Vegetation(
+        num_steps=num_steps,
+        management_planting_density=management_planting_density,
+        log_config_path=LOG_CONFIG_PATH,
+    )
+    runner = BackgroundSimulationRunner(
+        vegetation_model, on_start=_populate_elevation_cache
+    )
+    runner.start()
+    return runner
+
+
+@solara.component
+def ModelVarsPlot(model_vars, measures):
+    fig = Figure()
+    ax = fig.subplots()
+    if model_vars:
+        df = pd.DataFrame(model_vars).set_index("Step")
+        for measure in measures:
+            ax.plot(df.index, df[measure], label=measure)
+        ax.legend(loc="best")
+    ax.set_xlabel("Step")
+    solara.FigureMatplotlib(fig)
+
+
+@solara.component
+def Page():
+    num_steps = solara.use_reactive(20)
+    management_planting_density = solara.use_reactive(0.1)
+    n_steps_to_run = solara.use_reactive(5)
+    n_resets, set_n_resets = solara.use_state(0)
+
+    runner = solara.use_memo(
+        lambda: make_simulation_runner(
+            num_steps.value, management_planting_density.value
+        ),
+        dependencies=[n_resets],
+    )
+    # Stop the old simulation thread when the model is reset or the page closes
+    solara.use_effect(lambda: runner.stop, dependencies=[runner])
+
+    snapshot, set_snapshot = solara.use_state(None)
+
+    def poll_snapshots(cancel):
+        latest_snapshot = None
+        while not cancel.is_set():
+            if runner.latest_snapshot is not latest_snapshot:
+                latest_snapshot = runner.latest_snapshot
+                set_snapshot(latest_snapshot)
+            time.sleep(1 / UI_FRAME_RATE)
+
+    solara.use_thread(poll_snapshots, dependencies=[runner])
+
+    def make_tree_management_control():
+        def on_management_draw(*args, **kwargs):
+            # Management draws mutate the model, so they are queued for the
+            # simulation thread rather than applied from the UI thread
+            runner.submit(
+                lambda model: model.add_agents_from_management_draw(*args, **kwargs)
+            )
+
+        tree_management = GeomanDrawControl(
+            drag=False, cut=False, rotate=False, polyline={}
+        )
+        tree_management.on_draw(on_management_draw)
+        return tree_management
+
+    tree_management = solara.use_memo(
+        make_tree_management_control, dependencies=[runner]
+    )
+
+    with solara.Sidebar():
+        solara.SliderInt("total number of steps", value=num_steps, min=1, max=100)
+        solara.SliderFloat(
+            "management planting density",
+            value=management_planting_density,
+            min=0.01,
+            max=1.0,
+            step=0.01,
+        )
+        with solara.Row():
+            solara.Button("Play", on_click=runner.play)
+            solara.Button("Pause", on_click=runner.pause)
+            solara.Button("Reset", on_click=lambda: set_n_resets(n_resets + 1))
+        with solara.Row():
+            solara.InputInt("steps", value=n_steps_to_run)
+            solara.Button("Step", on_click=lambda: runner.step(n_steps_to_run.value))
+
+        if runner.error is not None:
+            solara.Error(f"Simulation stopped: {runner.error!r}")
+        elif snapshot is None:
+            solara.Info("Loading study area...")
+        else:
+            solara.Markdown(f"**Step:** {snapshot.step} / {num_steps.value}")
 
-tree_management = GeomanDrawControl(drag=False, cut=False, rotate=False, polyline={})
-tree_management.on_draw(vegetation_model.add_agents_from_management_draw)
+    ## TODO: Solara only works after first auto-reload
+    # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/21
+    with solara.Column():
+        if snapshot is not None:
+            SnapshotRasterLeaflet(
+                snapshot, raster_renderer, zoom=14, controls=[tree_management]
+            )
+            for measures in PLOTTED_MODEL_VARS:
+                ModelVarsPlot(snapshot.model_vars, measures)
 
-## TODO: Solara only works after first auto-reload
-# Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/21
 
-page = SolaraViz(
-    vegetation_model,
-    name="Veg Model",
-    components=[
-        make_simple_raster_geospace_component(
-            cell_portrayal, zoom=14, controls=[tree_management]
-        ),
-        make_plot_component(
-            [
-                "Mean Age",
-                "N Agents",
-                "N Seeds",
-                "N Seedlings",
-                "N Juveniles",
-                "N Adults",
-            ],
-        ),
-        make_plot_component(
-            ["% Refugia Cells Occupied"],
-        ),
-        # make_log_window_component(),
-    ],
-    model_params=model_params,
-)
+page = Page
 
 if __name__ == "__main__":
     # Run your Solara app
@@ -1,12 +1,21 @@
+import cProfile
+import logging
+import os
 from collections.abc import Iterable, Mapping
+from contextlib import nullcontext
 from functools import partial
 from multiprocessing import Pool
 from typing import Any
 
-from mesa.batchrunner import _collect_data, _make_model_kwargs
+import numpy as np
+import pandas as pd
+from mesa.batchrunner import _make_model_kwargs
 from mesa.model import Model
 from tqdm.auto import tqdm
 
+from vegetation.batch.convergence import ConvergenceCriteria
+from vegetation.batch.result_cache import CachedRun, RunResultCache
+
 
 def jotr_batch_run(
     model_cls: type[Model],
@@ -18,7 +27,12 @@ def jotr_batch_run(
     data_collection_period: int = -1,
     max_steps: int = 1000,
     display_progress: bool = True,
-) -> list[dict[str, Any]]:
+    include_step_profile: bool = False,
+    cprofile_dir: str | None = None,
+    convergence: ConvergenceCriteria | None = None,
+    seed: int | None = None,
+    result_cache: RunResultCache | None = None,
+) -> pd.DataFrame:
     """Batch run a mesa model with a set of parameter values.
 
     Args:
@@ -29,20 +43,25 @@ def jotr_batch_run(
         data_collection_period (int, optional): Number of steps after which data gets collected, by default -1 (end of episode)
         max_steps (int, optional): Maximum number of model steps after which the model halts, by default 1000
         display_progress (bool, optional): Display batch run process, by default True
+        include_step_profile (bool, optional): Add each step's phase timings and event counters (from the model's `step_profiler`) as columns, by default False
+        cprofile_dir (str, optional): If set, run the first run (RunId 0) under cProfile and dump its stats to `run_0.prof` in this directory, by default None
+        convergence (ConvergenceCriteria, optional): If set, run iterations in waves and stop each parameter combination once its outputs have converged, with `iterations` as the most it may run, by default None
+        seed (int, optional): Seed of the whole batch, which iteration seeds are drawn from (from the OS if not given), by default None
+        result_cache (RunResultCache, optional): If set, runs already in the cache are read from it rather than simulated, and new runs are added to it, by default None
 
     Returns:
-        List[Dict[str, Any]]
+        pd.DataFrame: One row per collected step of each run, with the run's id, iteration, parameters and seed as columns. With `convergence`, `attrs["convergence"]` holds each parameter combination's number of iterations, interval half widths and whether it converged
 
     Notes:
-        batch_run assumes the model has a `datacollector` attribute that has a DataCollector object initialized.
+        batch_run assumes the model has a `datacollector` attribute that has a ColumnarDataCollector object initialized.
+
+        Iteration k of every parameter combination runs with the same `seed` model parameter (common random numbers), so that combinations are compared on the same background demography - unless `seed` is one of the `model_parameters`.
+
+        Runs are only found in `result_cache` when their seed is the same, so pass the same `seed` to rerun a batch (or extend its parameter grid) from the cache.
 
     """
-    runs_list = []
-    run_id = 0
-    for iteration in range(iterations):
-        for kwargs in _make_model_kwargs(model_parameters):
-            runs_list.append((run_id, iteration, kwargs))
-            run_id += 1
+    all_kwargs = list(_make_model_kwargs(model_parameters))
+    iteration_seeds = get_iteration_seeds(seed, iterations)
 
     process_func = partial(
         _jotr_model_run_func,
@@ -50,30 +69,310 @@ def jotr_batch_run(
         class_parameters_dict,
         max_steps=max_steps,
         data_collection_period=data_collection_period,
+        include_step_profile=include_step_profile,
+        cprofile_dir=cprofile_dir,
+        cell_life_stage=convergence.cell_life_stage if convergence else None,
+        result_cache=result_cache,
     )
 
-    results: list[dict[str, Any]] = []
+    # Workers are kept for every wave of a sequential run
+    pool = None if number_processes == 1 else Pool(number_processes)
+    with tqdm(
+        total=iterations * len(all_kwargs), disable=not display_progress
+    ) as pbar, (pool or nullcontext()):
+        if convergence is not None:
+            return _run_in_waves(
+                process_func,
+                all_kwargs,
+                iteration_seeds,
+                convergence,
+                pool,
+                pbar,
+            )
+
+        # Run ids count every parameter combination of an iteration before
+        # moving on to the next iteration
+        runs_list = [
+            (
+                iteration * len(all_kwargs) + kwargs_idx,
+                iteration,
+                _get_iteration_kwargs(kwargs, iteration_seeds[iteration]),
+            )
+            for iteration in range(iterations)
+            for kwargs_idx, kwargs in enumerate(all_kwargs)
+        ]
+        results = list(_map_runs(process_func, runs_list, pool, pbar))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def get_iteration_seeds(seed, n_iterations):
+    """Independent seeds of each iteration, spawned from a batch seed."""
+    # 63 bits, so that seed columns stay int64
+    return [
+        int(iteration_seed_sequence.generate_state(1, np.uint64)[0]) >> 1
+        for iteration_seed_sequence in np.random.SeedSequence(seed).spawn(n_iterations)
+    ]
+
+
+def _get_iteration_kwargs(kwargs, iteration_seed):
+    if "seed" in kwargs:
+        return kwargs
+    return {**kwargs, "seed": iteration_seed}
+
 
-    with tqdm(total=len(runs_list), disable=not display_progress) as pbar:
+def _map_runs(process_func, runs_list, pool, pbar):
+    if pool is None:
+        run_results = map(process_func, runs_list)
+    else:
+        run_results = pool.imap_unordered(process_func, runs_list)
+
+    for run_result in run_results:
+        pbar.update()
+        yield run_result
+
+
+def _run_in_waves(process_func, all_kwargs, iteration_seeds, convergence, pool, pbar):
+    n_kwargs = len(all_kwargs)
+    max_iterations = len(iteration_seeds)
+    n_iterations = [0] * n_kwargs
+    final_values = [[] for __kwargs in all_kwargs]
+    cells_reached = [[] for __kwargs in all_kwargs]
+    statuses = [None] * n_kwargs
+
+    results = []
+    active = list(range(n_kwargs))
+    while active:
+        runs_list = []
+        for kwargs_idx in active:
+            wave_size = (
+                convergence.min_iterations
+                if n_iterations[kwargs_idx] == 0
+                else convergence.wave_size
+            )
+            wave_end = min(n_iterations[kwargs_idx] + wave_size, max_iterations)
+            runs_list.extend(
+                (
+                    iteration * n_kwargs + kwargs_idx,
+                    iteration,
+                    _get_iteration_kwargs(
+                        all_kwargs[kwargs_idx], iteration_seeds[iteration]
+                    ),
+                )
+                for iteration in range(n_iterations[kwargs_idx], wave_end)
+            )
+            n_iterations[kwargs_idx] = wave_end
+
+        for run_result in _map_runs(process_func, runs_list, pool, pbar):
+            if convergence.cell_life_stage is not None:
+                data, run_cells_reached = run_result
+            else:
+                data, run_cells_reached = run_result, None
+
+            kwargs_idx = int(data["RunId"].iat[0]) % n_kwargs
+            results.append(data)
+            final_values[kwargs_idx].append(data.iloc[-1])
+            cells_reached[kwargs_idx].append(run_cells_reached)
+
+        for kwargs_idx in active:
+            statuses[kwargs_idx] = convergence.get_status(
+                pd.DataFrame(final_values[kwargs_idx]), cells_reached[kwargs_idx]
+            )
+            logging.info(
+                f"Convergence of {all_kwargs[kwargs_idx]}: {statuses[kwargs_idx]}"
+            )
+
+        active = [
+            kwargs_idx
+            for kwargs_idx in active
+            if not statuses[kwargs_idx]["converged"]
+            and n_iterations[kwargs_idx] < max_iterations
+        ]
+
+    results = pd.concat(results, ignore_index=True)
+    results.attrs["convergence"] = pd.DataFrame(
+        [{**kwargs, **status} for kwargs, status in zip(all_kwargs, statuses)]
+    )
+    return results
+
+
+def jotr_lockstep_batch_run(
+    model_cls: type,
+    model_parameters: Mapping[str, Any | Iterable[Any]],
+    class_parameters_dict: dict[str, Any],
+    number_processes: int | None = 1,
+    iterations: int = 1,
+    data_collection_period: int = -1,
+    max_steps: int = 1000,
+    display_progress: bool = True,
+    include_step_profile: bool = False,
+    seed: int | None = None,
+) -> pd.DataFrame:
+    """Batch run a lockstep model, simulating all iterations of each parameter combination together.
+
+    Args:
+        model_cls (Type): The lockstep model class to batch-run, e.g. `LockstepVegetation`
+        model_parameters (Mapping[str, Union[Any, Iterable[Any]]]): Dictionary with model parameters over which to run the model. You can either pass single values or iterables.
+        class_parameters_dict (dict[str, Any]): AOI bounds, attribute encodings and cell attributes to save, set on the model class before each run
+        number_processes (int, optional): Number of processes used to run parameter combinations in parallel, by default 1. Set this to None if you want to use all CPUs.
+        iterations (int, optional): Number of replicates simulated in lockstep for each parameter combination, by default 1
+        data_collection_period (int, optional): Number of steps after which data gets collected, by default -1 (end of episode)
+        max_steps (int, optional): Maximum number of model steps after which the model halts, by default 1000
+        display_progress (bool, optional): Display batch run process, by default True
+        include_step_profile (bool, optional): Add each step's phase timings and event counters (shared by all replicates of a parameter combination) as columns, by default False
+        seed (int, optional): Seed of the whole batch, which the seed shared by every parameter combination is drawn from (from the OS if not given), by default None
+
+    Returns:
+        pd.DataFrame: The same layout as `jotr_batch_run` - one row per collected step of each replicate, with its run id, iteration, parameters and seed as columns
+
+    """
+    (combination_seed,) = get_iteration_seeds(seed, 1)
+    all_kwargs = [
+        _get_iteration_kwargs(kwargs, combination_seed)
+        for kwargs in _make_model_kwargs(model_parameters)
+    ]
+
+    process_func = partial(
+        _lockstep_model_run_func,
+        model_cls,
+        class_parameters_dict,
+        n_runs_per_iteration=len(all_kwargs),
+        iterations=iterations,
+        max_steps=max_steps,
+        data_collection_period=data_collection_period,
+        include_step_profile=include_step_profile,
+    )
+
+    results: list[pd.DataFrame] = []
+
+    with tqdm(total=len(all_kwargs), disable=not display_progress) as pbar:
         if number_processes == 1:
-            for run in runs_list:
-                data = process_func(run)
-                results.extend(data)
+            for kwargs_data in enumerate(all_kwargs):
+                results.append(process_func(kwargs_data))
                 pbar.update()
         else:
             with Pool(number_processes) as p:
-                for data in p.imap_unordered(process_func, runs_list):
-                    results.extend(data)
+                for data in p.imap_unordered(process_func, enumerate(all_kwargs)):
+                    results.append(data)
                     pbar.update()
 
-    return results
+    return pd.concat(results, ignore_index=True)
+
+
+def _lockstep_model_run_func(
+    vegetation_cls,
+    class_parameters_dict,
+    kwargs_data,
+    n_runs_per_iteration,
+    iterations,
+    max_steps,
+    data_collection_period,
+    include_step_profile=False,
+):
+    kwargs_idx, kwargs = kwargs_data
+
+    _set_class_parameters(vegetation_cls, class_parameters_dict)
+    vegetation = vegetation_cls(n_replicates=iterations, **kwargs)
+    _run_model(vegetation, max_steps)
+
+    rows = _get_collected_rows(vegetation.steps, data_collection_period)
+    data = vegetation.get_dataframe(rows=rows, constant_columns=kwargs)
+
+    # The same run ids as `jotr_batch_run`, which numbers every parameter
+    # combination of one iteration before moving on to the next
+    data.insert(0, "RunId", data["iteration"] * n_runs_per_iteration + kwargs_idx)
+
+    if include_step_profile:
+        data = data.merge(
+            vegetation.step_profiler.get_dataframe(), on="Step", how="left"
+        )
+
+    return data
 
 
 def _jotr_model_run_func(
-    vegetation_cls, class_parameters_dict, run_data, max_steps, data_collection_period
+    vegetation_cls,
+    class_parameters_dict,
+    run_data,
+    max_steps,
+    data_collection_period,
+    include_step_profile=False,
+    cprofile_dir=None,
+    cell_life_stage=None,
+    result_cache=None,
 ):
     run_id, iteration, kwargs = run_data
 
+    if result_cache is not None:
+        cache_key = result_cache.get_key(
+            vegetation_cls,
+            class_parameters_dict,
+            kwargs,
+            max_steps=max_steps,
+            data_collection_period=data_collection_period,
+            include_step_profile=include_step_profile,
+        )
+        cached_run = result_cache.get(cache_key)
+        if cached_run is not None and (
+            cell_life_stage is None or cached_run.max_life_stages is not None
+        ):
+            logging.debug(f"Run {run_id} read from the result cache")
+            data = cached_run.data.assign(RunId=run_id, iteration=iteration)
+            if cell_life_stage is not None:
+                return data, cached_run.max_life_stages >= cell_life_stage
+            return data
+
+    _set_class_parameters(vegetation_cls, class_parameters_dict)
+    vegetation = vegetation_cls(**kwargs)
+
+    if cprofile_dir is not None and run_id == 0:
+        with cProfile.Profile() as profile:
+            _run_model(vegetation, max_steps)
+
+        os.makedirs(cprofile_dir, exist_ok=True)
+        cprofile_path = os.path.join(cprofile_dir, f"run_{run_id}.prof")
+        profile.dump_stats(cprofile_path)
+        logging.info(f"Wrote cProfile stats for run {run_id} to {cprofile_path}")
+    else:
+        _run_model(vegetation, max_steps)
+
+    rows = _get_collected_rows(vegetation.steps, data_collection_period)
+
+    # Run parameters are constant per run, so they are only broadcast into
+    # columns here rather than stored with every collected step
+    data = vegetation.datacollector.get_dataframe(
+        rows=rows,
+        constant_columns={"RunId": run_id, "iteration": iteration, **kwargs},
+    )
+
+    if include_step_profile:
+        data = data.merge(
+            vegetation.step_profiler.get_dataframe(), on="Step", how="left"
+        )
+
+    max_life_stages = None
+    if cell_life_stage is not None:
+        max_life_stages = vegetation.space.get_max_life_stage_raster()
+
+    if result_cache is not None:
+        # Where the run's replicate was saved, if it was
+        cached_run = CachedRun(data=data, max_life_stages=max_life_stages)
+        zarr_manager = getattr(vegetation, "_zarr_manager", None)
+        if zarr_manager is not None:
+            cached_run.zarr_filename = zarr_manager.filename
+            cached_run.zarr_group = zarr_manager.group_name
+            cached_run.replicate_idx = vegetation.replicate_idx
+        result_cache.put(cache_key, cached_run)
+
+    # Which cells ended the run at or above the life stage, for convergence of
+    # per-cell probabilities
+    if cell_life_stage is not None:
+        return data, max_life_stages >= cell_life_stage
+
+    return data
+
+
+def _set_class_parameters(vegetation_cls, class_parameters_dict):
     # This is a hack to get the parallel pool to work with class level
     # attributes - at this point, it's a hack of a hack which was meant to
     # keep the vegetation run attributes seperate from higher level attributes that
@@ -91,43 +390,15 @@ def _jotr_model_run_func(
             cell_attributes_to_save=class_parameters_dict["cell_attributes_to_save"]
         )
 
-    vegetation = vegetation_cls(**kwargs)
 
-    while vegetation.running and vegetation.steps <= max_steps:
-        vegetation.step()
+def _get_collected_rows(n_steps, data_collection_period):
+    # Rows of the datacollector to keep - there is one row per step
+    rows = list(range(0, n_steps, data_collection_period))
+    if not rows or rows[-1] != n_steps - 1:
+        rows.append(n_steps - 1)
+    return rows
 
-    data = []
-    steps = list(range(0, vegetation.steps, data_collection_period))
-    if not steps or steps[-1] != vegetation.steps - 1:
-        steps.append(vegetation.steps - 1)
-
-    for step in steps:
-        vegetation_data, __all_agents_data = _collect_data(vegetation, step)
-
-        # # If there are agent_reporters, then create an entry for each agent
-        # if all_agents_data:
-        #     stepdata = [
-        #         {
-        #             "RunId": run_id,
-        #             "iteration": iteration,
-        #             "Step": step,
-        #             **kwargs,
-        #             **vegetation_data,
-        #             **agent_data,
-        #         }
-        #         for agent_data in all_agents_data
-        #     ]
-        # # If there is only vegetation data, then create a single entry for the step
-        # else:
-        stepdata = [
-            {
-                "RunId": run_id,
-                "iteration": iteration,
-                "Step": step,
-                **kwargs,
-                **vegetation_data,
-            }
-        ]
-        data.extend(stepdata)
 
-    return data
+def _run_model(vegetation, max_steps):
+    while vegetation.running and vegetation.steps <= max_steps:
+        vegetation.step()
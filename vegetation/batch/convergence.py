@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, t
+
+
+def get_reporter_intervals(
+    final_values: pd.DataFrame, confidence: float = 0.95
+) -> pd.DataFrame:
+    """
+    Mean and confidence interval half width (Student's t) of each reporter
+    column over replicates - the half width is infinite with fewer than two.
+    """
+    n = len(final_values)
+    means = final_values.mean()
+    if n < 2:
+        half_widths = pd.Series(np.inf, index=final_values.columns)
+    else:
+        half_widths = (
+            t.ppf((1 + confidence) / 2, n - 1) * final_values.std(ddof=1) / np.sqrt(n)
+        )
+    return pd.DataFrame({"n": n, "mean": means, "half_width": half_widths})
+
+
+def get_max_cell_probability_half_width(
+    cells_reached: np.ndarray, confidence: float = 0.95
+) -> float:
+    """
+    Largest confidence interval half width (Agresti-Coull) of the per-cell
+    probability of reaching a life stage, from a (replicate, ...) bool array.
+
+    Unlike the plain normal interval, this doesn't collapse to zero for cells
+    that no replicate has reached (yet).
+    """
+    n = len(cells_reached)
+    z = norm.ppf((1 + confidence) / 2)
+    p_adjusted = (cells_reached.sum(axis=0) + z**2 / 2) / (n + z**2)
+    half_widths = z * np.sqrt(p_adjusted * (1 - p_adjusted) / (n + z**2))
+    return float(half_widths.max())
+
+
+@dataclass(frozen=True)
+class ConvergenceCriteria:
+    """
+    When a parameter combination of a sequential batch run has enough
+    replicates: replicates run in waves of `wave_size` (after a first wave of
+    `min_iterations`), until the confidence interval of each reporter's final
+    value is within `relative_precision` of its mean (or `absolute_precision`,
+    whichever is larger) - and, if `cell_life_stage` is set, the per-cell
+    probability of ending a run at or above that life stage is known to
+    within `cell_precision`.
+    """
+
+    reporters: Sequence[str] = ("N Adults", "% Refugia Cells Occupied")
+    relative_precision: float = 0.05
+    absolute_precision: float = 0.0
+    confidence: float = 0.95
+    cell_life_stage: Optional[int] = None
+    cell_precision: float = 0.1
+    wave_size: int = 10
+    min_iterations: int = 10
+
+    def __post_init__(self):
+        if self.wave_size < 1 or self.min_iterations < 2:
+            raise ValueError(
+                "Convergence needs a wave size of at least 1 and at least 2 iterations"
+            )
+
+    def get_status(self, final_values: pd.DataFrame, cells_reached=None) -> dict:
+        """Whether replicates so far have converged, with the intervals checked."""
+        intervals = get_reporter_intervals(
+            final_values[list(self.reporters)], self.confidence
+        )
+        tolerance = np.maximum(
+            self.relative_precision * intervals["mean"].abs(), self.absolute_precision
+        )
+        converged = bool((intervals["half_width"] <= tolerance).all())
+
+        status = {
+            "n_iterations": len(final_values),
+            **{
+                f"{reporter} half width": half_width
+                for reporter, half_width in intervals["half_width"].items()
+            },
+        }
+        if self.cell_life_stage is not None:
+            cell_half_width = get_max_cell_probability_half_width(
+                np.asarray(cells_reached), self.confidence
+            )
+            converged = converged and cell_half_width <= self.cell_precision
+            status["max cell probability half width"] = cell_half_width
+
+        status["converged"] = converged
+        return status
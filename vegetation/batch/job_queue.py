@@ -0,0 +1,415 @@
+import importlib
+import json
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from contextlib import contextmanager
+from multiprocessing import Process
+from typing import Any
+
+import pandas as pd
+from mesa.batchrunner import _make_model_kwargs
+from tqdm.auto import tqdm
+
+from vegetation.batch.batchrunner import (
+    _get_iteration_kwargs,
+    _jotr_model_run_func,
+    get_iteration_seeds,
+)
+
+JOB_STATUSES = ("pending", "running", "done", "failed")
+
+
+class JobQueue:
+    """
+    The run plan of a batch sweep in a SQLite database, which any number of
+    workers (on any host that can reach the file) drain together.
+
+    Workers claim a run with a lease of `lease_seconds`, renewed by heartbeat
+    while the run is simulated. Runs whose lease expires - their worker died or
+    lost its host - are claimed again, up to `max_attempts` times. The database
+    uses SQLite's default rollback journal rather than WAL, which shared
+    (network) filesystems don't support.
+    """
+
+    def __init__(self, path, lease_seconds=600, max_attempts=3):
+        self.path = os.fspath(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        with self._connect(write=True) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    run_id INTEGER PRIMARY KEY,
+                    iteration INTEGER NOT NULL,
+                    kwargs TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    n_attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    result BLOB
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self, write=False):
+        # Autocommit, so that writes can take the lock up front - otherwise
+        # concurrent claims could both read the same pending run
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            if write:
+                connection.execute("BEGIN IMMEDIATE")
+            yield connection
+            if write:
+                connection.execute("COMMIT")
+        except BaseException:
+            if write:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def submit(
+        self,
+        model_cls,
+        model_parameters: Mapping[str, Any | Iterable[Any]],
+        class_parameters_dict: dict[str, Any],
+        iterations: int = 1,
+        max_steps: int = 1000,
+        data_collection_period: int = -1,
+        include_step_profile: bool = False,
+        seed: int | None = None,
+    ):
+        """
+        Add the runs of a batch sweep, numbered as `jotr_batch_run` numbers
+        them. Submitting the same sweep again (to resume it) adds nothing, but
+        a queue only holds one sweep.
+        """
+        all_kwargs = list(_make_model_kwargs(model_parameters))
+        iteration_seeds = get_iteration_seeds(seed, iterations)
+        meta = {
+            "model_cls": f"{model_cls.__module__}:{model_cls.__qualname__}",
+            "class_parameters_dict": class_parameters_dict,
+            "max_steps": max_steps,
+            "data_collection_period": data_collection_period,
+            "include_step_profile": include_step_profile,
+            "model_parameters": dict(model_parameters),
+            "iterations": iterations,
+            "seed": seed,
+        }
+
+        existing_meta = self.get_meta()
+        if existing_meta:
+            if existing_meta != json.loads(json.dumps(meta)):
+                raise ValueError(
+                    f"Job queue {self.path} already holds a different sweep"
+                )
+            if seed is None:
+                # A random seed is drawn on each submit - keep the first plan
+                return
+
+        with self._connect(write=True) as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in meta.items()],
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (run_id, iteration, kwargs) VALUES (?, ?, ?)",
+                [
+                    (
+                        iteration * len(all_kwargs) + kwargs_idx,
+                        iteration,
+                        json.dumps(
+                            _get_iteration_kwargs(kwargs, iteration_seeds[iteration])
+                        ),
+                    )
+                    for iteration in range(iterations)
+                    for kwargs_idx, kwargs in enumerate(all_kwargs)
+                ],
+            )
+
+    def get_meta(self) -> dict[str, Any]:
+        with self._connect() as connection:
+            rows = connection.execute("SELECT key, value FROM meta").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def claim(self, worker_id):
+        """Lease the next pending (or expired) run, as (run_id, iteration, kwargs)."""
+        now = time.time()
+        with self._connect(write=True) as connection:
+            # Runs whose every attempt expired (e.g. they keep killing their
+            # worker) aren't retried forever
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'failed', error = 'Lease expired'
+                WHERE status = 'running' AND lease_expires_at < ?
+                    AND n_attempts >= ?
+                """,
+                (now, self.max_attempts),
+            )
+            row = connection.execute(
+                """
+                SELECT run_id, iteration, kwargs FROM jobs
+                WHERE status = 'pending'
+                    OR (status = 'running' AND lease_expires_at < ?)
+                ORDER BY run_id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            run_id, iteration, kwargs = row
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'running', worker_id = ?,
+                    lease_expires_at = ?, n_attempts = n_attempts + 1
+                WHERE run_id = ?
+                """,
+                (worker_id, now + self.lease_seconds, run_id),
+            )
+        return run_id, iteration, json.loads(kwargs)
+
+    def heartbeat(self, run_id, worker_id) -> bool:
+        """Renew a lease - False if the worker no longer holds it."""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?
+                WHERE run_id = ? AND worker_id = ? AND status = 'running'
+                """,
+                (time.time() + self.lease_seconds, run_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, run_id, worker_id, data: pd.DataFrame):
+        # A worker whose lease expired may still finish - its result is kept,
+        # as any attempt of a run simulates the same thing
+        with self._connect() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'done', worker_id = ?, error = NULL,
+                    result = ?
+                WHERE run_id = ? AND status != 'done'
+                """,
+                (
+                    worker_id,
+                    pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL),
+                    run_id,
+                ),
+            )
+
+    def fail(self, run_id, worker_id, error: str):
+        """Put a run back in the queue, or mark it failed after `max_attempts`."""
+        with self._connect() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN n_attempts < ? THEN 'pending' ELSE 'failed' END,
+                    lease_expires_at = NULL, error = ?
+                WHERE run_id = ? AND worker_id = ? AND status = 'running'
+                """,
+                (self.max_attempts, error, run_id, worker_id),
+            )
+
+    def get_progress(self) -> dict[str, int]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: 0 for status in JOB_STATUSES} | dict(rows)
+
+    def is_finished(self) -> bool:
+        progress = self.get_progress()
+        return progress["pending"] == 0 and progress["running"] == 0
+
+    def get_results(self) -> pd.DataFrame:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT result FROM jobs WHERE status = 'done' ORDER BY run_id"
+            ).fetchall()
+        if not rows:
+            # Every run failed, or none were submitted
+            return pd.DataFrame()
+        return pd.concat(
+            [pickle.loads(result) for (result,) in rows], ignore_index=True
+        )
+
+    def get_failures(self) -> pd.DataFrame:
+        with self._connect() as connection:
+            return pd.read_sql_query(
+                """
+                SELECT run_id, iteration, kwargs, worker_id, n_attempts, error
+                FROM jobs WHERE status = 'failed' ORDER BY run_id
+                """,
+                connection,
+            )
+
+
+def _import_model_cls(model_cls_path):
+    module_name, qualname = model_cls_path.split(":")
+    model_cls = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        model_cls = getattr(model_cls, name)
+    return model_cls
+
+
+def _heartbeat_until(stop_event, job_queue, run_id, worker_id):
+    while not stop_event.wait(job_queue.lease_seconds / 3):
+        if not job_queue.heartbeat(run_id, worker_id):
+            logging.warning(f"Worker {worker_id} lost its lease on run {run_id}")
+            return
+
+
+def run_worker(
+    queue_path, worker_id=None, lease_seconds=600, max_attempts=3, poll_seconds=5.0
+) -> int:
+    """
+    Claim and simulate runs of a job queue until none are left - waiting on
+    runs leased by other workers, in case their lease expires. Returns the
+    number of runs this worker completed.
+    """
+    job_queue = JobQueue(queue_path, lease_seconds, max_attempts)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    meta = job_queue.get_meta()
+    if not meta:
+        raise ValueError(f"Job queue {queue_path} has no sweep submitted")
+
+    model_cls = _import_model_cls(meta["model_cls"])
+
+    n_completed = 0
+    while True:
+        job = job_queue.claim(worker_id)
+        if job is None:
+            if job_queue.is_finished():
+                return n_completed
+            time.sleep(poll_seconds)
+            continue
+
+        run_id = job[0]
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat_until,
+            args=(stop_event, job_queue, run_id, worker_id),
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            data = _jotr_model_run_func(
+                model_cls,
+                meta["class_parameters_dict"],
+                job,
+                max_steps=meta["max_steps"],
+                data_collection_period=meta["data_collection_period"],
+                include_step_profile=meta["include_step_profile"],
+            )
+        except Exception as e:
+            logging.exception(f"Run {run_id} failed on worker {worker_id}")
+            job_queue.fail(run_id, worker_id, repr(e))
+        else:
+            job_queue.complete(run_id, worker_id, data)
+            n_completed += 1
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+
+def jotr_queue_batch_run(
+    model_cls,
+    model_parameters: Mapping[str, Any | Iterable[Any]],
+    class_parameters_dict: dict[str, Any],
+    queue_path: str,
+    number_processes: int = 1,
+    iterations: int = 1,
+    data_collection_period: int = -1,
+    max_steps: int = 1000,
+    display_progress: bool = True,
+    include_step_profile: bool = False,
+    seed: int | None = None,
+    lease_seconds: int = 600,
+    max_attempts: int = 3,
+) -> pd.DataFrame:
+    """Batch run a mesa model through a job queue, which workers on other hosts may help drain.
+
+    Args:
+        model_cls (Type[Model]): The model class to batch-run, importable by workers
+        model_parameters (Mapping[str, Union[Any, Iterable[Any]]]): Dictionary with model parameters over which to run the model. You can either pass single values or iterables.
+        class_parameters_dict (dict[str, Any]): AOI bounds, attribute encodings and cell attributes to save, set on the model class before each run
+        queue_path (str): Path of the SQLite job queue, on a filesystem shared with any other workers. An existing queue of the same sweep is resumed
+        number_processes (int, optional): Number of local worker processes, by default 1. Set this to 0 to only wait on workers started elsewhere
+        iterations (int, optional): Number of iterations for each parameter combination, by default 1
+        data_collection_period (int, optional): Number of steps after which data gets collected, by default -1 (end of episode)
+        max_steps (int, optional): Maximum number of model steps after which the model halts, by default 1000
+        display_progress (bool, optional): Display batch run process, by default True
+        include_step_profile (bool, optional): Add each step's phase timings and event counters as columns, by default False
+        seed (int, optional): Seed of the whole batch, which iteration seeds are drawn from (from the OS if not given), by default None
+        lease_seconds (int, optional): How long a worker may go without a heartbeat before its run is claimed again, by default 600
+        max_attempts (int, optional): How many times a run is tried before it is marked failed, by default 3
+
+    Returns:
+        pd.DataFrame: The same layout as `jotr_batch_run`, from the runs that completed
+
+    Notes:
+        Other workers join with `python -m vegetation.batch.worker --job_queue <queue_path>`.
+
+    """
+    job_queue = JobQueue(queue_path, lease_seconds, max_attempts)
+    job_queue.submit(
+        model_cls,
+        model_parameters,
+        class_parameters_dict,
+        iterations=iterations,
+        max_steps=max_steps,
+        data_collection_period=data_collection_period,
+        include_step_profile=include_step_profile,
+        seed=seed,
+    )
+
+    workers = [
+        Process(
+            target=run_worker,
+            args=(queue_path,),
+            kwargs={
+                "lease_seconds": lease_seconds,
+                "max_attempts": max_attempts,
+                "poll_seconds": 1.0,
+            },
+        )
+        for __worker in range(number_processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    progress = job_queue.get_progress()
+    with tqdm(total=sum(progress.values()), disable=not display_progress) as pbar:
+        while True:
+            progress = job_queue.get_progress()
+            pbar.update(progress["done"] + progress["failed"] - pbar.n)
+            if progress["pending"] == 0 and progress["running"] == 0:
+                break
+            if workers and not any(worker.is_alive() for worker in workers):
+                raise RuntimeError(
+                    f"All local workers exited with runs left in {queue_path}"
+                )
+            time.sleep(1)
+
+    for worker in workers:
+        worker.join()
+
+    if progress["failed"]:
+        logging.warning(
+            f"{progress['failed']} runs failed:\n{job_queue.get_failures().to_string()}"
+        )
+
+    return job_queue.get_results()
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from vegetation.config.global_paths import (
+    INITIAL_AGENTS_PATH,
+    PACKAGE_PATH,
+    TRANSITION_RATES_PATH,
+)
+from vegetation.utils.zarr_manager import ZarrManager
+
+# Subpackages whose source decides what a run simulates or collects - a
+# change to any of them (or to the initial agents or default transition
+# rates) invalidates every cached run
+SIMULATION_SOURCE_DIRS = ("model", "space", "config", "utils", "batch")
+
+BYTES_PER_MB = 1024**2
+
+
+@lru_cache(maxsize=None)
+def get_code_version() -> str:
+    """Hash of the simulation's source files, initial agents and rates."""
+    code_hash = hashlib.sha256()
+    paths = sorted(
+        os.path.join(root, filename)
+        for source_dir in SIMULATION_SOURCE_DIRS
+        for root, __dirs, filenames in os.walk(PACKAGE_PATH / source_dir)
+        for filename in filenames
+        if filename.endswith(".py")
+    )
+    paths.extend(
+        path
+        for path in (INITIAL_AGENTS_PATH, TRANSITION_RATES_PATH)
+        if os.path.exists(path)
+    )
+
+    for path in paths:
+        code_hash.update(os.path.relpath(path, PACKAGE_PATH).encode())
+        with open(path, "rb") as f:
+            code_hash.update(f.read())
+    return code_hash.hexdigest()
+
+
+@dataclass
+class CachedRun:
+    """A completed run - its reporter table and where its replicate was saved."""
+
+    data: pd.DataFrame
+    max_life_stages: Optional[np.ndarray] = None
+    zarr_filename: Optional[str] = None
+    zarr_group: Optional[str] = None
+    replicate_idx: Optional[int] = None
+
+
+class RunResultCache:
+    """
+    Results of completed runs, stored in `cache_dir` and indexed by a hash of
+    everything that decides a run's outcome - model class, parameters
+    (including the seed), class parameters such as the AOI bounds, collection
+    options and the code version. Least recently used runs are evicted once
+    the cache holds more than `max_size_mb` or `max_entries`.
+
+    Only the cache's own files are evicted - Zarr replicates they point to are
+    left in place. The cache can be shared by the processes of a batch run,
+    which open their own connection to the index on each access.
+    """
+
+    INDEX_FILENAME = "index.sqlite"
+
+    def __init__(
+        self, cache_dir, max_size_mb=None, max_entries=None, code_version=None
+    ):
+        if max_size_mb is not None and max_size_mb <= 0:
+            raise ValueError(f"max_size_mb must be positive, got {max_size_mb}")
+        if max_entries is not None and max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+
+        self.cache_dir = os.fspath(cache_dir)
+        self.max_size_mb = max_size_mb
+        self.max_entries = max_entries
+        self.code_version = code_version or get_code_version()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._connect() as connection:
+            # Persisted in the index file, so later connections are WAL too
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    key TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    zarr_filename TEXT,
+                    zarr_group TEXT,
+                    replicate_idx INTEGER
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success and rolls back on error, then closes either way
+        connection = sqlite3.connect(
+            os.path.join(self.cache_dir, self.INDEX_FILENAME), timeout=60
+        )
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get_key(self, model_cls, class_parameters_dict, kwargs, **run_options) -> str:
+        """Hash of a run's normalized parameters, class parameters and options."""
+        run_description = ZarrManager.normalize_dict_for_hash(
+            {
+                "model": f"{model_cls.__module__}.{model_cls.__qualname__}",
+                "kwargs": dict(kwargs),
+                "class_parameters": dict(class_parameters_dict),
+                "run_options": run_options,
+                "code_version": self.code_version,
+            }
+        )
+        run_description_str = json.dumps(run_description, sort_keys=True, default=str)
+        return hashlib.sha256(run_description_str.encode()).hexdigest()
+
+    def get(self, key) -> Optional[CachedRun]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT filename FROM runs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE runs SET last_accessed = ? WHERE key = ?", (time.time(), key)
+            )
+
+        try:
+            with open(os.path.join(self.cache_dir, row[0]), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            # Evicted by another process since the lookup
+            return None
+
+    def put(self, key, cached_run: CachedRun):
+        filename = f"{key}.pkl"
+        path = os.path.join(self.cache_dir, filename)
+        partial_path = f"{path}.{os.getpid()}.partial"
+        with open(partial_path, "wb") as f:
+            pickle.dump(cached_run, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial_path, path)
+
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    filename,
+                    os.path.getsize(path),
+                    now,
+                    now,
+                    cached_run.zarr_filename,
+                    cached_run.zarr_group,
+                    cached_run.replicate_idx,
+                ),
+            )
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used runs until the cache is within its limits."""
+        if self.max_size_mb is None and self.max_entries is None:
+            return
+
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT key, filename, nbytes FROM runs ORDER BY last_accessed DESC"
+            ).fetchall()
+
+            max_bytes = (
+                np.inf if self.max_size_mb is None else self.max_size_mb * BYTES_PER_MB
+            )
+            max_entries = np.inf if self.max_entries is None else self.max_entries
+
+            total_bytes = 0
+            evicted = []
+            for n_kept, (key, filename, nbytes) in enumerate(rows):
+                total_bytes += nbytes
+                # The most recently used run is always kept
+                if n_kept > 0 and (total_bytes > max_bytes or n_kept >= max_entries):
+                    evicted.append((key, filename))
+
+            connection.executemany(
+                "DELETE FROM runs WHERE key = ?", [(key,) for key, __ in evicted]
+            )
+
+        for __key, filename in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            logging.debug(f"Evicted {len(evicted)} runs from {self.cache_dir}")
+
+    def get_summary(self) -> dict[str, Any]:
+        with self._connect() as connection:
+            n_entries, total_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM runs"
+            ).fetchone()
+        return {"n_entries": n_entries, "size_mb": total_bytes / BYTES_PER_MB}
@@ -1,4 +1,5 @@
 from vegetation.model.vegetation import Vegetation
+from vegetation.model.lockstep import LockstepVegetation
 import os
 import argparse
 import pandas as pd
@@ -7,7 +8,11 @@ from vegetation.batch.routes import (
     get_interactive_params,
     construct_model_run_parameters_from_file,
 )
-from vegetation.batch.batchrunner import jotr_batch_run
+from vegetation.batch.batchrunner import jotr_batch_run, jotr_lockstep_batch_run
+from vegetation.batch.convergence import ConvergenceCriteria
+from vegetation.batch.job_queue import jotr_queue_batch_run
+from vegetation.batch.result_cache import RunResultCache
+from vegetation.utils.memory import BUDGET_ACTIONS, MEMORY_TRACKING_MODES
 
 CELL_CLASS = "VegCell"
 DEFAULT_BATCH_PARAMETERS_PATH = os.getenv(
@@ -59,6 +64,68 @@ def parse_args() -> dict:
         default=DEFAULT_AOI_BOUNDS_PATH,
         help="Path to AOI bounds JSON file",
     )
+    parser.add_argument(
+        "--profile_steps",
+        action="store_true",
+        default=False,
+        help="Add per-step phase timings and event counters to the results",
+    )
+    parser.add_argument(
+        "--cprofile_dir",
+        type=str,
+        default=None,
+        help="Directory to dump cProfile stats of the first run to",
+    )
+    parser.add_argument(
+        "--lockstep",
+        action="store_true",
+        default=False,
+        help="Simulate all iterations of each parameter set together as arrays",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the batch, to replay it exactly (each run's seed is saved with the results)",
+    )
+    parser.add_argument(
+        "--job_queue",
+        type=str,
+        default=None,
+        help="Path of a SQLite job queue to run through, which `python -m vegetation.batch.worker` on other hosts can help drain",
+    )
+    parser.add_argument(
+        "--result_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of a cache of completed runs, to skip rerunning them (needs --seed to hit)",
+    )
+    parser.add_argument(
+        "--result_cache_max_mb",
+        type=float,
+        default=None,
+        help="Size above which the least recently used runs are evicted from the cache",
+    )
+    parser.add_argument(
+        "--memory_tracking",
+        type=str,
+        default=None,
+        choices=MEMORY_TRACKING_MODES,
+        help="Record each step's memory footprint with the results",
+    )
+    parser.add_argument(
+        "--memory_budget_mb",
+        type=float,
+        default=None,
+        help="Memory budget of each run in MB, see --memory_budget_action",
+    )
+    parser.add_argument(
+        "--memory_budget_action",
+        type=str,
+        default="compact",
+        choices=BUDGET_ACTIONS,
+        help="Drop dead agents ('compact') or fail ('raise') when over budget",
+    )
     parser.add_argument(
         "--zarr_store",
         type=str,
@@ -75,6 +142,16 @@ def parse_args() -> dict:
         "batch_parameters_json": parsed.batch_parameters_json,
         "attribute_encodings_json": parsed.attribute_encodings_json,
         "aoi_bounds_json": parsed.aoi_bounds_json,
+        "profile_steps": parsed.profile_steps,
+        "cprofile_dir": parsed.cprofile_dir,
+        "lockstep": parsed.lockstep,
+        "seed": parsed.seed,
+        "job_queue": parsed.job_queue,
+        "result_cache_dir": parsed.result_cache_dir,
+        "result_cache_max_mb": parsed.result_cache_max_mb,
+        "memory_tracking": parsed.memory_tracking,
+        "memory_budget_mb": parsed.memory_budget_mb,
+        "memory_budget_action": parsed.memory_budget_action,
     }
 
 
@@ -122,6 +199,17 @@ if __name__ == "__main__":
         )
 
     model_run_parameters = parameters_dict["model_run_parameters"]
+    if arg_dict["lockstep"] and (
+        arg_dict["memory_tracking"] or arg_dict["memory_budget_mb"] is not None
+    ):
+        raise ValueError("Memory tracking is not available for --lockstep runs")
+
+    if arg_dict["memory_tracking"] or arg_dict["memory_budget_mb"] is not None:
+        model_run_parameters = model_run_parameters | {
+            "memory_tracking": arg_dict["memory_tracking"],
+            "memory_budget_mb": arg_dict["memory_budget_mb"],
+            "memory_budget_action": arg_dict["memory_budget_action"],
+        }
     meta_parameters = parameters_dict["meta_parameters"]
     attribute_encodings = parameters_dict["attribute_encodings"]
     aoi_bounds = parameters_dict["aoi_bounds"]
@@ -139,17 +227,77 @@ if __name__ == "__main__":
         "cell_attributes_to_save": cell_attributes_to_save,
     }
 
-    results = jotr_batch_run(
-        Vegetation,
-        model_parameters=model_run_parameters,
-        class_parameters_dict=class_parameters_dict,
-        iterations=meta_parameters["num_iterations_total"],
-        number_processes=meta_parameters["num_workers"],
-        data_collection_period=1,
-        display_progress=True,
-    )
+    # Optional sequential run - `num_iterations_total` is then the most each
+    # parameter combination may run, e.g.
+    # "convergence": {"reporters": ["N Adults"], "relative_precision": 0.05}
+    convergence = None
+    if meta_parameters.get("convergence") is not None:
+        convergence = ConvergenceCriteria(**meta_parameters["convergence"])
+        if arg_dict["lockstep"]:
+            raise ValueError("Convergence is not available for --lockstep runs")
+
+    result_cache = None
+    if arg_dict["result_cache_dir"] is not None:
+        if arg_dict["lockstep"]:
+            raise ValueError("The result cache is not available for --lockstep runs")
+        result_cache = RunResultCache(
+            arg_dict["result_cache_dir"], max_size_mb=arg_dict["result_cache_max_mb"]
+        )
+
+    if arg_dict["job_queue"] is not None and (
+        arg_dict["lockstep"] or convergence is not None or result_cache is not None
+    ):
+        raise ValueError(
+            "--job_queue runs can't be combined with --lockstep, convergence or the result cache"
+        )
+
+    if arg_dict["job_queue"] is not None:
+        results = jotr_queue_batch_run(
+            Vegetation,
+            model_parameters=model_run_parameters,
+            class_parameters_dict=class_parameters_dict,
+            queue_path=arg_dict["job_queue"],
+            iterations=meta_parameters["num_iterations_total"],
+            number_processes=meta_parameters["num_workers"],
+            data_collection_period=1,
+            display_progress=True,
+            include_step_profile=arg_dict["profile_steps"],
+            seed=arg_dict["seed"],
+        )
+    elif arg_dict["lockstep"]:
+        results = jotr_lockstep_batch_run(
+            LockstepVegetation,
+            model_parameters=model_run_parameters,
+            class_parameters_dict=class_parameters_dict,
+            iterations=meta_parameters["num_iterations_total"],
+            number_processes=meta_parameters["num_workers"],
+            data_collection_period=1,
+            display_progress=True,
+            include_step_profile=arg_dict["profile_steps"],
+            seed=arg_dict["seed"],
+        )
+    else:
+        results = jotr_batch_run(
+            Vegetation,
+            model_parameters=model_run_parameters,
+            class_parameters_dict=class_parameters_dict,
+            iterations=meta_parameters["num_iterations_total"],
+            number_processes=meta_parameters["num_workers"],
+            data_collection_period=1,
+            display_progress=True,
+            include_step_profile=arg_dict["profile_steps"],
+            cprofile_dir=arg_dict["cprofile_dir"],
+            convergence=convergence,
+            seed=arg_dict["seed"],
+            result_cache=result_cache,
+        )
 
     if not os.path.exists(os.path.dirname(output_path)):
         os.makedirs(os.path.dirname(output_path))
 
     pd.DataFrame(results).to_csv(output_path)
+
+    if convergence is not None:
+        results.attrs["convergence"].to_csv(
+            output_path.removesuffix(".csv") + "_convergence.csv"
+        )
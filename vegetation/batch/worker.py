@@ -0,0 +1,55 @@
+import argparse
+import logging
+
+from vegetation.batch.job_queue import run_worker
+
+
+def parse_args() -> dict:
+    parser = argparse.ArgumentParser(
+        description="Drain a job queue of vegetation simulation runs"
+    )
+    parser.add_argument(
+        "--job_queue",
+        type=str,
+        required=True,
+        help="Path of the SQLite job queue, as submitted by run.py --job_queue",
+    )
+    parser.add_argument(
+        "--worker_id",
+        type=str,
+        default=None,
+        help="Name of this worker in the queue (defaults to host:pid)",
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=int,
+        default=600,
+        help="How long a run may go without a heartbeat before it is claimed again",
+    )
+    parser.add_argument(
+        "--max_attempts",
+        type=int,
+        default=3,
+        help="How many times a run is tried before it is marked failed",
+    )
+
+    parsed = parser.parse_args()
+
+    return {
+        "job_queue": parsed.job_queue,
+        "worker_id": parsed.worker_id,
+        "lease_seconds": parsed.lease_seconds,
+        "max_attempts": parsed.max_attempts,
+    }
+
+
+if __name__ == "__main__":
+    arg_dict = parse_args()
+
+    n_completed = run_worker(
+        arg_dict["job_queue"],
+        worker_id=arg_dict["worker_id"],
+        lease_seconds=arg_dict["lease_seconds"],
+        max_attempts=arg_dict["max_attempts"],
+    )
+    logging.info(f"Completed {n_completed} runs of {arg_dict['job_queue']}")
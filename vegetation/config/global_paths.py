@@ -25,3 +25,7 @@ LOCAL_STAC_CACHE_FSTRING = os.getenv(
     "LOCAL_STAC_CACHE_FSTRING",
     f"{PACKAGE_PATH}/.local_dev_data/{{band_name}}_{{bounds_md5}}.tif",
 )
+
+TRANSITION_RATES_PATH = os.getenv(
+    "TRANSITION_RATES_PATH", f"{PACKAGE_PATH}/config/transition_rates.json"
+)
@@ -11,3 +11,15 @@ class LifeStage(IntEnum):
 
     def __str__(self):
         return self.name
+
+
+# (r, g, b, alpha) used to color a VegCell by the furthest life stage of any
+# Joshua Tree agent within it - rgb in 0-255, alpha in 0-1
+LIFE_STAGE_RGB_VIZ_MAP = {
+    LifeStage.DEAD: (0, 0, 0, 0),
+    LifeStage.SEED: (232, 209, 128, 1),
+    LifeStage.SEEDLING: (173, 221, 142, 1),
+    LifeStage.JUVENILE: (65, 171, 93, 1),
+    LifeStage.ADULT: (0, 104, 55, 1),
+    LifeStage.BREEDING: (0, 69, 41, 1),
+}
@@ -1,38 +1,270 @@
-from vegetation.config.life_stages import LifeStage
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+from scipy.special import expit, logit
 from scipy.stats import poisson
 
+from vegetation.config.global_paths import TRANSITION_RATES_PATH
+from vegetation.config.life_stages import LifeStage
+
 JOTR_JUVENILE_AGE = 3
 JOTR_REPRODUCTIVE_AGE = 30
 JOTR_SEED_DISPERSAL_DISTANCE = 30
 JOTR_SEEDS_EXPECTED_VALUE = 100
 JOTR_SEED_MAX_AGE = 1
 
-# TODO: Refactor to be more like a config
-# Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/14
-# This is a temporary solution to get the transition rates to be
-# valid for the JOTR model, but this doesn't scale well - we need this
-# to probably be more abstract and use a config for at least our initial
+# Raster cell attributes a transition rate can vary with - fixed landscape
+# attributes, and climate drivers that change every step
+LANDSCAPE_COVARIATES = ("elevation", "refugia_status")
+CLIMATE_COVARIATES = ("precipitation", "temperature")
+TRANSITION_COVARIATES = LANDSCAPE_COVARIATES + CLIMATE_COVARIATES
+TRANSITION_RATE_NAMES = ("survival", "germination")
+
+N_LIFE_STAGES = len(LifeStage)
+
+
+@dataclass(frozen=True)
+class TransitionRateModifier:
+    """
+    Shifts a transition rate by `coefficient * (covariate - reference)` on the
+    logit scale, so modified rates stay within (0, 1). `life_stages` only
+    applies to survival rates.
+    """
+
+    rate: str
+    covariate: str
+    coefficient: float
+    reference: float = 0.0
+    life_stages: tuple = ()
+
+    def __post_init__(self):
+        if self.rate not in TRANSITION_RATE_NAMES:
+            raise ValueError(
+                f"Invalid transition rate {self.rate!r} - expected any of {TRANSITION_RATE_NAMES}"
+            )
+        if self.covariate not in TRANSITION_COVARIATES:
+            raise ValueError(
+                f"Invalid covariate {self.covariate!r} - expected any of {TRANSITION_COVARIATES}"
+            )
+
+
+class TransitionRates:
+    """
+    Yearly transition rates compiled into arrays - survival indexed by life
+    stage value (NaN for stages without one: seeds germinate or expire
+    instead), and a seed germination rate.
+
+    Rates are the same everywhere until `bind` is given the landscape
+    covariate rasters its modifiers need, after which there is a rate per life
+    stage and cell, and rates for a whole population are a single gather over
+    its life stages and `cells[x][y]` indices. Modifiers on climate covariates
+    are applied on top every step, by `update_climate`.
+    """
+
+    def __init__(self, survival_rates, germination_rate, modifiers=()):
+        self.survival_rates = np.full(N_LIFE_STAGES, np.nan)
+        for life_stage, rate in survival_rates.items():
+            self.survival_rates[LifeStage(life_stage)] = rate
+        self.germination_rate = float(germination_rate)
+        self.modifiers = tuple(modifiers)
+
+        rates = np.append(self.survival_rates, self.germination_rate)
+        rates = rates[~np.isnan(rates)]
+        if self.modifiers and ((rates <= 0) | (rates >= 1)).any():
+            raise ValueError(
+                f"Transition rates must be within (0, 1) to be modified, got {rates.tolist()}"
+            )
+        for modifier in self.modifiers:
+            for life_stage in modifier.life_stages:
+                if np.isnan(self.survival_rates[life_stage]):
+                    raise ValueError(
+                        f"Can't modify survival of {LifeStage(life_stage)} - it has no survival rate"
+                    )
+
+        # (life stage, x, y) and (x, y) rasters, once bound
+        self._survival_rasters = None
+        self._germination_raster = None
+        # Logits of the bound rates, before climate modifiers
+        self._landscape_logits = None
+
+    @classmethod
+    def from_config(cls, path=TRANSITION_RATES_PATH):
+        with open(path, "r") as f:
+            config = json.load(f)
+        return cls(
+            survival_rates={
+                LifeStage[name]: rate for name, rate in config["survival_rates"].items()
+            },
+            germination_rate=config["germination_rate"],
+            modifiers=[
+                TransitionRateModifier(
+                    rate=modifier["rate"],
+                    covariate=modifier["covariate"],
+                    coefficient=modifier["coefficient"],
+                    reference=modifier.get("reference", 0.0),
+                    life_stages=tuple(
+                        LifeStage[name] for name in modifier.get("life_stages", ())
+                    ),
+                )
+                for modifier in config.get("modifiers", [])
+            ],
+        )
+
+    @property
+    def covariates(self):
+        return sorted({modifier.covariate for modifier in self.modifiers})
 
+    @property
+    def climate_covariates(self):
+        return [
+            covariate
+            for covariate in self.covariates
+            if covariate in CLIMATE_COVARIATES
+        ]
 
-def get_jotr_number_seeds(expected_value) -> float:
+    def bind(self, covariate_rasters):
+        """
+        Compile rates for every cell, from (x, y) rasters of each landscape
+        covariate the modifiers use. Without modifiers, rasters are only
+        broadcast.
+        """
+        missing_covariates = (
+            set(self.covariates) - set(CLIMATE_COVARIATES) - set(covariate_rasters)
+        )
+        if missing_covariates:
+            raise ValueError(
+                f"Missing covariate rasters {sorted(missing_covariates)} for transition rates"
+            )
+        raster_shape = np.shape(next(iter(covariate_rasters.values())))
+
+        if not self.modifiers:
+            self._survival_rasters = np.broadcast_to(
+                self.survival_rates[:, np.newaxis, np.newaxis],
+                (N_LIFE_STAGES, *raster_shape),
+            )
+            self._germination_raster = np.broadcast_to(
+                self.germination_rate, raster_shape
+            )
+            return self
+
+        survival_logits = np.broadcast_to(
+            logit(self.survival_rates)[:, np.newaxis, np.newaxis],
+            (N_LIFE_STAGES, *raster_shape),
+        ).copy()
+        germination_logits = np.full(raster_shape, logit(self.germination_rate))
+        self._shift_logits(
+            survival_logits, germination_logits, covariate_rasters, LANDSCAPE_COVARIATES
+        )
+
+        if self.climate_covariates:
+            self._landscape_logits = (survival_logits, germination_logits)
+            return self
+        self._survival_rasters = expit(survival_logits)
+        self._germination_raster = expit(germination_logits)
+        return self
+
+    def update_climate(self, climate_rasters):
+        """
+        Recompile bound rates with this step's (x, y) climate rasters. Cells
+        without a climate value (NaN) keep their landscape rates.
+        """
+        if not self.climate_covariates:
+            return self
+        if self._landscape_logits is None:
+            raise ValueError("Call bind() before updating the climate")
+        missing_covariates = set(self.climate_covariates) - set(climate_rasters)
+        if missing_covariates:
+            raise ValueError(
+                f"Missing climate rasters {sorted(missing_covariates)} for transition rates"
+            )
+
+        survival_logits, germination_logits = (
+            logits.copy() for logits in self._landscape_logits
+        )
+        self._shift_logits(
+            survival_logits, germination_logits, climate_rasters, CLIMATE_COVARIATES
+        )
+        self._survival_rasters = expit(survival_logits)
+        self._germination_raster = expit(germination_logits)
+        return self
+
+    def _shift_logits(
+        self, survival_logits, germination_logits, covariate_rasters, covariates
+    ):
+        for modifier in self.modifiers:
+            if modifier.covariate not in covariates:
+                continue
+            shift = np.nan_to_num(
+                modifier.coefficient
+                * (
+                    np.asarray(covariate_rasters[modifier.covariate], dtype=np.float64)
+                    - modifier.reference
+                )
+            )
+            if modifier.rate == "germination":
+                germination_logits += shift
+            else:
+                for life_stage in modifier.life_stages:
+                    survival_logits[life_stage] += shift
+
+    def _check_bound(self):
+        if self._survival_rasters is None and self.modifiers:
+            raise ValueError(
+                "Transition rates vary with covariates - call bind() with their rasters (and update_climate() for climate covariates) first"
+            )
+
+    def get_survival_rates(self, life_stages, cell_xs, cell_ys):
+        """Survival rate of each tree, from its life stage and cell."""
+        self._check_bound()
+        if self._survival_rasters is None:
+            return self.survival_rates[life_stages]
+        return self._survival_rasters[life_stages, cell_xs, cell_ys]
+
+    def get_germination_rates(self, cell_xs, cell_ys):
+        """Germination rate of each seed, from its cell."""
+        self._check_bound()
+        if self._germination_raster is None:
+            return np.full(np.shape(cell_xs), self.germination_rate)
+        return self._germination_raster[cell_xs, cell_ys]
+
+
+@lru_cache(maxsize=1)
+def get_default_transition_rates() -> TransitionRates:
+    """Transition rates from `TRANSITION_RATES_PATH`, without covariates."""
+    return TransitionRates.from_config(TRANSITION_RATES_PATH)
+
+
+def get_jotr_number_seeds(expected_value, rng=None) -> float:
     """draws the numbers of seeds produced by a tree in a given year from a Poisson distribution"""
-    n_seeds = poisson.rvs(expected_value)
+    n_seeds = poisson.rvs(expected_value, random_state=rng)
     return n_seeds
 
 
 def get_jotr_germination_rate() -> float:
-    """germination of cached seeds"""
-    rate = 0.004  # including the effects of rodents and climate (van der Wall, 2006)
-    return rate
-
-
-def get_jotr_survival_rate(life_stage):
-    if life_stage == LifeStage.SEEDLING:
-        rate = (
-            0.45 + 0.31
-        ) / 2  # calculate mean of year 1 and year to from Esque et al (2015)
-    if life_stage == LifeStage.JUVENILE:
-        rate = 1 - 0.025  # mortality of 2.5% each year (Esque et al, 2015)
-    if life_stage == LifeStage.ADULT:
-        rate = 0.97
-    return rate
+    """germination of cached seeds, before any covariate modifiers"""
+    return get_default_transition_rates().germination_rate
+
+
+def get_jotr_survival_rate(life_stage) -> float:
+    """survival of a life stage, before any covariate modifiers"""
+    return float(get_default_transition_rates().survival_rates[life_stage])
+
+
+def get_jotr_life_stages_from_ages(ages) -> np.ndarray:
+    """
+    Purely age-driven life stages for an array of ages, matching
+    `JoshuaTreeAgent._update_life_stage` for a new agent - ages with no
+    age-driven stage (between seed and juvenile) are -1
+    """
+    ages = np.asarray(ages)
+    return np.select(
+        [
+            (ages >= JOTR_JUVENILE_AGE) & (ages <= JOTR_REPRODUCTIVE_AGE),
+            ages > JOTR_REPRODUCTIVE_AGE,
+            ages == 0,
+        ],
+        [LifeStage.JUVENILE, LifeStage.ADULT, LifeStage.SEED],
+        default=-1,
+    ).astype(np.int8)
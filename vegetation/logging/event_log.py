@@ -0,0 +1,147 @@
+import os
+import uuid
+from array import array
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from vegetation.logging.logging import AgentEventType
+
+DEFAULT_EVENT_LOG_BATCH_SIZE = 100_000
+
+# Survival rolls happen for every living agent every step, so they are
+# excluded by default - deaths are recorded, and survival is implied
+DEFAULT_EVENT_TYPES = (
+    AgentEventType.ON_CREATE,
+    AgentEventType.ON_DEATH,
+    AgentEventType.ON_TRANSITION,
+    AgentEventType.ON_DISPERSE,
+)
+
+EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(AgentEventType)}
+
+# column name -> (array typecode, numpy dtype)
+EVENT_LOG_COLUMNS = {
+    "step": ("i", np.int32),
+    "replicate": ("i", np.int32),
+    "agent_id": ("q", np.int64),
+    "parent_id": ("q", np.int64),
+    "event_type": ("b", np.int8),
+    "stage": ("b", np.int8),
+    "cell_row": ("i", np.int32),
+    "cell_col": ("i", np.int32),
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Writing the agent event log requires `pyarrow`") from e
+    return pa, pq
+
+
+class AgentEventLog:
+    """Structured, columnar record of agent lifecycle events.
+
+    Events are appended to typed in-memory column buffers and flushed to a
+    Parquet file in batches of `batch_size` rows, so recording an event is a
+    handful of C-level appends. Missing values (no parent, no life stage yet,
+    no replicate index) are stored as -1, and `event_type` is stored as its
+    code in `EVENT_TYPE_CODES` (the categories are kept in the file metadata).
+
+    Each log writes one `part-<uuid>.parquet` file into `output_dir`, so the
+    directory can be read as a single table across replicates, e.g. with
+    `pd.read_parquet(output_dir)`.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        batch_size: int = DEFAULT_EVENT_LOG_BATCH_SIZE,
+        event_types: Optional[Iterable[AgentEventType]] = DEFAULT_EVENT_TYPES,
+    ):
+        # Fail before a run starts, rather than at its first flush
+        _import_pyarrow()
+
+        self.output_dir = output_dir
+        self.output_path = os.path.join(output_dir, f"part-{uuid.uuid4().hex}.parquet")
+        self.batch_size = batch_size
+        self.event_types = frozenset(event_types if event_types else AgentEventType)
+
+        self._writer = None
+        self._n_rows_written = 0
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self._buffers: Dict[str, array] = {
+            column_name: array(typecode)
+            for column_name, (typecode, __dtype) in EVENT_LOG_COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return self._n_rows_written + len(self._buffers["step"])
+
+    def record(self, agent, event_type: AgentEventType) -> None:
+        if event_type not in self.event_types:
+            return
+
+        model = agent.model
+        cell = getattr(agent, "intersecting_cell", None)
+        cell_row, cell_col = cell.indices if cell is not None else (-1, -1)
+
+        buffers = self._buffers
+        buffers["step"].append(model.steps)
+        buffers["replicate"].append(
+            model.replicate_idx if model.replicate_idx is not None else -1
+        )
+        buffers["agent_id"].append(agent.unique_id)
+        buffers["parent_id"].append(
+            agent.parent_id if agent.parent_id is not None else -1
+        )
+        buffers["event_type"].append(EVENT_TYPE_CODES[event_type])
+        buffers["stage"].append(
+            int(agent.life_stage) if agent.life_stage is not None else -1
+        )
+        buffers["cell_row"].append(cell_row)
+        buffers["cell_col"].append(cell_col)
+
+        if len(buffers["step"]) >= self.batch_size:
+            self.flush()
+
+    def _get_writer(self, schema):
+        if self._writer is None:
+            __pa, pq = _import_pyarrow()
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.output_path, schema)
+        return self._writer
+
+    def flush(self) -> None:
+        if not self._buffers["step"]:
+            return
+
+        pa, __pq = _import_pyarrow()
+        table = pa.table(
+            {
+                column_name: np.frombuffer(self._buffers[column_name], dtype=dtype)
+                for column_name, (__typecode, dtype) in EVENT_LOG_COLUMNS.items()
+            }
+        )
+        table = table.replace_schema_metadata(
+            {
+                "event_types": ",".join(
+                    event_type.value for event_type in EVENT_TYPE_CODES
+                )
+            }
+        )
+
+        self._get_writer(table.schema).write_table(table)
+        self._n_rows_written += table.num_rows
+        self._reset_buffers()
+
+    def close(self) -> None:
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -2,6 +2,7 @@ import logging
 import json
 import string
 from enum import Enum
+from operator import attrgetter
 from typing import Dict, Optional
 
 
@@ -51,6 +52,108 @@ class FallbackFormatter(string.Formatter):
             ) from e
 
 
+class CompiledTemplate:
+    """A log template parsed once into literal text and field lookups.
+
+    Supports the same fields as `FallbackFormatter` - `{agent.<attr>}` /
+    `{sim.<attr>}`, context keys and `STD_FORMATTERS` - but resolves them with
+    precomputed getters rather than re-parsing the template on every event.
+    """
+
+    def __init__(self, template: str, obj_name: str):
+        self.template = template
+        self._parts = []
+
+        for (
+            literal_text,
+            field_name,
+            format_spec,
+            conversion,
+        ) in string.Formatter().parse(template):
+            if literal_text:
+                self._parts.append((literal_text, None, None, None, None))
+            if field_name is None:
+                continue
+
+            if format_spec and "{" in format_spec:
+                raise ValueError(f"Nested fields are not supported: {template}")
+
+            if "." in field_name:
+                field_obj_name, attr = field_name.split(".", 1)
+                if field_obj_name != obj_name:
+                    raise ValueError(f"Invalid object name: {field_obj_name}")
+                getter = self._attr_getter(attrgetter(attr))
+            elif field_name in STD_FORMATTERS:
+                self._parts.append(
+                    (
+                        format(STD_FORMATTERS[field_name], format_spec),
+                        None,
+                        None,
+                        None,
+                        None,
+                    )
+                )
+                continue
+            else:
+                getter = self._context_getter(field_name)
+
+            self._parts.append((None, field_name, getter, conversion, format_spec))
+
+    @staticmethod
+    def _attr_getter(get_attr):
+        return lambda obj, context: get_attr(obj)
+
+    @staticmethod
+    def _context_getter(key):
+        return lambda obj, context: context[key]
+
+    def format(self, obj, context: Dict = None) -> str:
+        if context is None:
+            context = {}
+
+        pieces = []
+        for literal_text, field_name, getter, conversion, format_spec in self._parts:
+            if getter is None:
+                pieces.append(literal_text)
+                continue
+
+            try:
+                value = getter(obj, context)
+            except (KeyError, AttributeError) as e:
+                raise ValueError(
+                    f"Could not find {field_name} in context or agent's attributes"
+                ) from e
+
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            pieces.append(format(value, format_spec))
+
+        return "".join(pieces)
+
+
+class DeferredMessage:
+    """Log message that is only formatted if a handler actually emits it.
+
+    `logging` calls `str(record.msg)` when the record is formatted, so passing
+    this as the message moves template rendering out of the simulation loop
+    and skips it entirely for records that are filtered out.
+    """
+
+    __slots__ = ("compiled_template", "obj", "context")
+
+    def __init__(self, compiled_template: CompiledTemplate, obj, context: Dict):
+        self.compiled_template = compiled_template
+        self.obj = obj
+        self.context = context
+
+    def __str__(self) -> str:
+        return self.compiled_template.format(self.obj, self.context)
+
+
 class LogConfig:
     _instance = None
 
@@ -65,6 +168,7 @@ class LogConfig:
             cls._instance = super().__new__(cls)
             cls._instance._agent_templates = {}
             cls._instance._sim_templates = {}
+            cls._instance._compiled_templates = {}
         return cls._instance
 
     def load_config(self, config_path: str):
@@ -74,16 +178,19 @@ class LogConfig:
                 self._agent_templates = log_config_dict["agent"]
             if "sim" in log_config_dict:
                 self._sim_templates = log_config_dict["sim"]
+        self._compiled_templates = {}
 
     def update_agent_template(self, agent_type: str, event_type: str, template: str):
-        if agent_type not in self._templates:
+        if agent_type not in self._agent_templates:
             self._agent_templates[agent_type] = {}
         self._agent_templates[agent_type][event_type] = template
+        self._compiled_templates = {}
 
     def update_sim_template(self, sim_type: str, event_type: str, template: str):
-        if sim_type not in self._templates:
+        if sim_type not in self._sim_templates:
             self._sim_templates[sim_type] = {}
         self._sim_templates[sim_type][event_type] = template
+        self._compiled_templates = {}
 
     def get_agent_template(self, agent_type: str, event_type: str) -> Optional[str]:
         return self._agent_templates.get(agent_type, {}).get(event_type)
@@ -91,6 +198,28 @@ class LogConfig:
     def get_sim_template(self, sim_type: str, event_type: str) -> Optional[str]:
         return self._sim_templates.get(sim_type, {}).get(event_type)
 
+    def get_compiled_agent_template(
+        self, agent_type: str, event_type: str
+    ) -> Optional[CompiledTemplate]:
+        key = ("agent", agent_type, event_type)
+        if key not in self._compiled_templates:
+            template = self.get_agent_template(agent_type, event_type)
+            self._compiled_templates[key] = (
+                CompiledTemplate(template, "agent") if template else None
+            )
+        return self._compiled_templates[key]
+
+    def get_compiled_sim_template(
+        self, sim_type: str, event_type: str
+    ) -> Optional[CompiledTemplate]:
+        key = ("sim", sim_type, event_type)
+        if key not in self._compiled_templates:
+            template = self.get_sim_template(sim_type, event_type)
+            self._compiled_templates[key] = (
+                CompiledTemplate(template, "sim") if template else None
+            )
+        return self._compiled_templates[key]
+
 
 # TODO: Figure out if AgentLogger and SimLogger need to be different classes
 # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/32
@@ -99,7 +228,6 @@ class LogConfig:
 
 class AgentLogger:
     _instance = None
-    _fallback_formatter = FallbackFormatter()
 
     def __new__(cls):
         if cls._instance is None:
@@ -121,26 +249,23 @@ class AgentLogger:
 
     def log_agent_event(self, agent, event_type: AgentEventType, context: Dict = None):
 
-        if not agent.log_level:
+        # With the level disabled this is the only work done per event - the
+        # template is compiled once, and only rendered if a handler emits it
+        if not (agent.log_level and self.logger.isEnabledFor(agent.log_level)):
             return
 
-        if context is None:
-            context = {}
-
-        template = self.config.get_agent_template(
+        compiled_template = self.config.get_compiled_agent_template(
             agent.__class__.__name__, event_type.value
         )
 
-        if template:
-            context["agent"] = agent
-            context.update(STD_FORMATTERS)
-            message = self._fallback_formatter.format(template, **context)
-            self.logger.log(agent.log_level, message)
+        if compiled_template is not None:
+            self.logger.log(
+                agent.log_level, DeferredMessage(compiled_template, agent, context)
+            )
 
 
 class SimLogger:
     _instance = None
-    _fallback_formatter = FallbackFormatter()
 
     def __new__(cls):
         if cls._instance is None:
@@ -164,18 +289,14 @@ class SimLogger:
         self, sim, event_type: SimEventType, context: Dict = None, level=logging.INFO
     ):
 
-        if not sim.log_level:
+        if not (sim.log_level and self.logger.isEnabledFor(sim.log_level)):
             return
 
-        if context is None:
-            context = {}
-
-        template = self.config.get_sim_template(
+        compiled_template = self.config.get_compiled_sim_template(
             sim.__class__.__name__, event_type.value
         )
 
-        if template:
-            context["sim"] = sim
-            context.update(STD_FORMATTERS)
-            message = self._fallback_formatter.format(template, **context)
-            self.logger.log(sim.log_level, message)
+        if compiled_template is not None:
+            self.logger.log(
+                sim.log_level, DeferredMessage(compiled_template, sim, context)
+            )
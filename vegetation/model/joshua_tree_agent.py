@@ -1,7 +1,6 @@
 import mesa_geo as mg
 import numpy as np
 import shapely.geometry as sg
-import random
 import logging
 import json
 import mesa
@@ -10,16 +9,18 @@ from shapely.ops import transform
 from vegetation.space.veg_cell import VegCell
 from vegetation.space.study_area import StudyArea
 from vegetation.config.life_stages import LifeStage
-from vegetation.utils.spatial import transform_point_wgs84_utm, generate_point_in_utm
+from vegetation.utils.spatial import (
+    coords_to_raster_pos,
+    transform_point_wgs84_utm,
+    generate_points_in_utm,
+)
 from vegetation.config.transitions import (
     JOTR_JUVENILE_AGE,
     JOTR_REPRODUCTIVE_AGE,
     JOTR_SEED_DISPERSAL_DISTANCE,
     JOTR_SEEDS_EXPECTED_VALUE,
     JOTR_SEED_MAX_AGE,
-    get_jotr_survival_rate,
     get_jotr_number_seeds,
-    get_jotr_germination_rate,
 )
 from vegetation.logging.logging import (
     LogConfig,
@@ -38,7 +39,27 @@ class JoshuaTreeAgent(mg.GeoAgent):
             self._agent_logger = AgentLogger()
         return self._agent_logger
 
-    def __init__(self, model, geometry, crs, age=None, parent_id=None, log_level=None):
+    @property
+    def demography_rng(self):
+        # Built on the tree's first draw - a generator costs ~20 us and ~0.5-1
+        # kB, and many trees (e.g. seeds dispersed on a run's last step) never
+        # draw at all
+        if not hasattr(self, "_demography_rng"):
+            self._demography_rng = np.random.default_rng(self.seed_sequence)
+        return self._demography_rng
+
+    def __init__(
+        self,
+        model,
+        geometry,
+        crs,
+        age=None,
+        parent_id=None,
+        log_level=None,
+        indices=None,
+        life_stage=None,
+        seed_sequence=None,
+    ):
         super().__init__(
             model=model,
             geometry=geometry,
@@ -47,11 +68,18 @@ class JoshuaTreeAgent(mg.GeoAgent):
 
         self.age = age
         self.parent_id = parent_id
-        self.life_stage = None
-        # self.log_level = log_level
+        self.life_stage = life_stage
 
-        # To get this set up, assume all agents have logging.INFO level
-        self.log_level = logging.INFO
+        # Each tree draws from its own random stream, spawned from its parent's
+        # (or one of the model's streams), so its fate doesn't depend on which
+        # other trees exist or the order they step in
+        if seed_sequence is None:
+            seed_sequence = model.spawn_seed_sequences("management", 1)[0]
+        self.seed_sequence = seed_sequence
+
+        # Agents log at the model's level unless told otherwise - whether that
+        # level is actually emitted is decided by the agent logger's own level
+        self.log_level = log_level if log_level is not None else model.log_level
 
         # TODO: When we create the agent, we need to know its own indices relative
         # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/6
@@ -60,30 +88,24 @@ class JoshuaTreeAgent(mg.GeoAgent):
         # inconsistent. For now, invert the affine transformation to get the indices,
         # converting from geographic (lat, lon) to raster (col, row) coordinates
 
-        self.float_indices = ~self.model.space.raster_layer._transform * (
-            np.float64(geometry.x),
-            np.float64(geometry.y),
-        )
-
         # According to wang-boyu, mesa-geo maintainer:
         # pos = (x, y), with an origin at the lower left corner of the raster grid
         # indices = (row, col) format with an origin at the upper left corner of the raster grid
         # See https://github.com/projectmesa/mesa-geo/issues/267
 
-        # pos = (np.float64(geometry.x), np.float64(geometry.y))
-        # self._pos = pos
-
-        self.indices = (
-            int(self.float_indices[0]),
-            self.model.space.raster_layer.height - int(self.float_indices[1]),
-        )
-        self._pos = (
-            int(self.float_indices[0]),
-            int(self.float_indices[1]),
-        )
+        # Trees are located by the pos (x, y) of their raster cell, which is what
+        # `self.indices` holds (and what the cell -> agent index is keyed on).
+        # `Vegetation.add_trees_bulk` computes these for a whole batch up front
+        if indices is None:
+            raster_layer = self.model.space.raster_layer
+            x, y = coords_to_raster_pos(
+                raster_layer._transform, raster_layer.height, geometry.x, geometry.y
+            )
+            indices = (int(x), int(y))
+        self.indices = indices
 
-        self.agent_logger.log_agent_event(self, AgentEventType.ON_CREATE)
         self._link_underlying_cell()
+        self._on_event(AgentEventType.ON_CREATE)
 
         # TODO: Figure out how to set the life stage on init
         # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/3
@@ -94,14 +116,33 @@ class JoshuaTreeAgent(mg.GeoAgent):
 
         # self._update_life_stage()
 
+    def _on_event(self, event_type, context=None):
+        self.agent_logger.log_agent_event(self, event_type, context=context)
+
+        event_log = getattr(self.model, "event_log", None)
+        if event_log is not None:
+            event_log.record(self, event_type)
+
     def _link_underlying_cell(self):
-        intersecting_cell_filter = self.model.space.raster_layer.iter_neighbors(
-            self.indices, moore=False, include_center=True, radius=0
-        )
-        self.intersecting_cell = next(intersecting_cell_filter)
-        if not self.intersecting_cell:
+        raster_layer = self.model.space.raster_layer
+        if raster_layer.out_of_bounds(self.indices):
             raise ValueError("No intersecting cell found")
-        self.intersecting_cell.add_agent_link(self)
+
+        x, y = self.indices
+        self.intersecting_cell = raster_layer.cells[x][y]
+        self.model.space.cell_agent_index.add(self, self.indices)
+
+    def _unlink_underlying_cell(self):
+        self.model.space.cell_agent_index.remove(self)
+
+    def _die(self, survival_rate):
+        self._on_event(
+            AgentEventType.ON_DEATH, context={"survival_rate": survival_rate}
+        )
+        self.life_stage = LifeStage.DEAD
+        self._demography_rng = None
+        self._unlink_underlying_cell()
+        self.model.step_profiler.increment("n_deaths")
 
     def _update_life_stage(self):
         initial_life_stage = self.life_stage
@@ -139,22 +180,18 @@ class JoshuaTreeAgent(mg.GeoAgent):
         )
         x_utm, y_utm = wgs84_to_utm.transform(self.geometry.x, self.geometry.y)
 
-        for __seed_idx in np.arange(0, n_seeds):
-            seed_x_utm, seed_y_utm = generate_point_in_utm(
-                x_utm, y_utm, max_dispersal_distance
-            )
-            seed_x_wgs84, seed_y_wgs84 = utm_to_wgs84.transform(seed_x_utm, seed_y_utm)
-
-            seed_agent = JoshuaTreeAgent(
-                model=self.model,
-                geometry=sg.Point(seed_x_wgs84, seed_y_wgs84),
-                crs=self.crs,
-                age=0,
-                parent_id=self.unique_id,
-            )
-            seed_agent._update_life_stage()
+        seed_xs_utm, seed_ys_utm = generate_points_in_utm(
+            x_utm, y_utm, max_dispersal_distance, n_seeds, rng=self.demography_rng
+        )
+        seed_xs_wgs84, seed_ys_wgs84 = utm_to_wgs84.transform(seed_xs_utm, seed_ys_utm)
 
-            self.model.space.add_agents(seed_agent)
+        seed_agents = self.model.add_trees_bulk(
+            np.column_stack([seed_xs_wgs84, seed_ys_wgs84]),
+            ages=0,
+            parent_ids=self.unique_id,
+            seed_sequences=self.seed_sequence.spawn(n_seeds),
+        )
+        self.model.step_profiler.increment("n_seeds_created", len(seed_agents))
 
     def step(self):
         # Check if agent is dead - if yes, skip
@@ -162,50 +199,53 @@ class JoshuaTreeAgent(mg.GeoAgent):
             return
 
         # Roll the dice to see if the agent survives
-        dice_roll_zero_to_one = random.random()
+        dice_roll_zero_to_one = self.demography_rng.random()
 
         if self.life_stage == LifeStage.SEED:
             if self.age > JOTR_SEED_MAX_AGE:
-                self.life_stage = LifeStage.DEAD
+                # Seeds past their max age can no longer germinate
+                self._die(survival_rate=0.0)
             else:
-                germination_rate = get_jotr_germination_rate()
+                germination_rate = float(
+                    self.model.transition_rates.get_germination_rates(*self.indices)
+                )
 
                 if dice_roll_zero_to_one < germination_rate:
                     self.life_stage = LifeStage.SEEDLING
+                    self._on_event(AgentEventType.ON_TRANSITION)
 
         else:
-            survival_rate = get_jotr_survival_rate(self.life_stage)
+            survival_rate = float(
+                self.model.transition_rates.get_survival_rates(
+                    self.life_stage, *self.indices
+                )
+            )
 
             if dice_roll_zero_to_one < survival_rate:
-                self.agent_logger.log_agent_event(
-                    self,
+                self._on_event(
                     AgentEventType.ON_SURVIVE,
                     context={"survival_rate": survival_rate},
                 )
             else:
-                self.agent_logger.log_agent_event(
-                    self,
-                    AgentEventType.ON_DEATH,
-                    context={"survival_rate": survival_rate},
-                )
-                self.life_stage = LifeStage.DEAD
+                self._die(survival_rate=survival_rate)
 
         # Increment age
         self.age += 1
         life_stage_promotion = self._update_life_stage()
 
         if life_stage_promotion:
-            self.agent_logger.log_agent_event(self, AgentEventType.ON_TRANSITION)
+            self._on_event(AgentEventType.ON_TRANSITION)
 
         # Disperse
         if self.life_stage == LifeStage.ADULT:
-            n_seeds = get_jotr_number_seeds(JOTR_SEEDS_EXPECTED_VALUE)
-
-            self.agent_logger.log_agent_event(
-                self, AgentEventType.ON_DISPERSE, context={"n_seeds": n_seeds}
+            n_seeds = get_jotr_number_seeds(
+                JOTR_SEEDS_EXPECTED_VALUE, rng=self.demography_rng
             )
 
-            self._disperse_seeds_in_landscape(n_seeds)
+            self._on_event(AgentEventType.ON_DISPERSE, context={"n_seeds": n_seeds})
+
+            with self.model.step_profiler.phase("dispersal"):
+                self._disperse_seeds_in_landscape(n_seeds)
 
 
 class Vegetation(mesa.Model):
@@ -0,0 +1,882 @@
+import json
+import logging
+
+import mesa
+import numpy as np
+import pandas as pd
+
+from vegetation.config.global_paths import INITIAL_AGENTS_PATH, TRANSITION_RATES_PATH
+from vegetation.config.life_stages import LifeStage
+from vegetation.config.transitions import (
+    JOTR_SEED_DISPERSAL_DISTANCE,
+    JOTR_SEED_MAX_AGE,
+    JOTR_SEEDS_EXPECTED_VALUE,
+    TransitionRates,
+    get_jotr_life_stages_from_ages,
+)
+from vegetation.model.vegetation import TEST_RUN_PARAMETERS, ZARR_FILENAME
+from vegetation.space.climate_drivers import ClimateDriverStack
+from vegetation.space.study_area import StudyArea
+from vegetation.utils.dispersal import (
+    DISPERSAL_MODES,
+    get_dispersal_kernel,
+    get_expected_arrivals,
+)
+from vegetation.utils.profiling import StepProfiler
+from vegetation.utils.spatial import (
+    coords_to_raster_pos,
+    generate_points_in_utm,
+    transform_point_wgs84_utm,
+)
+from vegetation.utils.zarr_manager import ZarrManager, get_array_from_nested_cell_list
+
+N_LIFE_STAGES = len(LifeStage)
+
+# Cell attributes a lockstep run can save to Zarr, as (replicate, x, y) rasters
+LOCKSTEP_CELL_ATTRIBUTES = (
+    "jotr_max_life_stage",
+    "occupied_by_jotr_agents",
+    "elevation",
+    "refugia_status",
+)
+
+LOCKSTEP_MODEL_REPORTERS = (
+    "Mean Age",
+    "N Agents",
+    "N Seeds",
+    "N Seedlings",
+    "N Juveniles",
+    "N Adults",
+    "N Breeding",
+    "% Refugia Cells Occupied",
+)
+
+# Expected seeds per cell (of every replicate) from which "auto" dispersal
+# switches from placing each seed to convolving adult fecundity rasters
+RASTER_DISPERSAL_MIN_SEEDS_PER_CELL = 1.0
+
+TREE_FIELDS = {
+    "replicate": np.int32,
+    "age": np.int32,
+    "life_stage": np.int8,
+    "x_utm": np.float64,
+    "y_utm": np.float64,
+    "cell_x": np.int64,
+    "cell_y": np.int64,
+}
+
+# Trees of one replicate, cell, life stage and age, held as a count
+COHORT_FIELDS = {
+    "replicate": np.int32,
+    "age": np.int32,
+    "life_stage": np.int8,
+    "cell_x": np.int64,
+    "cell_y": np.int64,
+    "count": np.int64,
+}
+
+# Cohort cells switch back to individual trees once they hold fewer than this
+# fraction of the cohort density threshold, so cells hovering around the
+# threshold don't switch back and forth every step
+COHORT_RELEASE_FRACTION = 0.5
+
+
+class LockstepVegetation:
+    """
+    Array-based engine that advances `n_replicates` replicates of one parameter
+    set together over a single shared landscape, following the same rules as
+    `Vegetation` and its Joshua Tree agents: seed germination and expiry,
+    survival rolls, age-driven life stages and seed dispersal by adults.
+
+    Trees of all replicates are held as flat arrays (`trees`) with a replicate
+    id per tree, since replicates grow at different rates, and each step is a
+    handful of vectorized passes over all of them. Cell state carries a leading
+    replicate axis - `max_life_stages` is a (replicate, x, y) raster in the same
+    `cells[x][y]` layout that `Vegetation` saves, so it is written straight
+    into the (replicate_id, timestep, x, y) Zarr arrays, one block of
+    replicates per timestep.
+
+    Unlike `Vegetation`, cell occupancy is updated once all trees have stepped
+    (rather than interleaved with them), and dead trees are dropped straight
+    away - their count and final ages are kept per replicate, so `Mean Age`
+    still averages over dead and live trees. There are no management draws.
+
+    Seeds are dispersed either as points around each adult ("points"), or by
+    convolving rasters of adults per cell with a dispersal kernel and drawing
+    each cell's arrivals from a Poisson distribution ("raster") - whose cost
+    depends on the raster size rather than the number of seeds. By default
+    ("auto"), dispersal switches to rasters once the expected number of seeds
+    reaches `RASTER_DISPERSAL_MIN_SEEDS_PER_CELL` per cell.
+
+    With a `cohort_density_threshold`, cells holding at least that many trees
+    switch to `cohorts` - counts of trees by life stage and age - which step
+    with binomial draws of their germinations and deaths, so a crowded cell
+    costs as much as its distinct stages and ages rather than its trees. Trees
+    of the same cell, stage and age share their rates, so this only changes
+    which random draws are made. Cells switch back to individual trees, placed
+    uniformly within the cell, once they thin out (or by `release_cohorts`).
+
+    Transition rates may vary with climate drivers - per-timestep rasters read
+    from `climate_driver_paths` (a stack per variable), prefetched while the
+    previous step runs.
+    """
+
+    def __init__(
+        self,
+        n_replicates,
+        num_steps=20,
+        management_planting_density=0.01,
+        epsg=4326,
+        simulation_name=None,
+        seed=None,
+        dispersal_mode="auto",
+        transition_rates_path=None,
+        cohort_density_threshold=None,
+        climate_driver_paths=None,
+    ):
+        if n_replicates < 1:
+            raise ValueError(f"n_replicates must be at least 1, got {n_replicates}")
+        if cohort_density_threshold is not None and cohort_density_threshold < 1:
+            raise ValueError(
+                f"cohort_density_threshold must be at least 1, got {cohort_density_threshold}"
+            )
+        if dispersal_mode not in DISPERSAL_MODES:
+            raise ValueError(
+                f"Invalid dispersal mode {dispersal_mode!r} - expected any of {DISPERSAL_MODES}"
+            )
+        if not hasattr(self, "_aoi_bounds"):
+            raise ValueError(
+                "LockstepVegetation._aoi_bounds not set - call LockstepVegetation.set_aoi_bounds() before initializing the model."
+            )
+
+        self.n_replicates = n_replicates
+        self.num_steps = num_steps
+        # Only kept as a run parameter - lockstep runs have no management draws
+        self.management_planting_density = management_planting_density
+        self.simulation_name = simulation_name
+        self.dispersal_mode = dispersal_mode
+        self.transition_rates_path = transition_rates_path
+        self.cohort_density_threshold = cohort_density_threshold
+        # Compiled against the landscape's covariate rasters once it's loaded
+        self.transition_rates = TransitionRates.from_config(
+            transition_rates_path or TRANSITION_RATES_PATH
+        )
+        self.climate_driver_paths = climate_driver_paths
+        missing_drivers = set(self.transition_rates.climate_covariates) - set(
+            climate_driver_paths or {}
+        )
+        if missing_drivers:
+            raise ValueError(
+                f"Transition rates vary with climate covariates {sorted(missing_drivers)} - pass their stacks in climate_driver_paths"
+            )
+        # Opened with the landscape, to align to its grid
+        self.climate_drivers = None
+
+        self.rng = np.random.default_rng(seed)
+        self.steps = 0
+        self.running = True
+        self._on_start_executed = False
+
+        # Shared landscape - cells are only used to read the rasters from
+        self.space = StudyArea(self._aoi_bounds, epsg=epsg, model=mesa.Model())
+
+        self.trees = {
+            field: np.empty(0, dtype=dtype) for field, dtype in TREE_FIELDS.items()
+        }
+        self.cohorts = {
+            field: np.empty(0, dtype=dtype) for field, dtype in COHORT_FIELDS.items()
+        }
+        # (replicate, x, y) raster of the cells holding cohorts
+        self.cohort_cells = None
+        # Dead trees are dropped, but still count towards `Mean Age`
+        self._n_dead = np.zeros(n_replicates, dtype=np.int64)
+        self._dead_age_sums = np.zeros(n_replicates, dtype=np.float64)
+        self.max_life_stages = None
+
+        # Zarr replicate index of each replicate, once the Zarr arrays are
+        # resized for this run
+        self.replicate_idxs = None
+
+        self._model_vars = {
+            reporter: np.full((num_steps, n_replicates), np.nan)
+            for reporter in LOCKSTEP_MODEL_REPORTERS
+        }
+        self.step_profiler = StepProfiler()
+
+        self._save_to_zarr = getattr(self.__class__, "_save_to_zarr", False)
+        self._zarr_manager = None
+
+    @classmethod
+    def set_attribute_encodings(cls, attribute_encodings):
+        cls._attribute_encodings = attribute_encodings
+
+    @classmethod
+    def set_cell_attributes_to_save(cls, cell_attributes_to_save):
+        unsupported_attributes = set(cell_attributes_to_save) - set(
+            LOCKSTEP_CELL_ATTRIBUTES
+        )
+        if unsupported_attributes:
+            raise ValueError(
+                f"Lockstep runs can't save cell attributes {sorted(unsupported_attributes)} - expected any of {LOCKSTEP_CELL_ATTRIBUTES}"
+            )
+        cls._cell_attributes_to_save = cell_attributes_to_save
+        cls._save_to_zarr = True
+
+    @classmethod
+    def set_aoi_bounds(cls, aoi_bounds):
+        cls._aoi_bounds = aoi_bounds
+
+    def _on_start(self):
+        self._load_landscape()
+        self._add_initial_trees()
+
+        if self._save_to_zarr:
+            self._initialize_zarr_manager()
+
+        self._on_start_executed = True
+
+    def _load_landscape(self):
+        self.space.get_elevation()
+        self.space.get_refugia_status()
+
+        raster_layer = self.space.raster_layer
+        self.width, self.height = raster_layer.width, raster_layer.height
+        self._transform = raster_layer._transform
+        self._landscape = get_array_from_nested_cell_list(
+            veg_cells=raster_layer.cells,
+            cell_attributes_to_get=["elevation", "refugia_status"],
+        )
+        self.transition_rates.bind(self._landscape)
+        if self.climate_driver_paths:
+            self.climate_drivers = ClimateDriverStack.for_raster_layer(
+                self.climate_driver_paths, raster_layer
+            )
+            if self.climate_drivers.n_timesteps < self.num_steps:
+                raise ValueError(
+                    f"Climate drivers cover {self.climate_drivers.n_timesteps} steps, but the run has {self.num_steps}"
+                )
+        self.max_life_stages = np.full(
+            (self.n_replicates, self.width, self.height), -1, dtype=np.int8
+        )
+        self.cohort_cells = np.zeros(self.max_life_stages.shape, dtype=bool)
+
+        # All trees share the UTM zone of the study area's center
+        min_lon, min_lat, max_lon, max_lat = self._aoi_bounds
+        self._wgs84_to_utm, self._utm_to_wgs84 = transform_point_wgs84_utm(
+            (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+        )
+        # Only needed once trees are placed within cells
+        self._cell_corners_utm = None
+        # Only needed once dispersal switches to rasters
+        self._dispersal_kernel = None
+
+    def _add_initial_trees(self):
+        with open(INITIAL_AGENTS_PATH, "r") as f:
+            features = json.loads(f.read())["features"]
+        self.add_trees(
+            coords=[feature["geometry"]["coordinates"] for feature in features],
+            ages=[feature["properties"]["age"] for feature in features],
+        )
+
+    def _initialize_zarr_manager(self):
+        zarr_manager = ZarrManager(
+            width=self.width,
+            height=self.height,
+            max_timestep=self.num_steps,
+            crs=self.space.crs,
+            transformer_json=self.space.transformer.to_json(),
+            run_parameter_dict=TEST_RUN_PARAMETERS,
+            attribute_list=self._cell_attributes_to_save,
+            attribute_encodings=self._attribute_encodings,
+            filename=ZARR_FILENAME,
+        )
+
+        if self.simulation_name is None:
+            zarr_manager.set_group_name_by_run_parameter_hash()
+            logging.info(
+                "Setting simulation name (zarr group name) by run parameter hash"
+            )
+        else:
+            zarr_manager.set_group_name(self.simulation_name)
+
+        first_replicate_idx = zarr_manager.resize_array_for_next_replicate(
+            n_replicates=self.n_replicates
+        )
+        self.replicate_idxs = first_replicate_idx + np.arange(self.n_replicates)
+        self._zarr_manager = zarr_manager
+
+    def add_trees(self, coords, ages, replicates=None):
+        """
+        Add trees at (lon, lat) coordinates with a single or per-tree age, to
+        every replicate (by default) or to one replicate per tree. Trees falling
+        outside the study area raster are dropped.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        ages = np.broadcast_to(np.asarray(ages), (len(coords),))
+        if replicates is None:
+            replicates = np.repeat(np.arange(self.n_replicates), len(coords))
+            coords = np.tile(coords, (self.n_replicates, 1))
+            ages = np.tile(ages, self.n_replicates)
+
+        xs_utm, ys_utm = self._wgs84_to_utm.transform(coords[:, 0], coords[:, 1])
+        return self._append_trees(
+            replicates, xs_utm, ys_utm, coords[:, 0], coords[:, 1], ages
+        )
+
+    def _append_trees(self, replicates, xs_utm, ys_utm, xs_wgs84, ys_wgs84, ages):
+        ages = np.broadcast_to(np.asarray(ages), np.shape(xs_utm))
+        cell_xs, cell_ys = coords_to_raster_pos(
+            self._transform, self.height, xs_wgs84, ys_wgs84
+        )
+        within_raster = (
+            (cell_xs >= 0)
+            & (cell_xs < self.width)
+            & (cell_ys >= 0)
+            & (cell_ys < self.height)
+        )
+
+        life_stages = get_jotr_life_stages_from_ages(ages[within_raster])
+        if (life_stages < 0).any():
+            raise ValueError(
+                "Lockstep runs need trees with an age-driven life stage - got ages "
+                f"{np.unique(ages[within_raster][life_stages < 0]).tolist()}"
+            )
+
+        new_trees = {
+            "replicate": replicates,
+            "age": ages,
+            "x_utm": xs_utm,
+            "y_utm": ys_utm,
+            "cell_x": cell_xs,
+            "cell_y": cell_ys,
+        }
+        new_trees = {
+            field: np.asarray(values)[within_raster]
+            for field, values in new_trees.items()
+        }
+        new_trees["life_stage"] = life_stages
+
+        self._concatenate_trees(new_trees)
+        return int(within_raster.sum())
+
+    def _concatenate_trees(self, new_trees):
+        for field, dtype in TREE_FIELDS.items():
+            self.trees[field] = np.concatenate(
+                [self.trees[field], new_trees[field].astype(dtype, copy=False)]
+            )
+
+    def _keep_trees(self, keep):
+        self.trees = {field: values[keep] for field, values in self.trees.items()}
+
+    def _get_cell_idxs(self, table):
+        """Flat (replicate, x, y) raster index of each tree or cohort."""
+        return (
+            table["replicate"].astype(np.int64) * self.width + table["cell_x"]
+        ) * self.height + table["cell_y"]
+
+    def _count_trees_per_cell(self, tree_idxs, cohort_idxs):
+        """Flat (replicate, x, y) raster of some trees and cohorts' tree counts."""
+        n_cells = self.n_replicates * self.width * self.height
+        cohorts = self.cohorts
+        cohort_counts = np.bincount(
+            self._get_cell_idxs(cohorts)[cohort_idxs],
+            weights=cohorts["count"][cohort_idxs],
+            minlength=n_cells,
+        )
+        return np.bincount(
+            self._get_cell_idxs(self.trees)[tree_idxs], minlength=n_cells
+        ) + cohort_counts.astype(np.int64)
+
+    def _update_climate(self):
+        if self.climate_drivers is None:
+            return
+        self.climate_drivers.update_transition_rates(
+            self.transition_rates, self.steps, self.step_profiler
+        )
+
+    def _close_climate_drivers(self):
+        if self.climate_drivers is not None:
+            self.climate_drivers.close()
+            self.climate_drivers = None
+
+    def _step_trees(self):
+        trees = self.trees
+        life_stages, ages = trees["life_stage"], trees["age"]
+        dice_rolls = self.rng.random(len(ages))
+
+        # Seeds either germinate or, past their max age, expire - everything
+        # else survives with its life stage's survival rate
+        is_seed = life_stages == LifeStage.SEED
+        cell_xs, cell_ys = trees["cell_x"], trees["cell_y"]
+        germinates = (
+            is_seed
+            & (ages <= JOTR_SEED_MAX_AGE)
+            & (
+                dice_rolls
+                < self.transition_rates.get_germination_rates(cell_xs, cell_ys)
+            )
+        )
+        with np.errstate(invalid="ignore"):
+            dies = np.where(
+                is_seed,
+                ages > JOTR_SEED_MAX_AGE,
+                dice_rolls
+                >= self.transition_rates.get_survival_rates(
+                    life_stages, cell_xs, cell_ys
+                ),
+            )
+
+        life_stages[germinates] = LifeStage.SEEDLING
+        ages += 1
+
+        self._n_dead += np.bincount(
+            trees["replicate"][dies], minlength=self.n_replicates
+        )
+        self._dead_age_sums += np.bincount(
+            trees["replicate"][dies], weights=ages[dies], minlength=self.n_replicates
+        )
+        self.step_profiler.increment("n_deaths", int(dies.sum()))
+        self._keep_trees(~dies)
+
+        # Purely age-driven transitions (-1 is no age-driven stage)
+        life_stages_from_ages = get_jotr_life_stages_from_ages(self.trees["age"])
+        promoted = life_stages_from_ages > 0
+        self.trees["life_stage"][promoted] = life_stages_from_ages[promoted]
+
+    def _step_cohorts(self):
+        cohorts = self.cohorts
+        if not len(cohorts["count"]):
+            return
+        life_stages, ages, counts = (
+            cohorts["life_stage"],
+            cohorts["age"],
+            cohorts["count"],
+        )
+        cell_xs, cell_ys = cohorts["cell_x"], cohorts["cell_y"]
+
+        # The rules of `_step_trees`, drawing how many of each cohort's trees
+        # germinate or die rather than rolling for each of them
+        is_seed = life_stages == LifeStage.SEED
+        can_germinate = is_seed & (ages <= JOTR_SEED_MAX_AGE)
+        n_germinated = np.zeros_like(counts)
+        n_germinated[can_germinate] = self.rng.binomial(
+            counts[can_germinate],
+            self.transition_rates.get_germination_rates(
+                cell_xs[can_germinate], cell_ys[can_germinate]
+            ),
+        )
+        n_dead = np.where(is_seed & (ages > JOTR_SEED_MAX_AGE), counts, 0)
+        n_dead[~is_seed] = counts[~is_seed] - self.rng.binomial(
+            counts[~is_seed],
+            self.transition_rates.get_survival_rates(
+                life_stages[~is_seed], cell_xs[~is_seed], cell_ys[~is_seed]
+            ),
+        )
+
+        ages += 1
+        replicates = cohorts["replicate"]
+        self._n_dead += np.bincount(
+            replicates, weights=n_dead, minlength=self.n_replicates
+        ).astype(np.int64)
+        self._dead_age_sums += np.bincount(
+            replicates, weights=n_dead * ages, minlength=self.n_replicates
+        )
+        self.step_profiler.increment("n_deaths", int(n_dead.sum()))
+
+        # Germinated seeds split off into seedling cohorts
+        germinated = n_germinated > 0
+        seedlings = {field: values[germinated] for field, values in cohorts.items()}
+        seedlings["life_stage"][:] = LifeStage.SEEDLING
+        seedlings["count"] = n_germinated[germinated]
+        counts -= n_dead + n_germinated
+        remaining = counts > 0
+        cohorts = {
+            field: np.concatenate([values[remaining], seedlings[field]])
+            for field, values in cohorts.items()
+        }
+
+        life_stages_from_ages = get_jotr_life_stages_from_ages(cohorts["age"])
+        promoted = life_stages_from_ages > 0
+        cohorts["life_stage"][promoted] = life_stages_from_ages[promoted]
+        # Cohorts may now share a stage and age - a seed cohort's germinated
+        # seedlings catching up with its earlier ones
+        self.cohorts = self._merge_cohorts(cohorts)
+
+    def _merge_cohorts(self, *tables):
+        """Cohorts (or trees, counting one each) pooled by cell, stage and age."""
+        pooled = {
+            field: np.concatenate(
+                [
+                    table.get(field, np.ones(len(table["age"]), dtype=dtype))
+                    for table in tables
+                ]
+            ).astype(dtype, copy=False)
+            for field, dtype in COHORT_FIELDS.items()
+        }
+        if not len(pooled["age"]):
+            return pooled
+
+        keys = (self._get_cell_idxs(pooled) * N_LIFE_STAGES + pooled["life_stage"]) * (
+            int(pooled["age"].max()) + 1
+        ) + pooled["age"]
+        __keys, first_idxs, cohort_idxs = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        merged = {field: values[first_idxs] for field, values in pooled.items()}
+        merged["count"] = np.bincount(
+            cohort_idxs.ravel(), weights=pooled["count"], minlength=len(first_idxs)
+        ).astype(np.int64)
+        return merged
+
+    def _update_cohort_cells(self):
+        """Switch dense cells to cohorts, and thinned out ones back to trees."""
+        densities = self._count_trees_per_cell(
+            np.arange(len(self.trees["age"])), np.arange(len(self.cohorts["age"]))
+        )
+        cohort_cells = self.cohort_cells.ravel()
+        releasing = cohort_cells & (
+            densities < COHORT_RELEASE_FRACTION * self.cohort_density_threshold
+        )
+        collapsing = ~cohort_cells & (densities >= self.cohort_density_threshold)
+        self.step_profiler.increment("n_cells_released", int(releasing.sum()))
+        self.step_profiler.increment("n_cells_collapsed", int(collapsing.sum()))
+
+        self._release_cohort_cells(releasing)
+        cohort_cells |= collapsing
+
+        # Trees in cohort cells (including seeds that just landed in them)
+        # join their cohorts
+        joining = cohort_cells[self._get_cell_idxs(self.trees)]
+        if joining.any():
+            self.cohorts = self._merge_cohorts(
+                self.cohorts,
+                {field: values[joining] for field, values in self.trees.items()},
+            )
+            self._keep_trees(~joining)
+
+    def _release_cohort_cells(self, releasing):
+        # `releasing` is a flat mask over (replicate, x, y) cells
+        self.cohort_cells.ravel()[releasing] = False
+        leaving = releasing[self._get_cell_idxs(self.cohorts)]
+        if not leaving.any():
+            return
+
+        cohorts = {field: values[leaving] for field, values in self.cohorts.items()}
+        self.cohorts = {
+            field: values[~leaving] for field, values in self.cohorts.items()
+        }
+        new_trees = {
+            field: np.repeat(cohorts[field], cohorts["count"])
+            for field in ("replicate", "age", "life_stage", "cell_x", "cell_y")
+        }
+        new_trees["x_utm"], new_trees["y_utm"], __xs, __ys = self._place_in_cells(
+            new_trees["cell_x"], new_trees["cell_y"]
+        )
+        self._concatenate_trees(new_trees)
+
+    def release_cohorts(self, replicates, cell_xs, cell_ys):
+        """
+        Switch cells back to individual trees, e.g. before a management action
+        targeting them. They switch to cohorts again if still dense at the end
+        of the next step.
+        """
+        releasing = np.zeros(self.cohort_cells.size, dtype=bool)
+        releasing[
+            np.ravel_multi_index(
+                (replicates, cell_xs, cell_ys), self.cohort_cells.shape
+            )
+        ] = True
+        self._release_cohort_cells(releasing)
+
+    def _uses_raster_dispersal(self, n_adults):
+        if self.dispersal_mode != "auto":
+            return self.dispersal_mode == "raster"
+        n_cells = self.n_replicates * self.width * self.height
+        return (
+            n_adults * JOTR_SEEDS_EXPECTED_VALUE
+            >= RASTER_DISPERSAL_MIN_SEEDS_PER_CELL * n_cells
+        )
+
+    def _disperse_seeds(self):
+        trees, cohorts = self.trees, self.cohorts
+        adults = np.flatnonzero(trees["life_stage"] == LifeStage.ADULT)
+        adult_cohorts = np.flatnonzero(cohorts["life_stage"] == LifeStage.ADULT)
+        n_adults = len(adults) + int(cohorts["count"][adult_cohorts].sum())
+        if self._uses_raster_dispersal(n_adults):
+            self._disperse_seeds_by_raster(adults, adult_cohorts)
+            return
+
+        n_seeds = self.rng.poisson(JOTR_SEEDS_EXPECTED_VALUE, len(adults))
+        parents = np.repeat(adults, n_seeds)
+        parent_replicates = trees["replicate"][parents]
+        parent_xs_utm, parent_ys_utm = trees["x_utm"][parents], trees["y_utm"][parents]
+        if len(adult_cohorts):
+            # Adults of a cohort disperse from anywhere in their cell
+            n_cohort_seeds = self.rng.poisson(
+                JOTR_SEEDS_EXPECTED_VALUE * cohorts["count"][adult_cohorts]
+            )
+            cohort_parents = np.repeat(adult_cohorts, n_cohort_seeds)
+            cohort_xs_utm, cohort_ys_utm, __xs, __ys = self._place_in_cells(
+                cohorts["cell_x"][cohort_parents], cohorts["cell_y"][cohort_parents]
+            )
+            parent_replicates = np.concatenate(
+                [parent_replicates, cohorts["replicate"][cohort_parents]]
+            )
+            parent_xs_utm = np.concatenate([parent_xs_utm, cohort_xs_utm])
+            parent_ys_utm = np.concatenate([parent_ys_utm, cohort_ys_utm])
+
+        seed_xs_utm, seed_ys_utm = generate_points_in_utm(
+            parent_xs_utm,
+            parent_ys_utm,
+            JOTR_SEED_DISPERSAL_DISTANCE,
+            len(parent_replicates),
+            rng=self.rng,
+        )
+        seed_xs_wgs84, seed_ys_wgs84 = self._utm_to_wgs84.transform(
+            seed_xs_utm, seed_ys_utm
+        )
+        n_added = self._append_trees(
+            parent_replicates,
+            seed_xs_utm,
+            seed_ys_utm,
+            seed_xs_wgs84,
+            seed_ys_wgs84,
+            ages=0,
+        )
+        self.step_profiler.increment("n_seeds_created", n_added)
+
+    def _initialize_cell_geometry(self):
+        # UTM position of each cell's top-left corner, and the UTM offsets of
+        # one column and one row, so trees can be placed within their cell
+        # without reprojecting each of them
+        cell_xs, cell_ys = np.meshgrid(
+            np.arange(self.width), np.arange(self.height), indexing="ij"
+        )
+        corner_lons, corner_lats = self._transform * (
+            cell_xs,
+            self.height - 1 - cell_ys,
+        )
+        self._cell_corners_utm = np.stack(
+            self._wgs84_to_utm.transform(corner_lons, corner_lats)
+        )
+
+        origin, next_column, next_row = np.column_stack(
+            self._wgs84_to_utm.transform(
+                *(self._transform * (np.array([0, 1, 0]), np.array([0, 0, 1])))
+            )
+        )
+        self._column_step_utm = next_column - origin
+        self._row_step_utm = next_row - origin
+
+    def _place_in_cells(self, cell_xs, cell_ys):
+        """UTM and WGS84 coordinates of points placed uniformly within cells."""
+        if self._cell_corners_utm is None:
+            self._initialize_cell_geometry()
+
+        column_offsets, row_offsets = self.rng.random((2, len(cell_xs)))
+        xs_wgs84, ys_wgs84 = self._transform * (
+            cell_xs + column_offsets,
+            self.height - 1 - cell_ys + row_offsets,
+        )
+        xs_utm, ys_utm = (
+            self._cell_corners_utm[:, cell_xs, cell_ys]
+            + np.outer(self._column_step_utm, column_offsets)
+            + np.outer(self._row_step_utm, row_offsets)
+        )
+        return xs_utm, ys_utm, xs_wgs84, ys_wgs84
+
+    def _initialize_raster_dispersal(self):
+        if self._cell_corners_utm is None:
+            self._initialize_cell_geometry()
+        self._dispersal_kernel = get_dispersal_kernel(
+            JOTR_SEED_DISPERSAL_DISTANCE,
+            (
+                np.linalg.norm(self._column_step_utm),
+                np.linalg.norm(self._row_step_utm),
+            ),
+        )
+
+    def _disperse_seeds_by_raster(self, adults, adult_cohorts):
+        if self._dispersal_kernel is None:
+            self._initialize_raster_dispersal()
+
+        raster_shape = (self.n_replicates, self.width, self.height)
+        fecundity = self._count_trees_per_cell(adults, adult_cohorts).reshape(
+            raster_shape
+        )
+
+        # Each adult's seed count is Poisson, and each seed lands independently,
+        # so arrivals in each cell are Poisson too - only drawn for the cells
+        # within reach of an adult
+        expected_arrivals = get_expected_arrivals(
+            JOTR_SEEDS_EXPECTED_VALUE * fecundity, self._dispersal_kernel
+        ).ravel()
+        reachable_cells = np.flatnonzero(expected_arrivals)
+        n_arrivals = self.rng.poisson(expected_arrivals[reachable_cells])
+        replicates, cell_xs, cell_ys = np.unravel_index(
+            np.repeat(reachable_cells, n_arrivals), raster_shape
+        )
+
+        # Seeds are placed uniformly within their cell
+        seed_xs_utm, seed_ys_utm, seed_xs_wgs84, seed_ys_wgs84 = self._place_in_cells(
+            cell_xs, cell_ys
+        )
+
+        n_added = self._append_trees(
+            replicates,
+            seed_xs_utm,
+            seed_ys_utm,
+            seed_xs_wgs84,
+            seed_ys_wgs84,
+            ages=0,
+        )
+        self.step_profiler.increment("n_seeds_created", n_added)
+        self.step_profiler.increment("n_raster_dispersals")
+
+    def _update_occupancy(self):
+        max_life_stages = np.full(
+            self.n_replicates * self.width * self.height, -1, dtype=np.int8
+        )
+        for table in (self.trees, self.cohorts):
+            np.maximum.at(
+                max_life_stages, self._get_cell_idxs(table), table["life_stage"]
+            )
+        max_life_stages = max_life_stages.reshape(self.max_life_stages.shape)
+
+        self.step_profiler.increment(
+            "n_cells_dirtied", int((max_life_stages != self.max_life_stages).sum())
+        )
+        self.max_life_stages = max_life_stages
+
+    def _get_tree_totals(self):
+        """(replicate, life stage) counts and per-replicate age sums of live trees."""
+        stage_counts = np.zeros((self.n_replicates, N_LIFE_STAGES), dtype=np.int64)
+        age_sums = np.zeros(self.n_replicates)
+        for table in (self.trees, self.cohorts):
+            replicates = table["replicate"]
+            counts = table.get("count", np.ones(len(replicates), dtype=np.int64))
+            stage_counts += (
+                np.bincount(
+                    replicates.astype(np.int64) * N_LIFE_STAGES + table["life_stage"],
+                    weights=counts,
+                    minlength=self.n_replicates * N_LIFE_STAGES,
+                )
+                .reshape(self.n_replicates, N_LIFE_STAGES)
+                .astype(np.int64)
+            )
+            age_sums += np.bincount(
+                replicates, weights=counts * table["age"], minlength=self.n_replicates
+            )
+        return stage_counts, age_sums
+
+    def _update_metrics(self):
+        self._record_metrics(*self._get_tree_totals())
+
+    def _record_metrics(self, stage_counts, age_sums):
+        row = self.steps - 1
+        n_live = stage_counts.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_age = (age_sums + self._dead_age_sums) / (n_live + self._n_dead)
+
+        refugia = self._landscape["refugia_status"].astype(bool)
+        occupied_refugia = ((self.max_life_stages > 0) & refugia).sum(axis=(1, 2))
+
+        model_vars = self._model_vars
+        model_vars["Mean Age"][row] = mean_age
+        model_vars["N Agents"][row] = n_live
+        model_vars["N Seeds"][row] = stage_counts[:, LifeStage.SEED]
+        model_vars["N Seedlings"][row] = stage_counts[:, LifeStage.SEEDLING]
+        model_vars["N Juveniles"][row] = stage_counts[:, LifeStage.JUVENILE]
+        model_vars["N Adults"][row] = stage_counts[:, LifeStage.ADULT]
+        model_vars["N Breeding"][row] = stage_counts[:, LifeStage.BREEDING]
+        model_vars["% Refugia Cells Occupied"][row] = occupied_refugia / refugia.sum()
+
+    def get_cell_attribute_rasters(self, cell_attributes):
+        """(replicate, x, y) rasters of cell attributes, as saved to Zarr."""
+        raster_shape = self.max_life_stages.shape
+        rasters = {
+            "jotr_max_life_stage": self.max_life_stages,
+            "occupied_by_jotr_agents": self.max_life_stages > 0,
+        }
+        for attribute in ["elevation", "refugia_status"]:
+            rasters[attribute] = np.broadcast_to(
+                self._landscape[attribute], raster_shape
+            )
+        return {attribute: rasters[attribute] for attribute in cell_attributes}
+
+    def get_dataframe(self, rows=None, constant_columns=None) -> pd.DataFrame:
+        """
+        Collected rows (all steps by default) of every replicate, one row per
+        replicate and step as in a batch run's results - an `iteration` column
+        numbering replicates from 0, then any `constant_columns`.
+        """
+        rows = np.arange(self.steps) if rows is None else np.asarray(rows)
+        n_rows = len(rows)
+
+        data = {"iteration": np.repeat(np.arange(self.n_replicates), n_rows)}
+        for name, value in (constant_columns or {}).items():
+            data[name] = np.full(n_rows * self.n_replicates, value)
+        data["Step"] = np.tile(rows + 1, self.n_replicates)
+        for reporter, values in self._model_vars.items():
+            # (step, replicate) -> replicate-major rows
+            data[reporter] = values[rows].T.ravel()
+        data["replicate_idx"] = (
+            np.repeat(self.replicate_idxs, n_rows)
+            if self.replicate_idxs is not None
+            else None
+        )
+
+        return pd.DataFrame(data)
+
+    def cleanup(self):
+        self._close_climate_drivers()
+        if self._save_to_zarr:
+            self._zarr_manager.write_replicate_summaries()
+            self._zarr_manager.consolidate_metadata()
+
+    def step(self):
+        if not self._on_start_executed:
+            self._on_start()
+
+        self.steps += 1
+        profiler = self.step_profiler
+        profiler.increment("n_agents_stepped", len(self.trees["age"]))
+        profiler.increment("n_cohorts_stepped", len(self.cohorts["age"]))
+
+        with profiler.phase("climate"):
+            self._update_climate()
+
+        with profiler.phase("agent_step"):
+            self._step_trees()
+            self._step_cohorts()
+            with profiler.phase("dispersal"):
+                self._disperse_seeds()
+
+        if self.cohort_density_threshold is not None:
+            with profiler.phase("cohorts"):
+                self._update_cohort_cells()
+
+        with profiler.phase("occupancy"):
+            self._update_occupancy()
+
+        with profiler.phase("metrics"):
+            self._update_metrics()
+
+        self._end_step()
+
+    def _end_step(self):
+        profiler = self.step_profiler
+        if self._save_to_zarr:
+            with profiler.phase("zarr"):
+                self._zarr_manager.append_synchronized_timestep(
+                    timestep_idx=self.steps,
+                    timestep_array_dict=self.get_cell_attribute_rasters(
+                        self._cell_attributes_to_save
+                    ),
+                )
+
+        profiler.end_step(self.steps)
+
+        if self.steps >= self.num_steps:
+            self.running = False
+            self.cleanup()
@@ -0,0 +1,348 @@
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from vegetation.model.lockstep import LockstepVegetation
+from vegetation.utils.spatial import coords_to_raster_pos
+
+# Per-tree fields of seeds passed between tiles
+HALO_FIELDS = ("x_utm", "y_utm", "x_wgs84", "y_wgs84", "age", "cell_x")
+
+
+class LockstepTile(LockstepVegetation):
+    """
+    The trees of one tile of a single replicate - the raster columns
+    `x_start:x_stop` - stepped with the lockstep engine's rules. Trees added
+    beyond the tile's columns (seeds dispersed across its edges) aren't kept,
+    but held in a halo buffer for the tiles they landed in.
+    """
+
+    _save_to_zarr = False
+
+    def __init__(
+        self,
+        aoi_bounds,
+        x_start,
+        x_stop,
+        epsg=4326,
+        seed=None,
+        transition_rates_path=None,
+        climate_driver_paths=None,
+    ):
+        self._aoi_bounds = aoi_bounds
+        # Rasters would cover the whole study area, not just the tile
+        super().__init__(
+            n_replicates=1,
+            num_steps=0,
+            epsg=epsg,
+            seed=seed,
+            dispersal_mode="points",
+            transition_rates_path=transition_rates_path,
+            climate_driver_paths=climate_driver_paths,
+        )
+        self.x_start, self.x_stop = x_start, x_stop
+        self._halo = []
+
+    def _on_start(self):
+        self._load_landscape()
+        # Every tile reads all initial trees and keeps its own
+        self._add_initial_trees()
+        self._take_halo()
+        self._on_start_executed = True
+
+    def _append_trees(self, replicates, xs_utm, ys_utm, xs_wgs84, ys_wgs84, ages):
+        ages = np.broadcast_to(np.asarray(ages), np.shape(xs_utm))
+        cell_xs, __cell_ys = coords_to_raster_pos(
+            self._transform, self.height, xs_wgs84, ys_wgs84
+        )
+        in_tile = (cell_xs >= self.x_start) & (cell_xs < self.x_stop)
+
+        leaving = ~in_tile
+        self._halo.append(
+            {
+                "x_utm": xs_utm[leaving],
+                "y_utm": ys_utm[leaving],
+                "x_wgs84": xs_wgs84[leaving],
+                "y_wgs84": ys_wgs84[leaving],
+                "age": ages[leaving],
+                "cell_x": cell_xs[leaving],
+            }
+        )
+
+        return super()._append_trees(
+            np.asarray(replicates)[in_tile],
+            xs_utm[in_tile],
+            ys_utm[in_tile],
+            xs_wgs84[in_tile],
+            ys_wgs84[in_tile],
+            ages[in_tile],
+        )
+
+    def _take_halo(self):
+        halo = {
+            field: np.concatenate([trees[field] for trees in self._halo])
+            for field in HALO_FIELDS
+        }
+        self._halo = []
+        return halo
+
+    def disperse(self):
+        """Step the tile's trees, returning the seeds they dispersed to other tiles."""
+        if not self._on_start_executed:
+            self._on_start()
+
+        self.steps += 1
+        self.step_profiler.increment("n_agents_stepped", len(self.trees["age"]))
+        self._update_climate()
+        self._step_trees()
+        self._disperse_seeds()
+        return self._take_halo()
+
+    def collect(self, incoming_seeds):
+        """
+        Add the seeds other tiles dispersed into this one, returning the
+        tile's tree totals and the max life stage of its columns.
+        """
+        n_added = self._append_trees(
+            np.zeros(len(incoming_seeds["age"]), dtype=np.int64),
+            incoming_seeds["x_utm"],
+            incoming_seeds["y_utm"],
+            incoming_seeds["x_wgs84"],
+            incoming_seeds["y_wgs84"],
+            incoming_seeds["age"],
+        )
+        self.step_profiler.increment("n_seeds_created", n_added)
+
+        trees = self.trees
+        tile_width = self.x_stop - self.x_start
+        max_life_stages = np.full(tile_width * self.height, -1, dtype=np.int8)
+        np.maximum.at(
+            max_life_stages,
+            (trees["cell_x"] - self.x_start) * self.height + trees["cell_y"],
+            trees["life_stage"],
+        )
+
+        stage_counts, age_sums = self._get_tree_totals()
+        counters = self.step_profiler.get_counters()
+        self.step_profiler.end_step(self.steps)
+        return {
+            "stage_counts": stage_counts,
+            "age_sums": age_sums,
+            "n_dead": self._n_dead,
+            "dead_age_sums": self._dead_age_sums,
+            "max_life_stages": max_life_stages.reshape(tile_width, self.height),
+            "counters": counters,
+        }
+
+
+def _run_tile_worker(connection, tiles_kwargs):
+    # Hosts some of a replicate's tiles, calling the same method on each of
+    # them for every message until told to stop
+    tiles = [LockstepTile(**tile_kwargs) for tile_kwargs in tiles_kwargs]
+    while (message := connection.recv()) is not None:
+        method, tiles_args = message
+        try:
+            results = [
+                getattr(tile, method)(*tile_args)
+                for tile, tile_args in zip(tiles, tiles_args)
+            ]
+        except Exception as e:
+            results = e
+        connection.send(results)
+    for tile in tiles:
+        tile._close_climate_drivers()
+
+
+class TiledVegetation(LockstepVegetation):
+    """
+    A single replicate split into `n_tiles` strips of raster columns, for
+    study areas too large to step on one core. Each tile's trees are stepped
+    by its own `LockstepTile`, spread over `number_processes` worker processes
+    (or all in this process, with 1).
+
+    A step is two exchanges with the tiles: they step their trees and disperse
+    seeds, handing back the seeds that crossed their edges - a halo at most
+    `JOTR_SEED_DISPERSAL_DISTANCE` wide - which are passed to the tiles they
+    landed in. The tiles then return their tree totals and max life stages,
+    which are stitched back into this model's metrics and raster.
+
+    Each tile draws from its own random stream, spawned from `seed`, so a run
+    is reproducible for a given seed and number of tiles (whatever the number
+    of processes), and matches the lockstep engine statistically rather than
+    draw for draw.
+    """
+
+    def __init__(
+        self,
+        num_steps=20,
+        n_tiles=2,
+        number_processes=1,
+        management_planting_density=0.01,
+        epsg=4326,
+        simulation_name=None,
+        seed=None,
+        transition_rates_path=None,
+        climate_driver_paths=None,
+    ):
+        if n_tiles < 1 or number_processes < 1:
+            raise ValueError(
+                f"Need at least one tile and process, got {n_tiles} tiles and {number_processes} processes"
+            )
+        super().__init__(
+            n_replicates=1,
+            num_steps=num_steps,
+            management_planting_density=management_planting_density,
+            epsg=epsg,
+            simulation_name=simulation_name,
+            seed=seed,
+            transition_rates_path=transition_rates_path,
+            climate_driver_paths=climate_driver_paths,
+        )
+        self.n_tiles = n_tiles
+        self.number_processes = min(number_processes, n_tiles)
+        self._tile_seeds = np.random.SeedSequence(seed).spawn(n_tiles)
+
+        self.tile_x_bounds = None
+        self._tiles = None
+        self._workers = None
+
+    def _on_start(self):
+        self._load_landscape()
+
+        if self.n_tiles > self.width:
+            raise ValueError(
+                f"Can't split {self.width} raster columns into {self.n_tiles} tiles"
+            )
+        self.tile_x_bounds = np.linspace(0, self.width, self.n_tiles + 1).astype(int)
+        self._start_tiles()
+
+        if self._save_to_zarr:
+            self._initialize_zarr_manager()
+
+        self._on_start_executed = True
+
+    def _start_tiles(self):
+        tiles_kwargs = [
+            {
+                "aoi_bounds": self._aoi_bounds,
+                "x_start": x_start,
+                "x_stop": x_stop,
+                "epsg": self.space.epsg,
+                "seed": tile_seed,
+                "transition_rates_path": self.transition_rates_path,
+                "climate_driver_paths": self.climate_driver_paths,
+            }
+            for x_start, x_stop, tile_seed in zip(
+                self.tile_x_bounds[:-1], self.tile_x_bounds[1:], self._tile_seeds
+            )
+        ]
+        if self.number_processes == 1:
+            self._tiles = [LockstepTile(**tile_kwargs) for tile_kwargs in tiles_kwargs]
+            return
+
+        # Tiles are dealt out to workers, which each hold on to theirs
+        self._workers = []
+        for worker_idx in range(self.number_processes):
+            tile_idxs = list(range(worker_idx, self.n_tiles, self.number_processes))
+            connection, worker_connection = Pipe()
+            process = Process(
+                target=_run_tile_worker,
+                args=(worker_connection, [tiles_kwargs[idx] for idx in tile_idxs]),
+                daemon=True,
+            )
+            process.start()
+            self._workers.append((process, connection, tile_idxs))
+
+    def _call_tiles(self, method, tiles_args):
+        """Call a method of every tile, with its own arguments, in parallel."""
+        if self._workers is None:
+            return [
+                getattr(tile, method)(*tile_args)
+                for tile, tile_args in zip(self._tiles, tiles_args)
+            ]
+
+        for __process, connection, tile_idxs in self._workers:
+            connection.send((method, [tiles_args[idx] for idx in tile_idxs]))
+
+        results = [None] * self.n_tiles
+        for __process, connection, tile_idxs in self._workers:
+            worker_results = connection.recv()
+            if isinstance(worker_results, Exception):
+                raise worker_results
+            for idx, result in zip(tile_idxs, worker_results):
+                results[idx] = result
+        return results
+
+    def _route_halo_seeds(self, halos):
+        """Seeds that crossed tile edges, gathered by the tile they landed in."""
+        seeds = {
+            field: np.concatenate([halo[field] for halo in halos])
+            for field in HALO_FIELDS
+        }
+        # Seeds landing outside the raster are dropped, as in a serial run
+        cell_xs = seeds["cell_x"]
+        within_raster = (cell_xs >= 0) & (cell_xs < self.width)
+        destination_tiles = (
+            np.searchsorted(self.tile_x_bounds, cell_xs, side="right") - 1
+        )
+        return [
+            {
+                field: values[within_raster & (destination_tiles == tile_idx)]
+                for field, values in seeds.items()
+            }
+            for tile_idx in range(self.n_tiles)
+        ]
+
+    def close(self):
+        """Stop the tile workers, if any, or the tiles' climate driver reads."""
+        if self._workers is None:
+            for tile in self._tiles or []:
+                tile._close_climate_drivers()
+            return
+        for process, connection, __tile_idxs in self._workers:
+            connection.send(None)
+            process.join()
+        self._workers = None
+
+    def cleanup(self):
+        super().cleanup()
+        self.close()
+
+    def step(self):
+        if not self._on_start_executed:
+            self._on_start()
+
+        self.steps += 1
+        profiler = self.step_profiler
+
+        with profiler.phase("agent_step"):
+            halos = self._call_tiles("disperse", [()] * self.n_tiles)
+
+        with profiler.phase("halo_exchange"):
+            incoming_seeds = self._route_halo_seeds(halos)
+            tile_totals = self._call_tiles(
+                "collect", [(seeds,) for seeds in incoming_seeds]
+            )
+
+        with profiler.phase("occupancy"):
+            max_life_stages = np.concatenate(
+                [totals["max_life_stages"] for totals in tile_totals]
+            )[np.newaxis]
+            profiler.increment(
+                "n_cells_dirtied",
+                int((max_life_stages != self.max_life_stages).sum()),
+            )
+            self.max_life_stages = max_life_stages
+
+        with profiler.phase("metrics"):
+            for totals in tile_totals:
+                for counter, n in totals["counters"].items():
+                    profiler.increment(counter, n)
+            self._n_dead = sum(totals["n_dead"] for totals in tile_totals)
+            self._dead_age_sums = sum(totals["dead_age_sums"] for totals in tile_totals)
+            self._record_metrics(
+                sum(totals["stage_counts"] for totals in tile_totals),
+                sum(totals["age_sums"] for totals in tile_totals),
+            )
+
+        self._end_step()
@@ -1,16 +1,26 @@
 import mesa
-import mesa_geo as mg
 import numpy as np
+import shapely
 import shapely.geometry as sg
 from shapely.ops import transform
 import json
 import logging
+from functools import partial
 
 from vegetation.config.life_stages import LifeStage
+from vegetation.config.transitions import (
+    TransitionRates,
+    get_jotr_life_stages_from_ages,
+)
 from vegetation.space.veg_cell import VegCell
 from vegetation.space.study_area import StudyArea
-from vegetation.utils.spatial import transform_point_wgs84_utm
-from vegetation.config.global_paths import INITIAL_AGENTS_PATH
+from vegetation.space.climate_drivers import ClimateDriverStack
+from vegetation.utils.spatial import (
+    coords_to_raster_pos,
+    sample_points_in_polygon,
+    transform_point_wgs84_utm,
+)
+from vegetation.config.global_paths import INITIAL_AGENTS_PATH, TRANSITION_RATES_PATH
 from vegetation.logging.logging import (
     LogConfig,
     SimLogger,
@@ -19,29 +29,66 @@ from vegetation.logging.logging import (
 from vegetation.utils.zarr_manager import (
     get_array_from_nested_cell_list,
 )
+from vegetation.logging.event_log import AgentEventLog
+from vegetation.utils.datacollector import ColumnarDataCollector
+from vegetation.utils.profiling import StepProfiler
+from vegetation.utils.memory import MEMORY_REPORTERS, MemoryTracker
 from vegetation.model.joshua_tree_agent import JoshuaTreeAgent
 from vegetation.utils.zarr_manager import ZarrManager
 
 ZARR_FILENAME = "vegetation.zarr"
+
+# -1 marks ages with no purely age-driven life stage
+LIFE_STAGES_BY_VALUE = {-1: None} | {
+    life_stage.value: life_stage for life_stage in LifeStage
+}
+# Independent random streams of a run, spawned from its seed - trees descended
+# from the initial trees draw from "background", planted trees (and their
+# offspring) from "management", and "schedule" orders agents each step
+RANDOM_STREAMS = ("background", "management", "schedule")
+
 TEST_RUN_PARAMETERS = {
     "seedling_mortality_rate": 0.1,
     "juvenile_mortality_rate": 0.7,
 }
 
 
+def _get_memory_sample(model, key):
+    return model.memory_tracker.last_sample[key]
+
+
 class Vegetation(mesa.Model):
     def __init__(
         self,
         num_steps=20,
         management_planting_density=0.01,
+        management_planting_layout="random",
         epsg=4326,
         log_config_path=None,
         log_level=None,
         simulation_name=None,
         ignore_zarr_warning=False,
         ignore_attribute_encodings_warning=False,
+        event_log_dir=None,
+        track_agent_geometries=False,
+        memory_tracking=None,
+        memory_budget_mb=None,
+        memory_budget_action="compact",
+        seed=None,
+        transition_rates_path=None,
+        climate_driver_paths=None,
     ):
-        super().__init__()
+        # Record the seed (drawn from the OS if not given), so any run can be
+        # replayed exactly with `seed=vegetation.seed`
+        self.seed = np.random.SeedSequence(seed).entropy
+        self._random_streams = {
+            stream: np.random.SeedSequence(self.seed, spawn_key=(stream_idx,))
+            for stream_idx, stream in enumerate(RANDOM_STREAMS)
+        }
+        super().__init__(
+            seed=int(self._random_streams["schedule"].generate_state(1)[0])
+        )
+        self.management_rng = np.random.default_rng(self._random_streams["management"])
         self._ignore_zarr_warning = ignore_zarr_warning
         self._ignore_attribute_encodings_warning = ignore_attribute_encodings_warning
         self._verify_class_attributes()
@@ -56,33 +103,81 @@ class Vegetation(mesa.Model):
 
         self.num_steps = num_steps
         self.management_planting_density = management_planting_density
+        self.management_planting_layout = management_planting_layout
         self._on_start_executed = False
 
+        # Compiled against the elevation and refugia rasters on start
+        self.transition_rates_path = transition_rates_path
+        self.transition_rates = TransitionRates.from_config(
+            transition_rates_path or TRANSITION_RATES_PATH
+        )
+        # Per-step climate rasters the rates may vary with, opened on start
+        self.climate_driver_paths = climate_driver_paths
+        self.climate_drivers = None
+        missing_drivers = set(self.transition_rates.climate_covariates) - set(
+            climate_driver_paths or {}
+        )
+        if missing_drivers:
+            raise ValueError(
+                f"Transition rates vary with climate covariates {sorted(missing_drivers)} - pass their stacks in climate_driver_paths"
+            )
+
         # Set to None until zarr_manager is initialized - if None when df is saved,
         # we assume we didn't save any cell rasters to zarr. If a proper index,
         # we assume we grab that simulation raster using composite key of
         # (simulation_name x replicate_idx)
         self.replicate_idx = None
 
+        # Optional per-step memory footprint ("rss" or "tracemalloc"), recorded
+        # with the model reporters - setting a budget turns it on as well
+        self.memory_tracker = None
+        if memory_tracking or memory_budget_mb is not None:
+            self.memory_tracker = MemoryTracker(
+                mode=memory_tracking or "rss",
+                budget_mb=memory_budget_mb,
+                budget_action=memory_budget_action,
+            )
+
         # mesa setup
         self.space = StudyArea(self._aoi_bounds, epsg=epsg, model=self)
-        self.datacollector = mesa.DataCollector(
-            {
-                "Mean Age": "mean_age",
-                "N Agents": "n_agents",
-                "N Seeds": "n_seeds",
-                "N Seedlings": "n_seedlings",
-                "N Juveniles": "n_juveniles",
-                "N Adults": "n_adults",
-                "N Breeding": "n_breeding",
-                "% Refugia Cells Occupied": "pct_refugia_cells_occupied",
-                "replicate_idx": "replicate_idx",
-            }
+        model_reporters = {
+            "Mean Age": "mean_age",
+            "N Agents": "n_agents",
+            "N Seeds": "n_seeds",
+            "N Seedlings": "n_seedlings",
+            "N Juveniles": "n_juveniles",
+            "N Adults": "n_adults",
+            "N Breeding": "n_breeding",
+            "% Refugia Cells Occupied": "pct_refugia_cells_occupied",
+            "replicate_idx": "replicate_idx",
+        }
+        if self.memory_tracker is not None:
+            model_reporters.update(
+                {
+                    reporter: partial(_get_memory_sample, key=key)
+                    for reporter, key in MEMORY_REPORTERS.items()
+                }
+            )
+        self.datacollector = ColumnarDataCollector(
+            model_reporters=model_reporters, n_rows=num_steps
         )
 
+        # Trees are located by raster cell (`space.cell_agent_index`), so the
+        # GeoSpace agent layer (and its R-tree) is only kept up to date when
+        # something needs agent geometries, e.g. drawing or exporting agents
+        self.track_agent_geometries = track_agent_geometries
+
+        # Per-step phase timings and event counters - `agent_step` includes the
+        # time spent in `dispersal`
+        self.step_profiler = StepProfiler()
+
         self.simulation_name = simulation_name
         self._zarr_manager = None
 
+        # Optional structured record of agent lifecycle events (one Parquet part
+        # file per run) - None disables it entirely
+        self.event_log = AgentEventLog(event_log_dir) if event_log_dir else None
+
         # TODO: Using class setters to subvert mesa collecting certain attributes
         # This is a weird / smelly use of class variables and a bit of a hack,
         # but we will likely address this differently when we do our own aggregation
@@ -114,7 +209,6 @@ class Vegetation(mesa.Model):
     def set_aoi_bounds(cls, aoi_bounds):
         cls._aoi_bounds = aoi_bounds
 
-    @classmethod
     def _generate_planting_points(self, geo_json):
         # Convert GeoJSON to Shapely polygon
         coords = geo_json[0]["geometry"]["coordinates"][0]
@@ -129,21 +223,16 @@ class Vegetation(mesa.Model):
         area = utm_polygon.area
         num_points = int(area * self.management_planting_density)
 
-        points = []
-        minx, miny, maxx, maxy = utm_polygon.bounds
-
-        while len(points) < num_points:
-            x_utm = np.random.uniform(minx, maxx)
-            y_utm = np.random.uniform(miny, maxy)
-            point_utm = sg.Point(x_utm, y_utm)
-
-            if utm_polygon.contains(point_utm):
-                management_x_wgs84, management_y_wgs84 = utm_to_wgs84.transform(
-                    x_utm, y_utm
-                )
-                points.append((management_x_wgs84, management_y_wgs84))
+        xs_utm, ys_utm = sample_points_in_polygon(
+            utm_polygon,
+            num_points,
+            layout=self.management_planting_layout,
+            rng=self.management_rng,
+        )
+        xs_wgs84, ys_wgs84 = utm_to_wgs84.transform(xs_utm, ys_utm)
 
-        return points
+        # (n_points, 2) array of (lon, lat)
+        return np.column_stack([xs_wgs84, ys_wgs84])
 
     def _initialize_zarr_manager(self):
         zarr_manager = ZarrManager(
@@ -171,6 +260,10 @@ class Vegetation(mesa.Model):
         self.replicate_idx = zarr_manager.resize_array_for_next_replicate()
         self._zarr_manager = zarr_manager
 
+    def spawn_seed_sequences(self, stream, n):
+        """Seeds for `n` new trees' own random streams, from one of `RANDOM_STREAMS`."""
+        return self._random_streams[stream].spawn(n)
+
     def _verify_class_attributes(self):
         if (
             not hasattr(self, "_attribute_encodings")
@@ -198,6 +291,20 @@ class Vegetation(mesa.Model):
 
         self.space.get_elevation()
         self.space.get_refugia_status()
+        self.transition_rates.bind(
+            get_array_from_nested_cell_list(
+                veg_cells=self.space.raster_layer.cells,
+                cell_attributes_to_get=["elevation", "refugia_status"],
+            )
+        )
+        if self.climate_driver_paths:
+            self.climate_drivers = ClimateDriverStack.for_raster_layer(
+                self.climate_driver_paths, self.space.raster_layer
+            )
+            if self.climate_drivers.n_timesteps < self.num_steps:
+                raise ValueError(
+                    f"Climate drivers cover {self.climate_drivers.n_timesteps} steps, but the run has {self.num_steps}"
+                )
 
         with open(INITIAL_AGENTS_PATH, "r") as f:
             initial_agents_geojson = json.loads(f.read())
@@ -210,17 +317,12 @@ class Vegetation(mesa.Model):
         self._on_start_executed = True
 
     def _add_agents_from_geojson(self, agents_geojson):
-        agents = mg.AgentCreator(JoshuaTreeAgent, model=self).from_GeoJSON(
-            agents_geojson
+        features = agents_geojson["features"]
+        self.add_trees_bulk(
+            coords=[feature["geometry"]["coordinates"] for feature in features],
+            ages=[feature["properties"]["age"] for feature in features],
+            seed_sequences=self.spawn_seed_sequences("background", len(features)),
         )
-
-        # TODO: Find a way to update life stage on init
-        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/9
-        # Since .from_GeoJSON() sets attributes after init, we call
-        # _update_life_stage after init, but before we add to the grid
-        self.agents.select(agent_type=JoshuaTreeAgent).do("_update_life_stage")
-
-        self.space.add_agents(agents)
         self.update_metrics()
 
     # def add_agents_from_management_draw(event, geo_json, action):
@@ -236,19 +338,95 @@ class Vegetation(mesa.Model):
             context={"n_agents": len(outplanting_point_locations)},
         )
 
-        for management_x_wgs84, management_y_wgs84 in outplanting_point_locations:
-            # TODO: Vegetation model doesn't know its own CRS
-            # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/26
-            management_agent = JoshuaTreeAgent(
+        self.add_trees_bulk(outplanting_point_locations, ages=20)
+
+    def add_trees_bulk(self, coords, ages, parent_ids=None, seed_sequences=None):
+        """
+        Create Joshua Tree agents for a batch of (lon, lat) coordinates, with a
+        single or per-tree age and parent id. Raster cells and age-driven life
+        stages are computed for the whole batch at once. Trees falling outside
+        the study area raster are dropped.
+
+        Each tree's random stream is seeded from `seed_sequences` (one per
+        coordinate), or from the management stream by default.
+
+        Returns the list of created agents.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        n_trees = len(coords)
+        ages = np.broadcast_to(np.asarray(ages), (n_trees,))
+        parent_ids = np.broadcast_to(np.asarray(parent_ids, dtype=object), (n_trees,))
+        if seed_sequences is None:
+            seed_sequences = self.spawn_seed_sequences("management", n_trees)
+        seed_sequences = np.asarray(seed_sequences, dtype=object).reshape(n_trees)
+
+        raster_layer = self.space.raster_layer
+        xs, ys = coords_to_raster_pos(
+            raster_layer._transform, raster_layer.height, coords[:, 0], coords[:, 1]
+        )
+        within_raster = (
+            (xs >= 0)
+            & (xs < raster_layer.width)
+            & (ys >= 0)
+            & (ys < raster_layer.height)
+        )
+        if not within_raster.all():
+            logging.debug(
+                f"Dropping {n_trees - within_raster.sum()} trees outside the study area"
+            )
+
+        life_stages = get_jotr_life_stages_from_ages(ages)
+        geometries = shapely.points(coords)
+
+        # TODO: Vegetation model doesn't know its own CRS
+        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/26
+        agents = [
+            JoshuaTreeAgent(
                 model=self,
-                geometry=sg.Point(management_x_wgs84, management_y_wgs84),
+                geometry=geometry,
                 crs="EPSG:4326",
-                age=20,
-                parent_id=None,
+                age=age,
+                parent_id=None if parent_id is None else int(parent_id),
+                indices=(x, y),
+                life_stage=LIFE_STAGES_BY_VALUE[life_stage],
+                seed_sequence=seed_sequence,
             )
-            management_agent._update_life_stage()
-
-            self.space.add_agents(management_agent)
+            for geometry, age, parent_id, x, y, life_stage, seed_sequence in zip(
+                geometries[within_raster],
+                ages[within_raster].tolist(),
+                parent_ids[within_raster],
+                xs[within_raster].tolist(),
+                ys[within_raster].tolist(),
+                life_stages[within_raster].tolist(),
+                seed_sequences[within_raster],
+            )
+        ]
+
+        self.add_agents_to_geospace(agents)
+        return agents
+
+    def add_agents_to_geospace(self, agents):
+        if self.track_agent_geometries:
+            self.space.add_agents(agents)
+
+    def remove_dead_agents(self):
+        """
+        Drop dead trees from the model to free memory - they are already out of
+        the cell -> agent index. `Mean Age` averages over every tree agent, so
+        removed dead trees stop counting towards it.
+        """
+        if JoshuaTreeAgent not in self.agents_by_type:
+            return 0
+        dead_agents = self.agents_by_type[JoshuaTreeAgent].select(
+            filter_func=lambda agent: agent.life_stage == LifeStage.DEAD
+        )
+        for agent in list(dead_agents):
+            if self.track_agent_geometries:
+                self.space.remove_agent(agent)
+            agent.remove()
+        # Live agent counts are unchanged, but none of the remaining are dead
+        self.n_dead = 0
+        return len(dead_agents)
 
     def update_metrics(self):
         # Mean age
@@ -293,7 +471,15 @@ class Vegetation(mesa.Model):
         )
 
     def cleanup(self):
+        if self.event_log is not None:
+            self.event_log.close()
+
+        if self.climate_drivers is not None:
+            self.climate_drivers.close()
+            self.climate_drivers = None
+
         if self._save_to_zarr:
+            self.zarr_manager.write_replicate_summaries()
             self.zarr_manager.consolidate_metadata()
 
     def step(self):
@@ -302,13 +488,36 @@ class Vegetation(mesa.Model):
 
         self.sim_logger.log_sim_event(self, SimEventType.ON_STEP)
 
-        self.agents.shuffle_do("step")
-        self.update_metrics()
+        profiler = self.step_profiler
+        # Only live trees step - VegCells don't, and dead trees return at once.
+        # `n_dead` is current as of the last metrics update or compaction
+        n_trees = len(self.agents_by_type.get(JoshuaTreeAgent, ()))
+        profiler.increment("n_agents_stepped", n_trees - self.n_dead)
 
-        self.datacollector.collect(self)
+        if self.climate_drivers is not None:
+            with profiler.phase("climate"):
+                self.climate_drivers.update_transition_rates(
+                    self.transition_rates, self.steps, profiler
+                )
+
+        with profiler.phase("agent_step"):
+            self.agents.shuffle_do("step")
+
+        with profiler.phase("metrics"):
+            self.update_metrics()
+
+        if self.memory_tracker is not None:
+            with profiler.phase("memory"):
+                self.memory_tracker.check_budget(self, JoshuaTreeAgent)
+
+        with profiler.phase("datacollector"):
+            self.datacollector.collect(self)
 
         if self._save_to_zarr:
-            self._append_timestep_to_zarr()
+            with profiler.phase("zarr"):
+                self._append_timestep_to_zarr()
+
+        profiler.end_step(self.steps)
 
         if self.steps >= self.num_steps:
             self.running = False
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+class CellAgentIndex:
+    """
+    Index from raster cells to the agents within them, keyed by cell `pos`
+    (x, y), matching the raster layer's `cells[x][y]`.
+
+    Each occupied cell holds a dict of `unique_id -> agent`, and each agent's
+    cell is remembered, so adding, removing and moving an agent are O(1)
+    regardless of how crowded the cell is. Empty cells take no memory.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self._cell_agents: Dict[Tuple[int, int], Dict[int, object]] = defaultdict(dict)
+        self._agent_cells: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._agent_cells)
+
+    def __contains__(self, agent) -> bool:
+        return agent.unique_id in self._agent_cells
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the index's own containers (not the agents)."""
+        return (
+            sys.getsizeof(self._agent_cells)
+            + sys.getsizeof(self._cell_agents)
+            + sum(
+                sys.getsizeof(cell_agents) for cell_agents in self._cell_agents.values()
+            )
+        )
+
+    def _check_pos(self, pos) -> Tuple[int, int]:
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise ValueError(
+                f"Cell {pos} is outside of the {self.width}x{self.height} raster"
+            )
+        return (x, y)
+
+    def add(self, agent, pos) -> None:
+        pos = self._check_pos(pos)
+        previous_pos = self._agent_cells.get(agent.unique_id)
+        if previous_pos is not None:
+            self._discard(agent.unique_id, previous_pos)
+
+        self._cell_agents[pos][agent.unique_id] = agent
+        self._agent_cells[agent.unique_id] = pos
+
+    def remove(self, agent) -> None:
+        pos = self._agent_cells.pop(agent.unique_id, None)
+        if pos is not None:
+            self._discard(agent.unique_id, pos)
+
+    def _discard(self, unique_id: int, pos: Tuple[int, int]) -> None:
+        cell_agents = self._cell_agents[pos]
+        del cell_agents[unique_id]
+        if not cell_agents:
+            del self._cell_agents[pos]
+
+    def rebuild(self, agents: Iterable) -> None:
+        """Replace the whole index from agents' current `indices`."""
+        self._cell_agents = defaultdict(dict)
+        self._agent_cells = {}
+        for agent in agents:
+            pos = self._check_pos(agent.indices)
+            self._cell_agents[pos][agent.unique_id] = agent
+            self._agent_cells[agent.unique_id] = pos
+
+    def agents_in_cell(self, pos):
+        """Live view of the agents in the cell at `pos` (do not mutate while iterating)."""
+        cell_agents = self._cell_agents.get(pos)
+        return cell_agents.values() if cell_agents else ()
+
+    def count_in_cell(self, pos) -> int:
+        cell_agents = self._cell_agents.get(pos)
+        return len(cell_agents) if cell_agents else 0
+
+    def _iter_neighborhood_cells(
+        self, pos, radius: int, moore: bool, include_center: bool
+    ):
+        x, y = pos
+        for neighbor_x in range(max(x - radius, 0), min(x + radius + 1, self.width)):
+            for neighbor_y in range(
+                max(y - radius, 0), min(y + radius + 1, self.height)
+            ):
+                dx, dy = neighbor_x - x, neighbor_y - y
+                if dx == 0 and dy == 0 and not include_center:
+                    continue
+                if not moore and abs(dx) + abs(dy) > radius:
+                    continue
+
+                cell_agents = self._cell_agents.get((neighbor_x, neighbor_y))
+                if cell_agents:
+                    yield cell_agents
+
+    def iter_agents_in_neighborhood(
+        self, pos, radius: int = 1, moore: bool = True, include_center: bool = True
+    ) -> Iterator:
+        """Agents in the cells within `radius` of `pos`, clipped to the raster."""
+        for cell_agents in self._iter_neighborhood_cells(
+            pos, radius, moore, include_center
+        ):
+            yield from cell_agents.values()
+
+    def count_in_neighborhood(
+        self, pos, radius: int = 1, moore: bool = True, include_center: bool = True
+    ) -> int:
+        return sum(
+            len(cell_agents)
+            for cell_agents in self._iter_neighborhood_cells(
+                pos, radius, moore, include_center
+            )
+        )
+
+    def get_count_raster(self) -> np.ndarray:
+        """Number of indexed agents per cell as a (height, width) array, north up."""
+        counts = np.zeros((self.height, self.width), dtype=np.int32)
+        for (x, y), cell_agents in self._cell_agents.items():
+            # y is measured up from the bottom of the raster
+            counts[self.height - 1 - y, x] = len(cell_agents)
+        return counts
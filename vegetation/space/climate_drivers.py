@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+import zarr
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+
+# File extensions read as GeoTIFF stacks (one band per timestep) - anything
+# else is opened as a Zarr array
+GEOTIFF_EXTENSIONS = (".tif", ".tiff")
+
+
+class _GeoTiffStack:
+    # One band per timestep, georeferenced by the file itself
+    def __init__(self, path):
+        self._dataset = rasterio.open(path)
+        self.n_timesteps = self._dataset.count
+        self.transform = self._dataset.transform
+        self.crs = self._dataset.crs
+        self.nodata = self._dataset.nodata
+
+    def read(self, timestep_idx):
+        return self._dataset.read(timestep_idx + 1)
+
+    def close(self):
+        self._dataset.close()
+
+
+class _ZarrStack:
+    # A (time, row, col) array, georeferenced by its `transform` (affine
+    # coefficients a-f) and `crs` attributes
+    def __init__(self, path):
+        self._array = zarr.open_array(path, mode="r")
+        missing_attrs = {"transform", "crs"} - set(self._array.attrs)
+        if missing_attrs or self._array.ndim != 3:
+            raise ValueError(
+                f"Climate driver Zarr arrays need (time, row, col) dimensions and `transform` and `crs` attributes - {path} has shape {self._array.shape} and lacks {sorted(missing_attrs)}"
+            )
+        self.n_timesteps = self._array.shape[0]
+        self.transform = Affine(*self._array.attrs["transform"][:6])
+        self.crs = CRS.from_user_input(self._array.attrs["crs"])
+        self.nodata = self._array.attrs.get("nodata")
+
+    def read(self, timestep_idx):
+        return self._array[timestep_idx]
+
+    def close(self):
+        pass
+
+
+def _open_driver_stack(path):
+    if str(path).lower().endswith(GEOTIFF_EXTENSIONS):
+        return _GeoTiffStack(path)
+    return _ZarrStack(path)
+
+
+class ClimateDriverStack:
+    """
+    Per-timestep climate rasters (e.g. yearly precipitation and temperature),
+    read from a GeoTIFF or Zarr stack per variable and resampled onto the
+    study area's grid - as (x, y) rasters in `cells[x][y]` order, where
+    transition rate modifiers can use them.
+
+    Model step `t` reads timestep `t - 1` of each stack. Reading and
+    resampling happen on a background thread, which starts on the next
+    timestep as soon as one is handed over, so a step only waits on a read if
+    it takes longer than the step itself.
+    """
+
+    def __init__(
+        self,
+        paths,
+        transform,
+        width,
+        height,
+        crs,
+        resampling="bilinear",
+        prefetch=True,
+    ):
+        if resampling not in Resampling.__members__:
+            raise ValueError(
+                f"Invalid resampling {resampling!r} - expected any of {list(Resampling.__members__)}"
+            )
+        self.paths = dict(paths)
+        self.transform = transform
+        self.width, self.height = width, height
+        self.crs = CRS.from_user_input(crs)
+        self.resampling = Resampling[resampling]
+        self.prefetch = prefetch
+
+        self._stacks = {
+            variable: _open_driver_stack(path) for variable, path in self.paths.items()
+        }
+        self.n_timesteps = min(
+            (stack.n_timesteps for stack in self._stacks.values()), default=0
+        )
+
+        # A single reader thread, so the stacks' datasets are only ever read
+        # from one thread
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="climate-drivers"
+        )
+        self._pending = {}
+        self.n_prefetch_hits = 0
+        self.n_prefetch_misses = 0
+
+    @classmethod
+    def for_raster_layer(cls, paths, raster_layer, **kwargs):
+        """A stack aligned to a study area's raster layer."""
+        return cls(
+            paths,
+            transform=raster_layer.transform,
+            width=raster_layer.width,
+            height=raster_layer.height,
+            crs=raster_layer.crs,
+            **kwargs,
+        )
+
+    @property
+    def variables(self):
+        return list(self._stacks)
+
+    def _read_timestep(self, timestep_idx):
+        rasters = {}
+        for variable, stack in self._stacks.items():
+            aligned = np.full((self.height, self.width), np.nan, dtype=np.float64)
+            reproject(
+                source=stack.read(timestep_idx).astype(np.float64),
+                destination=aligned,
+                src_transform=stack.transform,
+                src_crs=stack.crs,
+                src_nodata=stack.nodata,
+                dst_transform=self.transform,
+                dst_crs=self.crs,
+                dst_nodata=np.nan,
+                resampling=self.resampling,
+            )
+            # Rows run north to south - cells are stored as cells[x][y], with
+            # y measured up from the bottom
+            rasters[variable] = np.ascontiguousarray(aligned[::-1].T)
+        return rasters
+
+    def _submit(self, timestep_idx):
+        if timestep_idx < self.n_timesteps and timestep_idx not in self._pending:
+            self._pending[timestep_idx] = self._executor.submit(
+                self._read_timestep, timestep_idx
+            )
+
+    def get_rasters(self, step):
+        """(x, y) rasters of each variable for model step `step` (from 1)."""
+        timestep_idx = step - 1
+        if not 0 <= timestep_idx < self.n_timesteps:
+            raise ValueError(
+                f"Climate drivers cover steps 1 to {self.n_timesteps}, got step {step}"
+            )
+
+        future = self._pending.pop(timestep_idx, None)
+        if future is not None and future.done():
+            self.n_prefetch_hits += 1
+        else:
+            self.n_prefetch_misses += 1
+        if future is None:
+            future = self._executor.submit(self._read_timestep, timestep_idx)
+        # Timesteps prefetched but skipped over won't be asked for again
+        for stale_idx in [idx for idx in self._pending if idx < timestep_idx]:
+            self._pending.pop(stale_idx).cancel()
+
+        if self.prefetch:
+            self._submit(timestep_idx + 1)
+        return future.result()
+
+    def update_transition_rates(self, transition_rates, step, profiler):
+        """
+        Hand step `step`'s rasters to `transition_rates`, counting any reads
+        the step had to wait on as `n_climate_prefetch_misses` on `profiler`.
+        """
+        n_misses = self.n_prefetch_misses
+        transition_rates.update_climate(self.get_rasters(step))
+        profiler.increment(
+            "n_climate_prefetch_misses", self.n_prefetch_misses - n_misses
+        )
+
+    def close(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        self._executor.shutdown(wait=True)
+        for stack in self._stacks.values():
+            stack.close()
@@ -7,6 +7,7 @@ import hashlib
 import logging
 
 from vegetation.config.global_paths import LOCAL_STAC_CACHE_FSTRING
+from vegetation.space.cell_agent_index import CellAgentIndex
 from vegetation.space.veg_cell import VegCell
 
 
@@ -24,6 +25,10 @@ class StudyArea(mg.GeoSpace):
         self.bounds_md5 = hashlib.md5(str(bounds).encode()).hexdigest()
         self.local_stac_cache_fstring = LOCAL_STAC_CACHE_FSTRING
 
+        # Which Joshua Tree agents are in which raster cell - created once the
+        # elevation raster (and so the grid shape) is known
+        self.cell_agent_index = None
+
     @property
     def _cache_paths(self) -> dict:
         cache_dict = {
@@ -57,6 +62,9 @@ class StudyArea(mg.GeoSpace):
             raise ValueError("No local cache found for elevation data")
 
         super().add_layer(elevation_layer)
+        self.cell_agent_index = CellAgentIndex(
+            width=elevation_layer.width, height=elevation_layer.height
+        )
 
     def get_refugia_status(self):
         elevation_array = self.raster_layer.get_raster("elevation")
@@ -80,6 +88,21 @@ class StudyArea(mg.GeoSpace):
         else:
             self.layers.append(value)
 
+    def get_max_life_stage_raster(self) -> np.ndarray:
+        """Return `jotr_max_life_stage` as a (height, width) array, -1 where empty."""
+        raster_layer = self.raster_layer
+        max_life_stages = np.fromiter(
+            (
+                -1 if cell.jotr_max_life_stage is None else cell.jotr_max_life_stage
+                for cell in raster_layer
+            ),
+            dtype=np.int8,
+            count=raster_layer.width * raster_layer.height,
+        )
+
+        # Cells are stored as cells[x][y], with y measured up from the bottom
+        return max_life_stages.reshape(raster_layer.width, raster_layer.height).T[::-1]
+
     def is_at_boundary(self, row_idx, col_idx):
         return (
             row_idx == 0
@@ -3,8 +3,6 @@ from __future__ import annotations
 import mesa
 import mesa_geo as mg
 
-from vegetation.config.life_stages import LifeStage
-
 
 class VegCell(mg.Cell):
     elevation: int | None
@@ -20,16 +18,8 @@ class VegCell(mg.Cell):
         super().__init__(model, pos, indices)
         self.elevation = None
 
-        # TODO: Improve patch level tracking of JOTR agents
-        # Issue URL: https://github.com/SchmidtDSE/mesa_abm_poc/issues/1
-        # For now, this is somewhat of a hack to track which agents are present within a patch cell
-        # This is something I suspect is an offshoot of my question posed to the mesa-geo team
-        # (https://github.com/projectmesa/mesa-geo/issues/267), where the cell does not have a geometry
-        # and thus I can't use the various geometry based intersection methods to find agents. My guess
-        # is that this will either not work or be very slow, but itll get us started
-        self.jotr_agents = []
         self.occupied_by_jotr_agents = False
-        self.jotr_max_life_stage = 0
+        self.jotr_max_life_stage = None
 
         # DEBUG: Test attribute to see how this interacts with Zarr groups / datasets
         self.test_attribute = 1
@@ -37,20 +27,22 @@ class VegCell(mg.Cell):
     def step(self):
         self.update_occupancy()
 
+    @property
+    def jotr_agents(self):
+        # Live (not dead) Joshua Tree agents within this cell, from the study
+        # area's cell -> agent index
+        return self.model.space.cell_agent_index.agents_in_cell(self.pos)
+
     def update_occupancy(self):
-        # Very clunky way to exclude dead agents
-        alive_patch_life_stages = [
-            agent.life_stage
-            for agent in self.jotr_agents
-            if agent.life_stage != LifeStage.DEAD
+        # Dead agents are dropped from the index, but agents still being set up
+        # may not have a life stage yet
+        cell_agents = self.model.space.cell_agent_index.agents_in_cell(self.pos)
+        patch_life_stages = [
+            agent.life_stage for agent in cell_agents if agent.life_stage
         ]
-        if alive_patch_life_stages:
-            self.jotr_max_life_stage = max(alive_patch_life_stages)
-            self.occupied_by_jotr_agents = True
-        else:
-            self.jotr_max_life_stage = None
-            self.occupied_by_jotr_agents = False
-
-    def add_agent_link(self, jotr_agent):
-        if jotr_agent.life_stage and jotr_agent not in self.jotr_agents:
-            self.jotr_agents.append(jotr_agent)
+        jotr_max_life_stage = max(patch_life_stages) if patch_life_stages else None
+        if jotr_max_life_stage != self.jotr_max_life_stage:
+            self.model.step_profiler.increment("n_cells_dirtied")
+
+        self.jotr_max_life_stage = jotr_max_life_stage
+        self.occupied_by_jotr_agents = bool(patch_life_stages)
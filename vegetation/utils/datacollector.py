@@ -0,0 +1,157 @@
+from operator import attrgetter
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Rows preallocated when the number of collections isn't known up front
+DEFAULT_N_ROWS = 128
+
+
+def _get_column_dtype(value) -> np.dtype:
+    if isinstance(value, (bool, np.bool_)):
+        return np.dtype(bool)
+    if isinstance(value, (int, np.integer)):
+        return np.dtype(np.int64)
+    if isinstance(value, (float, np.floating)):
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+
+def _can_store(column: np.ndarray, value) -> bool:
+    if column.dtype == object:
+        return True
+    value_dtype = _get_column_dtype(value)
+    return value_dtype == column.dtype or (
+        column.dtype == np.float64 and value_dtype == np.int64
+    )
+
+
+class ColumnarDataCollector:
+    """
+    Collects model reporters into preallocated NumPy columns, one row per
+    `collect` call, as a lighter stand-in for `mesa.DataCollector` (only model
+    reporters are supported).
+
+    Reporters are attribute names or callables taking the model, as in mesa.
+    Each column's dtype is taken from the first value collected (int, float,
+    bool, otherwise object) and widened if a later value doesn't fit. Columns
+    start with `n_rows` rows (e.g. the number of steps) and double if a run
+    collects more.
+
+    Constant columns such as run parameters are not stored per row - pass
+    them to `get_dataframe` / `get_arrow_table` and they are broadcast there.
+    """
+
+    def __init__(
+        self,
+        model_reporters: Mapping[str, Union[str, Callable[[Any], Any]]],
+        n_rows: int = DEFAULT_N_ROWS,
+    ):
+        self.model_reporters = dict(model_reporters)
+        self._getters = [
+            (name, attrgetter(reporter) if isinstance(reporter, str) else reporter)
+            for name, reporter in self.model_reporters.items()
+        ]
+
+        self._capacity = max(int(n_rows), 1)
+        self._n_rows = 0
+        self._steps = np.empty(self._capacity, dtype=np.int64)
+        # Allocated on the first collect, once the value types are known
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def _grow(self):
+        self._capacity *= 2
+        self._steps = np.resize(self._steps, self._capacity)
+        for name, column in self._columns.items():
+            self._columns[name] = np.resize(column, self._capacity)
+
+    def collect(self, model) -> None:
+        row = self._n_rows
+        values = [(name, getter(model)) for name, getter in self._getters]
+
+        if self._columns is None:
+            self._columns = {
+                name: np.empty(self._capacity, dtype=_get_column_dtype(value))
+                for name, value in values
+            }
+        elif row == self._capacity:
+            self._grow()
+
+        columns = self._columns
+        for name, value in values:
+            column = columns[name]
+            if not _can_store(column, value):
+                widened_dtype = (
+                    np.float64
+                    if column.dtype == np.int64
+                    and _get_column_dtype(value) == np.float64
+                    else object
+                )
+                column = columns[name] = column.astype(widened_dtype)
+            column[row] = value
+
+        self._steps[row] = model.steps
+        self._n_rows += 1
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the preallocated columns (object columns count pointers only)."""
+        return self._steps.nbytes + sum(
+            column.nbytes for column in (self._columns or {}).values()
+        )
+
+    @property
+    def steps(self) -> np.ndarray:
+        return self._steps[: self._n_rows]
+
+    @property
+    def model_vars(self) -> Dict[str, np.ndarray]:
+        """Reporter name -> collected values so far (views, not copies)."""
+        if self._columns is None:
+            return {name: np.empty(0) for name in self.model_reporters}
+        return {name: column[: self._n_rows] for name, column in self._columns.items()}
+
+    def get_model_vars_dataframe(self) -> pd.DataFrame:
+        """One row per collection, matching `mesa.DataCollector`'s output."""
+        return pd.DataFrame(self.model_vars)
+
+    def get_dataframe(
+        self,
+        rows: Optional[Sequence[int]] = None,
+        constant_columns: Optional[Mapping[str, Any]] = None,
+    ) -> pd.DataFrame:
+        """
+        Collected rows (all by default) with a `Step` column, preceded by any
+        `constant_columns` broadcast to every row.
+        """
+        rows = slice(None) if rows is None else np.asarray(rows, dtype=np.int64)
+        steps = self.steps[rows]
+
+        data = {
+            name: np.full(len(steps), value)
+            for name, value in (constant_columns or {}).items()
+        }
+        data["Step"] = steps
+        for name, values in self.model_vars.items():
+            data[name] = values[rows]
+
+        return pd.DataFrame(data)
+
+    def get_arrow_table(
+        self,
+        rows: Optional[Sequence[int]] = None,
+        constant_columns: Optional[Mapping[str, Any]] = None,
+    ):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Getting an Arrow table requires `pyarrow`") from e
+
+        return pa.Table.from_pandas(
+            self.get_dataframe(rows=rows, constant_columns=constant_columns),
+            preserve_index=False,
+        )
@@ -0,0 +1,62 @@
+import numpy as np
+from scipy.ndimage import convolve
+from scipy.signal import fftconvolve
+
+DISPERSAL_MODES = ("auto", "points", "raster")
+
+# Largest kernel (in cells) convolved directly rather than by FFT - direct
+# convolution's cost grows with the kernel, while FFT's barely does
+DIRECT_CONVOLUTION_MAX_KERNEL_SIZE = 49
+
+
+def get_dispersal_kernel(max_distance, cell_size, n_samples=32) -> np.ndarray:
+    """
+    Probability of a seed landing at each cell offset from its parent's cell,
+    for seeds dispersed as `generate_points_in_utm` does (a uniform angle and a
+    uniform distance up to `max_distance`) by a parent anywhere in its cell.
+
+    `cell_size` is the (width, height) of a cell in the units of
+    `max_distance`. The kernel is (2 * radius + 1) cells square, centred on the
+    parent's cell, in `cells[x][y]` order (y up). It is integrated with
+    `n_samples` midpoints along each of the parent's x and y, the angle and
+    the distance.
+    """
+    cell_width, cell_height = cell_size
+    midpoints = (np.arange(n_samples) + 0.5) / n_samples
+    parent_xs, parent_ys, angles, distances = np.broadcast_arrays(
+        *np.meshgrid(
+            midpoints,
+            midpoints,
+            2 * np.pi * midpoints,
+            max_distance * midpoints,
+            indexing="ij",
+            sparse=True,
+        )
+    )
+
+    dxs = np.floor(parent_xs + distances * np.cos(angles) / cell_width).astype(int)
+    dys = np.floor(parent_ys + distances * np.sin(angles) / cell_height).astype(int)
+    radius = max(np.abs(dxs).max(), np.abs(dys).max())
+    size = 2 * radius + 1
+
+    counts = np.bincount(
+        ((dxs + radius) * size + dys + radius).ravel(), minlength=size * size
+    )
+    return counts.reshape(size, size) / counts.sum()
+
+
+def get_expected_arrivals(fecundity: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Expected seeds arriving in each cell of (replicate, x, y) rasters of seeds
+    produced per cell, convolving each replicate with a dispersal kernel -
+    directly for small kernels, by FFT for larger ones. Seeds dispersed beyond
+    the raster are lost.
+    """
+    fecundity = fecundity.astype(np.float64)
+    if kernel.size <= DIRECT_CONVOLUTION_MAX_KERNEL_SIZE:
+        return convolve(fecundity, kernel[np.newaxis], mode="constant")
+
+    arrivals = fftconvolve(fecundity, kernel[np.newaxis], mode="same", axes=(1, 2))
+    # FFT round-off leaves tiny non-zero values around every cell
+    arrivals[arrivals < 1e-12] = 0
+    return arrivals
@@ -0,0 +1,168 @@
+import gc
+import logging
+import os
+import resource
+import sys
+import tracemalloc
+from typing import Dict, Optional
+
+MEMORY_TRACKING_MODES = ("rss", "tracemalloc")
+BUDGET_ACTIONS = ("compact", "raise")
+
+# Model reporters added to the datacollector when memory tracking is enabled,
+# reporter name -> key of `MemoryTracker.last_sample`
+MEMORY_REPORTERS = {
+    "Memory Total (MB)": "total_mb",
+    "Memory Agents (MB)": "agents_mb",
+    "Memory Cells (MB)": "cells_mb",
+    "Memory Cell Index (MB)": "cell_agent_index_mb",
+    "Memory Datacollector (MB)": "datacollector_mb",
+    "Memory Zarr Buffers (MB)": "zarr_buffers_mb",
+    "N Dead Agents": "n_dead_agents",
+}
+
+BYTES_PER_MB = 1024**2
+
+
+class MemoryBudgetExceededError(RuntimeError):
+    pass
+
+
+def get_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS if current isn't available)."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _get_object_bytes(obj) -> int:
+    """Shallow size of an object plus its attribute dict and their values."""
+    attributes = getattr(obj, "__dict__", {})
+    return (
+        sys.getsizeof(obj)
+        + sys.getsizeof(attributes)
+        + sum(sys.getsizeof(value) for value in attributes.values())
+    )
+
+
+class MemoryTracker:
+    """
+    Samples the model's memory footprint once per step, with estimates of how
+    much of it is agents, cells, the cell -> agent index, the datacollector
+    and in-memory Zarr buffers.
+
+    The total is the process RSS (`mode="rss"`), or the bytes currently
+    allocated by Python (`mode="tracemalloc"`, which is more precise but slows
+    the model down noticeably). Agent and cell sizes are estimated from the
+    shallow size of one sampled agent / cell, so they track counts rather than
+    every byte.
+
+    If `budget_mb` is set and the total goes over it, the tracker either asks
+    the model to compact itself by dropping dead agents, or raises
+    `MemoryBudgetExceededError` with the breakdown straight away
+    (`budget_action="raise"`). Freed memory is reused by Python rather than
+    returned to the OS, so RSS rarely shrinks after compacting - compaction
+    counts as enough while it frees agents, and the run fails once it is over
+    budget with nothing left to drop.
+    """
+
+    def __init__(
+        self,
+        mode: str = "rss",
+        budget_mb: Optional[float] = None,
+        budget_action: str = "compact",
+    ):
+        if mode not in MEMORY_TRACKING_MODES:
+            raise ValueError(
+                f"Unknown memory tracking mode '{mode}' - expected one of {MEMORY_TRACKING_MODES}"
+            )
+        if budget_action not in BUDGET_ACTIONS:
+            raise ValueError(
+                f"Unknown budget action '{budget_action}' - expected one of {BUDGET_ACTIONS}"
+            )
+
+        self.mode = mode
+        self.budget_mb = budget_mb
+        self.budget_action = budget_action
+        self.last_sample: Dict[str, float] = {}
+
+        self._agent_bytes = None
+        self._cell_bytes = None
+
+        if mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _get_total_bytes(self) -> int:
+        if self.mode == "tracemalloc":
+            current_bytes, __peak_bytes = tracemalloc.get_traced_memory()
+            return current_bytes
+        return get_rss_bytes()
+
+    def sample(self, model, agent_cls) -> Dict[str, float]:
+        jotr_agents = model.agents_by_type.get(agent_cls, ())
+        n_agents = len(jotr_agents)
+        if self._agent_bytes is None and n_agents:
+            agent = next(iter(jotr_agents))
+            self._agent_bytes = _get_object_bytes(agent) + sys.getsizeof(agent.geometry)
+
+        raster_layer = model.space.raster_layer
+        n_cells = raster_layer.width * raster_layer.height
+        if self._cell_bytes is None:
+            self._cell_bytes = _get_object_bytes(raster_layer.cells[0][0])
+
+        # Not `model.zarr_manager`, which would create one
+        zarr_manager = model._zarr_manager
+        self.last_sample = {
+            "total_mb": self._get_total_bytes() / BYTES_PER_MB,
+            "agents_mb": n_agents * (self._agent_bytes or 0) / BYTES_PER_MB,
+            "cells_mb": n_cells * self._cell_bytes / BYTES_PER_MB,
+            "cell_agent_index_mb": model.space.cell_agent_index.nbytes / BYTES_PER_MB,
+            "datacollector_mb": model.datacollector.nbytes / BYTES_PER_MB,
+            "zarr_buffers_mb": (zarr_manager.nbytes if zarr_manager is not None else 0)
+            / BYTES_PER_MB,
+            "n_dead_agents": model.n_dead,
+        }
+        return self.last_sample
+
+    def format_report(self) -> str:
+        return "\n".join(
+            (
+                f"  {reporter}: {self.last_sample[key]:.1f}"
+                if key.endswith("_mb")
+                else f"  {reporter}: {self.last_sample[key]}"
+            )
+            for reporter, key in MEMORY_REPORTERS.items()
+        )
+
+    def check_budget(self, model, agent_cls) -> None:
+        """Sample, and compact or fail if the footprint is over budget."""
+        sample = self.sample(model, agent_cls)
+        if self.budget_mb is None or sample["total_mb"] <= self.budget_mb:
+            return
+
+        if self.budget_action == "compact":
+            n_removed = model.remove_dead_agents()
+            gc.collect()
+            sample = self.sample(model, agent_cls)
+            logging.info(
+                f"Memory over budget ({self.budget_mb} MB) at step {model.steps} - "
+                f"removed {n_removed} dead agents, now {sample['total_mb']:.1f} MB"
+            )
+            if n_removed or sample["total_mb"] <= self.budget_mb:
+                return
+
+        raise MemoryBudgetExceededError(
+            f"Memory use of {sample['total_mb']:.1f} MB at step {model.steps} is "
+            f"over the {self.budget_mb} MB budget:\n{self.format_report()}"
+        )
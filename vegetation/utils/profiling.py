@@ -0,0 +1,75 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+import pandas as pd
+
+# Prefix of the phase timing columns in `StepProfiler.get_dataframe`
+PHASE_TIME_PREFIX = "time_"
+
+
+class StepProfiler:
+    """
+    Wall-clock time spent in named phases of each model step, alongside
+    per-step event counters (agents stepped, deaths, ...).
+
+    Phases may be nested (e.g. dispersal happens while agents are stepped), in
+    which case the outer phase's time includes the inner one. Timings and
+    counters accumulate until `end_step` closes the step's record.
+    """
+
+    def __init__(self):
+        self._records = []
+        self._timings = defaultdict(float)
+        self._counters = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._timings[name] += perf_counter() - start
+
+    def increment(self, name: str, n: int = 1) -> None:
+        self._counters[name] += n
+
+    def get_counters(self) -> dict:
+        """Counters of the step so far."""
+        return dict(self._counters)
+
+    def end_step(self, step: int) -> None:
+        record = {"Step": step}
+        record.update(
+            (f"{PHASE_TIME_PREFIX}{name}", seconds)
+            for name, seconds in self._timings.items()
+        )
+        record.update(self._counters)
+        self._records.append(record)
+
+        self._timings = defaultdict(float)
+        self._counters = defaultdict(int)
+
+    def get_dataframe(self) -> pd.DataFrame:
+        """One row per step, with phase timings (seconds) and counters."""
+        df = pd.DataFrame(self._records)
+        counter_columns = [
+            column
+            for column in df.columns
+            if column != "Step" and not column.startswith(PHASE_TIME_PREFIX)
+        ]
+        # Phases and counters that didn't happen in a step are absent from its
+        # record - a counter that never incremented is a zero, not missing
+        df[counter_columns] = df[counter_columns].fillna(0).astype(int)
+        return df
+
+    def get_summary(self) -> pd.DataFrame:
+        """Total and mean per-step time of each phase, slowest first."""
+        df = self.get_dataframe()
+        timings = df[[c for c in df.columns if c.startswith(PHASE_TIME_PREFIX)]]
+        timings.columns = [c[len(PHASE_TIME_PREFIX) :] for c in timings.columns]
+        return (
+            pd.DataFrame({"total": timings.sum(), "mean": timings.mean()})
+            .sort_values("total", ascending=False)
+            .rename_axis("phase")
+        )
@@ -1,13 +1,15 @@
+import shapely
 import shapely.geometry as sg
 from pyproj import Transformer, CRS
 import numpy as np
 import random
+from functools import lru_cache
 
 
-def transform_point_wgs84_utm(lon: float, lat: float, utm_zone: int = None) -> tuple:
-    """Transform single point between WGS84 and UTM"""
-    if utm_zone is None:
-        utm_zone = int((lon + 180) / 6) + 1
+@lru_cache(maxsize=None)
+def _get_utm_transformers(utm_zone: int) -> tuple:
+    # Building a Transformer is far more expensive than using one, and every
+    # tree in the study area shares the same UTM zone
     utm_crs = f"+proj=utm +zone={utm_zone} +datum=WGS84 +units=m +no_defs"
 
     wgs84_to_utm = Transformer.from_crs("EPSG:4326", utm_crs, always_xy=True)
@@ -16,6 +18,29 @@ def transform_point_wgs84_utm(lon: float, lat: float, utm_zone: int = None) -> t
     return wgs84_to_utm, utm_to_wgs84
 
 
+def transform_point_wgs84_utm(lon: float, lat: float, utm_zone: int = None) -> tuple:
+    """Transform single point between WGS84 and UTM"""
+    if utm_zone is None:
+        utm_zone = int((lon + 180) / 6) + 1
+    return _get_utm_transformers(utm_zone)
+
+
+def coords_to_raster_pos(transform, height: int, xs, ys) -> tuple:
+    """
+    Convert coordinates (in the raster's CRS) to raster cell pos (x, y) in bulk,
+    with x the column and y counted up from the bottom row (mesa-geo's
+    `cells[x][y]` convention). Accepts scalars or arrays.
+    """
+    cols, rows = ~transform * (
+        np.asarray(xs, dtype=np.float64),
+        np.asarray(ys, dtype=np.float64),
+    )
+    return (
+        np.floor(cols).astype(np.int64),
+        height - 1 - np.floor(rows).astype(np.int64),
+    )
+
+
 def generate_point_in_utm(x_utm: float, y_utm: float, max_distance: float) -> tuple:
     """Generate random point within distance of UTM coordinates"""
     angle = random.uniform(0, 2 * np.pi)
@@ -25,3 +50,103 @@ def generate_point_in_utm(x_utm: float, y_utm: float, max_distance: float) -> tu
     new_y = y_utm + distance * np.sin(angle)
 
     return new_x, new_y
+
+
+def generate_points_in_utm(
+    x_utm: float, y_utm: float, max_distance: float, n_points: int, rng=None
+) -> tuple:
+    """
+    Generate `n_points` random points within distance of UTM coordinates, as
+    arrays - the coordinates may also be arrays of one origin per point
+    """
+    rng = np.random if rng is None else rng
+    angles = rng.uniform(0, 2 * np.pi, n_points)
+    distances = rng.uniform(0, max_distance, n_points)
+
+    return x_utm + distances * np.cos(angles), y_utm + distances * np.sin(angles)
+
+
+PLANTING_LAYOUTS = ("random", "stratified", "grid")
+
+
+def _sample_uniform_in_polygon(polygon, n_points: int, rng) -> tuple:
+    """Rejection sample points uniformly within a polygon, in vectorized batches"""
+    if n_points <= 0:
+        return np.empty(0), np.empty(0)
+
+    minx, miny, maxx, maxy = polygon.bounds
+    acceptance_rate = max(polygon.area / ((maxx - minx) * (maxy - miny)), 1e-3)
+
+    xs, ys = [], []
+    n_accepted = 0
+    while n_accepted < n_points:
+        # Oversample by the expected rejection rate, so this is usually one batch
+        batch_size = int((n_points - n_accepted) / acceptance_rate * 1.1) + 16
+        candidate_xs = rng.uniform(minx, maxx, batch_size)
+        candidate_ys = rng.uniform(miny, maxy, batch_size)
+        inside = shapely.contains_xy(polygon, candidate_xs, candidate_ys)
+
+        xs.append(candidate_xs[inside])
+        ys.append(candidate_ys[inside])
+        n_accepted += int(inside.sum())
+
+    return np.concatenate(xs)[:n_points], np.concatenate(ys)[:n_points]
+
+
+def _get_lattice(polygon, spacing: float, rng) -> tuple:
+    """Cell origins of a randomly offset square lattice covering the polygon"""
+    minx, miny, maxx, maxy = polygon.bounds
+    offset_x, offset_y = rng.uniform(0, spacing, 2)
+    lattice_xs, lattice_ys = np.meshgrid(
+        np.arange(minx - offset_x, maxx, spacing),
+        np.arange(miny - offset_y, maxy, spacing),
+    )
+    return lattice_xs.ravel(), lattice_ys.ravel()
+
+
+def sample_points_in_polygon(
+    polygon, n_points: int, layout: str = "random", rng=None
+) -> tuple:
+    """
+    Sample planting points within a (projected) polygon, returned as x and y
+    arrays in the polygon's CRS.
+
+    - "random": `n_points` points uniformly at random
+    - "stratified": one jittered point per cell of a square lattice sized so
+      that each cell covers `area / n_points`, trimmed or topped up at random
+      to exactly `n_points`
+    - "grid": points at the centers of that lattice (a regular planting
+      pattern), so approximately rather than exactly `n_points`
+    """
+    if layout not in PLANTING_LAYOUTS:
+        raise ValueError(
+            f"Unknown planting layout '{layout}' - expected one of {PLANTING_LAYOUTS}"
+        )
+
+    rng = np.random if rng is None else rng
+    if n_points <= 0:
+        return np.empty(0), np.empty(0)
+
+    shapely.prepare(polygon)
+    if layout == "random":
+        return _sample_uniform_in_polygon(polygon, n_points, rng)
+
+    spacing = np.sqrt(polygon.area / n_points)
+    lattice_xs, lattice_ys = _get_lattice(polygon, spacing, rng)
+
+    if layout == "grid":
+        xs, ys = lattice_xs + spacing / 2, lattice_ys + spacing / 2
+        inside = shapely.contains_xy(polygon, xs, ys)
+        return xs[inside], ys[inside]
+
+    xs = lattice_xs + rng.uniform(0, spacing, lattice_xs.size)
+    ys = lattice_ys + rng.uniform(0, spacing, lattice_ys.size)
+    inside = shapely.contains_xy(polygon, xs, ys)
+    xs, ys = xs[inside], ys[inside]
+
+    if xs.size > n_points:
+        keep = rng.choice(xs.size, n_points, replace=False)
+        return xs[keep], ys[keep]
+
+    extra_xs, extra_ys = _sample_uniform_in_polygon(polygon, n_points - xs.size, rng)
+    return np.concatenate([xs, extra_xs]), np.concatenate([ys, extra_ys])
@@ -34,6 +34,22 @@ def get_array_from_nested_cell_list(
     return veg_arrays
 
 
+def get_encoding_levels(attribute_encoding):
+    """Return the level names and encoded values of an attribute, sorted by value.
+
+    Encodings are either stored as name -> value (e.g. `{"SEED": 1}`) or as
+    value -> description (e.g. `{"1": "Seed"}`), so both layouts are accepted.
+    """
+    try:
+        levels = {name: int(value) for name, value in attribute_encoding.items()}
+    except (TypeError, ValueError):
+        levels = {name: int(value) for value, name in attribute_encoding.items()}
+
+    level_names = sorted(levels, key=levels.get)
+    level_values = np.array([levels[name] for name in level_names])
+    return level_names, level_values
+
+
 class ZarrManager:
     def __init__(
         self,
@@ -64,6 +80,15 @@ class ZarrManager:
         self._group_name = None
         self._replicate_idx = None
 
+        # Replicates written together from `replicate_idx` on - more than one
+        # when a lockstep run simulates several replicates at once, in which
+        # case timestep arrays carry a leading replicate axis
+        self.n_replicates = 1
+
+        # Running per-cell summaries of the current replicate, keyed by attribute
+        # name, so the standard analysis products don't need the full cube
+        self._replicate_summaries = {}
+
         self._initialize_zarr_store(filename, type=zarr_store_type)
         self._initialize_synchronizer(filename)
         self._initialize_zarr_root_group()
@@ -120,6 +145,10 @@ class ZarrManager:
             store=self._zarr_store, synchronizer=self._synchronizer, path="/"
         )
 
+    @property
+    def group_name(self):
+        return self._group_name
+
     def set_group_name(self, group_name: str):
         self._group_name = group_name
 
@@ -170,7 +199,15 @@ class ZarrManager:
             "attribute_encoding"
         ] = attribute_encoding
 
-    def resize_array_for_next_replicate(self) -> int:
+    @property
+    def _replicate_slice(self) -> slice:
+        return slice(self.replicate_idx, self.replicate_idx + self.n_replicates)
+
+    def resize_array_for_next_replicate(self, n_replicates: int = 1) -> int:
+        """
+        Reserve space for the next `n_replicates` replicates and return the
+        index of the first of them.
+        """
         all_next_replicate_idx = []
 
         for attribute_name in self.attribute_list:
@@ -185,7 +222,7 @@ class ZarrManager:
             all_next_replicate_idx.append(next_replicate_idx)
 
             attribute_dataset.resize(
-                next_replicate_idx + 1,  # +1 for the next replicate
+                next_replicate_idx + n_replicates,
                 attribute_dataset.shape[1],
                 attribute_dataset.shape[2],
                 attribute_dataset.shape[3],
@@ -197,9 +234,154 @@ class ZarrManager:
         replicate_idx = np.unique(all_next_replicate_idx)
         assert len(replicate_idx) == 1
         self.replicate_idx = int(replicate_idx[0])
+        self.n_replicates = n_replicates
+
+        self._resize_summary_datasets_for_replicate(
+            self.replicate_idx + n_replicates - 1
+        )
 
         return self.replicate_idx
 
+    def _get_or_create_summary_datasets(
+        self, attribute_name: str
+    ) -> Dict[str, zarr.core.Array]:
+        attribute_encoding = self.attribute_encodings[attribute_name]
+        level_names, level_values = get_encoding_levels(attribute_encoding["encoding"])
+        level_dim = f"{attribute_name}_level"
+
+        summary_specs = {
+            "first_arrival": (
+                (0, len(level_values), self.width, self.height),
+                ["replicate_id", level_dim, "x", "y"],
+                np.int16,
+                -1,
+            ),
+            "occupancy_time": (
+                (0, self.width, self.height),
+                ["replicate_id", "x", "y"],
+                np.int16,
+                0,
+            ),
+            "n_replicates_reached": (
+                (len(level_values), self.width, self.height),
+                [level_dim, "x", "y"],
+                np.int32,
+                0,
+            ),
+        }
+
+        sim_group = self._get_or_create_sim_group()
+        summary_datasets = {}
+        for summary_name, (shape, dims, dtype, fill_value) in summary_specs.items():
+            dataset_name = f"{attribute_name}_{summary_name}"
+            if dataset_name not in sim_group:
+                sim_group.create_dataset(
+                    dataset_name,
+                    shape=shape,
+                    chunks=(1, *shape[1:]) if shape[0] == 0 else shape,
+                    dtype=dtype,
+                    fill_value=fill_value,
+                )
+                sim_group[dataset_name].attrs["_ARRAY_DIMENSIONS"] = dims
+                sim_group[dataset_name].attrs["level_names"] = level_names
+                sim_group[dataset_name].attrs["level_values"] = level_values.tolist()
+            summary_datasets[summary_name] = sim_group[dataset_name]
+
+        return summary_datasets
+
+    def _has_encoding(self, attribute_name: str) -> bool:
+        attribute_encoding = (self.attribute_encodings or {}).get(attribute_name, {})
+        return attribute_encoding.get("encoding") is not None
+
+    def _resize_summary_datasets_for_replicate(self, replicate_idx: int) -> None:
+        for attribute_name in self.attribute_list:
+            if not self._has_encoding(attribute_name):
+                continue
+
+            summary_datasets = self._get_or_create_summary_datasets(attribute_name)
+            for summary_name in ["first_arrival", "occupancy_time"]:
+                summary_dataset = summary_datasets[summary_name]
+                if summary_dataset.shape[0] <= replicate_idx:
+                    summary_dataset.resize(
+                        replicate_idx + 1, *summary_dataset.shape[1:]
+                    )
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the per-replicate summary arrays held in memory until cleanup."""
+        return sum(
+            array.nbytes
+            for summary in self._replicate_summaries.values()
+            for array in summary.values()
+        )
+
+    def _update_replicate_summaries(
+        self, attribute_name: str, timestep_idx: int, timestep_array: np.ndarray
+    ) -> None:
+        if attribute_name not in self._replicate_summaries:
+            _, level_values = get_encoding_levels(
+                self.attribute_encodings[attribute_name]["encoding"]
+            )
+            self._replicate_summaries[attribute_name] = {
+                "level_values": level_values,
+                "first_arrival": np.full(
+                    (self.n_replicates, len(level_values), self.width, self.height),
+                    -1,
+                    dtype=np.int16,
+                ),
+                "occupancy_time": np.zeros(
+                    (self.n_replicates, self.width, self.height), dtype=np.int16
+                ),
+            }
+
+        summary = self._replicate_summaries[attribute_name]
+        level_values = summary["level_values"]
+        first_arrival = summary["first_arrival"]
+
+        # Levels are compared with the values written, so the encoding has to
+        # be in those values - `LifeStage` values for jotr_max_life_stage
+        unencoded = ~np.isin(timestep_array, level_values)
+        if unencoded.any():
+            raise ValueError(
+                f"{attribute_name} has values {np.unique(timestep_array[unencoded]).tolist()} missing from its encoding {level_values.tolist()} - summaries assume the encoding uses the values written"
+            )
+
+        # (replicate, level, x, y)
+        reached = timestep_array[:, np.newaxis] >= level_values[:, None, None]
+        first_arrival[reached & (first_arrival < 0)] = timestep_idx
+
+        # The lowest encoding level is the 'absent' state (e.g. no JOTR in cell)
+        summary["occupancy_time"] += timestep_array > level_values[0]
+
+    def write_replicate_summaries(self) -> None:
+        """Write this replicate's first-arrival timestep and occupancy time per cell,
+        and add it to the running count of replicates reaching each encoding level.
+        """
+        for attribute_name, summary in self._replicate_summaries.items():
+            summary_datasets = self._get_or_create_summary_datasets(attribute_name)
+
+            summary_datasets["first_arrival"][self._replicate_slice] = summary[
+                "first_arrival"
+            ]
+            summary_datasets["occupancy_time"][self._replicate_slice] = summary[
+                "occupancy_time"
+            ]
+
+            # Replicates may finish concurrently in other processes, so the
+            # read-modify-write of the running count needs an inter-process lock
+            lock_key = f"{self._group_name}/{attribute_name}_n_replicates_reached.lock"
+            with self._synchronizer[lock_key]:
+                n_replicates_reached = summary_datasets["n_replicates_reached"]
+                n_replicates_reached[:] = n_replicates_reached[:] + (
+                    summary["first_arrival"] >= 0
+                ).sum(axis=0)
+                n_replicates_reached.attrs["n_replicates"] = (
+                    n_replicates_reached.attrs.get("n_replicates", 0)
+                    + self.n_replicates
+                )
+
+        self._replicate_summaries = {}
+
     def add_to_zarr_root_group(self, name: str):
         if name not in self._zarr_root_group:
             self._zarr_root_group.create_group(name)
@@ -207,9 +389,21 @@ class ZarrManager:
     def append_synchronized_timestep(
         self, timestep_idx: int, timestep_array_dict: Dict[str, np.ndarray]
     ) -> None:
+        """
+        Write one timestep of each attribute - (x, y) arrays, or
+        (replicate, x, y) arrays when writing several replicates at once.
+        """
         for attribute_name, timestep_array in timestep_array_dict.items():
+            timestep_array = np.reshape(
+                timestep_array, (self.n_replicates, self.width, self.height)
+            )
             sim_array = self._get_or_create_attribute_dataset(attribute_name)
-            sim_array[self.replicate_idx, timestep_idx] = timestep_array
+            sim_array[self._replicate_slice, timestep_idx] = timestep_array
+
+            if self._has_encoding(attribute_name):
+                self._update_replicate_summaries(
+                    attribute_name, timestep_idx, timestep_array
+                )
 
     def consolidate_metadata(self):
         zarr.consolidate_metadata(self._zarr_store)
@@ -1,9 +1,106 @@
+import weakref
+
 import xyzservices
 import ipyleaflet
+import mesa_geo as mg
+import numpy as np
 import solara
+from folium.utilities import image_to_url
 from mesa.visualization.utils import update_counter
 from mesa_geo.visualization.components.geospace_component import MapModule
 
+from vegetation.config.life_stages import LIFE_STAGE_RGB_VIZ_MAP
+from vegetation.space.veg_cell import VegCell
+
+# Elevation (m) mapped to full brightness in the background grayscale
+MAX_VIZ_ELEVATION = 5000
+
+# Side length (in cells) of the image tiles the raster overlay is split into
+DEFAULT_OVERLAY_TILE_SIZE = 32
+
+
+def _rgba_to_uint8(rgba):
+    r, g, b, alpha = rgba
+    return (r, g, b, int(round(alpha * 255)))
+
+
+class LifeStageRasterRenderer:
+    """
+    Colors VegCells by the furthest life stage of any Joshua Tree agent within
+    the cell, falling back to refugia status / elevation for empty cells.
+
+    Calling the renderer on a single cell gives the same (r, g, b, a) tuple as a
+    mesa-geo portrayal method, but `render_rgba` builds the whole image in a
+    few array operations - the static background (elevation and refugia) is
+    computed once per raster layer, and each frame is a lookup table index of
+    the `jotr_max_life_stage` raster.
+    """
+
+    def __init__(self, life_stage_rgba_map=LIFE_STAGE_RGB_VIZ_MAP):
+        self.life_stage_rgba_map = life_stage_rgba_map
+
+        self.life_stage_lut = np.zeros((max(life_stage_rgba_map) + 1, 4), np.uint8)
+        for life_stage, rgba in life_stage_rgba_map.items():
+            self.life_stage_lut[life_stage] = _rgba_to_uint8(rgba)
+
+        self._background_cache = weakref.WeakKeyDictionary()
+
+    def __call__(self, cell):
+        if not isinstance(cell, VegCell):
+            return None
+
+        if cell.jotr_max_life_stage and cell.jotr_max_life_stage > 0:
+            return self.life_stage_rgba_map[cell.jotr_max_life_stage]
+
+        if not cell.refugia_status:
+            normalized_elevation = int((cell.elevation / MAX_VIZ_ELEVATION) * 255)
+            return (
+                normalized_elevation,
+                normalized_elevation,
+                normalized_elevation,
+                0.25,
+            )
+
+        return (0, 255, 0, 1)
+
+    @staticmethod
+    def render_background(elevation, refugia_status):
+        """(height, width, 4) uint8 image of empty cells from static rasters."""
+        normalized_elevation = np.clip(
+            elevation / MAX_VIZ_ELEVATION * 255, 0, 255
+        ).astype(np.uint8)
+
+        background = np.empty((*elevation.shape, 4), dtype=np.uint8)
+        background[..., :3] = normalized_elevation[..., np.newaxis]
+        background[..., 3] = _rgba_to_uint8((0, 0, 0, 0.25))[3]
+        background[refugia_status.astype(bool)] = _rgba_to_uint8((0, 255, 0, 1))
+        return background
+
+    def render_array(self, background, max_life_stage):
+        """Color occupied cells by life stage over a precomputed background."""
+        occupied = max_life_stage > 0
+        life_stage_idx = np.where(occupied, max_life_stage, 0)
+        return np.where(
+            occupied[..., np.newaxis], self.life_stage_lut[life_stage_idx], background
+        )
+
+    def get_background(self, raster_layer):
+        """Background image of a raster layer, rendered on first use."""
+        background = self._background_cache.get(raster_layer)
+        if background is None:
+            background = self.render_background(
+                raster_layer.get_raster("elevation")[0],
+                raster_layer.get_raster("refugia_status")[0],
+            )
+            self._background_cache[raster_layer] = background
+        return background
+
+    def render_rgba(self, raster_layer, model):
+        return self.render_array(
+            self.get_background(raster_layer),
+            model.space.get_max_life_stage_raster(),
+        )
+
 
 def make_simple_raster_geospace_component(
     agent_portrayal,
@@ -17,12 +114,112 @@ def make_simple_raster_geospace_component(
     return MakeSpaceMatplotlib
 
 
+class RasterTileCache:
+    """
+    Splits each raster layer into square tiles of cells and keeps the overlay
+    last drawn for each, along with the raster values it was drawn from. Each
+    frame compares the new values with the previous ones, and only tiles
+    containing changed cells are colored, reprojected and encoded - so the
+    work per frame grows with how much changed, not with the size of the AOI.
+    Unchanged tiles keep their previous URL, so the map only receives image
+    data for the dirty tiles.
+    """
+
+    def __init__(self, tile_size=DEFAULT_OVERLAY_TILE_SIZE):
+        self.tile_size = tile_size
+        self.n_dirty_tiles = 0
+        self._layer_states = {}
+
+    def _get_dirty_tiles(self, previous_values, values):
+        height, width = values.shape
+        n_tile_rows = -(-height // self.tile_size)
+        n_tile_cols = -(-width // self.tile_size)
+
+        if previous_values is None:
+            return np.ones((n_tile_rows, n_tile_cols), dtype=bool)
+
+        dirty_cells = np.zeros(
+            (n_tile_rows * self.tile_size, n_tile_cols * self.tile_size), dtype=bool
+        )
+        dirty_cells[:height, :width] = values != previous_values
+
+        return dirty_cells.reshape(
+            n_tile_rows, self.tile_size, n_tile_cols, self.tile_size
+        ).any(axis=(1, 3))
+
+    def get_tiles(self, layer_key, values, total_bounds, render_tile, static_key=None):
+        """
+        Return [{"key", "url", "bounds"}] for every tile of `values`, a (height,
+        width) raster covering `total_bounds` ([min_x, min_y, max_x, max_y] in
+        its CRS). Only tiles containing changed values are drawn, by calling
+        `render_tile(rows, cols, tile_bounds)` with the tile's slices of the
+        raster and its bounds, which returns the tile's {"url", "bounds"}.
+
+        `static_key` identifies anything else the tiles are drawn from (e.g. a
+        background image) - all tiles are redrawn when it changes.
+        """
+        total_bounds = [float(bound) for bound in total_bounds]
+        state = self._layer_states.get(layer_key)
+        if (
+            state is None
+            or state["values"].shape != values.shape
+            or state["total_bounds"] != total_bounds
+            or state["static_key"] != static_key
+        ):
+            state = {
+                "values": None,
+                "tiles": {},
+                "total_bounds": total_bounds,
+                "static_key": static_key,
+            }
+            self._layer_states[layer_key] = state
+
+        height, width = values.shape
+        min_x, min_y, max_x, max_y = total_bounds
+        x_resolution = (max_x - min_x) / width
+        y_resolution = (max_y - min_y) / height
+
+        dirty_tiles = self._get_dirty_tiles(state["values"], values)
+        self.n_dirty_tiles = int(dirty_tiles.sum())
+
+        for tile_row, tile_col in zip(*np.nonzero(dirty_tiles)):
+            row_start = tile_row * self.tile_size
+            row_end = min(row_start + self.tile_size, height)
+            col_start = tile_col * self.tile_size
+            col_end = min(col_start + self.tile_size, width)
+
+            tile_bounds = [
+                min_x + col_start * x_resolution,
+                max_y - row_end * y_resolution,
+                min_x + col_end * x_resolution,
+                max_y - row_start * y_resolution,
+            ]
+            state["tiles"][(tile_row, tile_col)] = {
+                "key": f"{layer_key}-{tile_row}-{tile_col}",
+                **render_tile(
+                    slice(row_start, row_end), slice(col_start, col_end), tile_bounds
+                ),
+            }
+
+        # Copied, as the caller may update its raster in place
+        state["values"] = values.copy()
+        return [state["tiles"][tile_idx] for tile_idx in sorted(state["tiles"])]
+
+
 class RasterOnlyMapModule(MapModule):
     """
     Subclassing MapModule so we don't render agents at all, just the raster layers
     (which have aggregated agent info already)
+
+    If a `RasterTileCache` is provided (and the portrayal can render whole
+    arrays), each raster is returned as tiles, only redrawing those with changed
+    cells.
     """
 
+    def __init__(self, portrayal_method, tiles, tile_cache=None):
+        super().__init__(portrayal_method=portrayal_method, tiles=tiles)
+        self.tile_cache = tile_cache
+
     def render(self, model):
         return {
             "layers": self._render_layers(model),
@@ -32,6 +229,118 @@ class RasterOnlyMapModule(MapModule):
             ],
         }
 
+    def _render_layers(self, model):
+        if not hasattr(self.portrayal_method, "render_array"):
+            return super()._render_layers(model)
+
+        layers = {"rasters": [], "vectors": [], "total_bounds": []}
+        rendered_layer_ids = set()
+
+        for layer in model.space.layers:
+            # The same raster layer can be registered more than once (e.g. after
+            # adding refugia status), but only needs to be drawn once
+            if not isinstance(layer, mg.RasterLayer) or id(layer) in rendered_layer_ids:
+                continue
+            rendered_layer_ids.add(id(layer))
+
+            layers["rasters"].extend(
+                _render_raster_overlays(
+                    renderer=self.portrayal_method,
+                    background=self.portrayal_method.get_background(layer),
+                    max_life_stage=model.space.get_max_life_stage_raster(),
+                    crs=layer.crs,
+                    total_bounds=layer.total_bounds,
+                    map_crs=self._crs,
+                    tile_cache=self.tile_cache,
+                    layer_key=len(rendered_layer_ids),
+                )
+            )
+
+        return layers
+
+
+def _render_raster_overlays(
+    renderer,
+    background,
+    max_life_stage,
+    crs,
+    total_bounds,
+    map_crs,
+    tile_cache=None,
+    layer_key=0,
+):
+    """
+    Overlay dicts of the `max_life_stage` raster colored over `background`,
+    reprojected to the map CRS - as a single image, or as tiles of which only
+    those with changed cells are redrawn if a `tile_cache` is given.
+    """
+    if tile_cache is None:
+        return [
+            _reproject_overlay(
+                renderer.render_array(background, max_life_stage),
+                crs,
+                total_bounds,
+                map_crs,
+            )
+        ]
+
+    def render_tile(rows, cols, tile_bounds):
+        return _reproject_overlay(
+            renderer.render_array(background[rows, cols], max_life_stage[rows, cols]),
+            crs,
+            tile_bounds,
+            map_crs,
+        )
+
+    return tile_cache.get_tiles(
+        layer_key=layer_key,
+        values=max_life_stage,
+        total_bounds=total_bounds,
+        render_tile=render_tile,
+        static_key=id(background),
+    )
+
+
+def _reproject_overlay(rgba, crs, total_bounds, map_crs):
+    """Reproject a (height, width, 4) image to the map CRS as an overlay dict."""
+    image_layer = mg.ImageLayer(
+        values=np.moveaxis(rgba, -1, 0),
+        crs=crs,
+        total_bounds=total_bounds,
+    ).to_crs(map_crs)
+    image_rgba = np.moveaxis(image_layer.values, 0, -1).astype(np.uint8)
+
+    return {
+        "url": image_to_url(image_rgba),
+        # longlat [min_x, min_y, max_x, max_y] to latlong [[min_y, min_x], [max_y, max_x]]
+        "bounds": [
+            [image_layer.total_bounds[1], image_layer.total_bounds[0]],
+            [image_layer.total_bounds[3], image_layer.total_bounds[2]],
+        ],
+    }
+
+
+def _image_overlay_elements(rasters):
+    elements = []
+    for layer in rasters:
+        if "key" in layer:
+            # Keyed elements let the unchanged tiles keep their widgets, so only
+            # the urls of dirty tiles are sent to the frontend
+            elements.append(
+                ipyleaflet.ImageOverlay.element(
+                    url=layer["url"],
+                    bounds=layer["bounds"],
+                ).key(layer["key"])
+            )
+        else:
+            elements.append(
+                ipyleaflet.ImageOverlay(
+                    url=layer["url"],
+                    bounds=layer["bounds"],
+                )
+            )
+    return elements
+
 
 @solara.component
 def RasterOnlyGeoSpaceLeaflet(model, agent_portrayal, view, tiles, **kwargs):
@@ -42,7 +351,13 @@ def RasterOnlyGeoSpaceLeaflet(model, agent_portrayal, view, tiles, **kwargs):
     the visualization run much faster.
     """
     update_counter.get()
-    map_drawer = RasterOnlyMapModule(portrayal_method=agent_portrayal, tiles=tiles)
+
+    # The tile cache persists across renders of this component, so each step
+    # only pushes image data for tiles that changed since the last frame
+    tile_cache = solara.use_memo(RasterTileCache, dependencies=[])
+    map_drawer = RasterOnlyMapModule(
+        portrayal_method=agent_portrayal, tiles=tiles, tile_cache=tile_cache
+    )
     model_view = map_drawer.render(model)
 
     if view is None:
@@ -59,13 +374,7 @@ def RasterOnlyGeoSpaceLeaflet(model, agent_portrayal, view, tiles, **kwargs):
     layers = (
         [ipyleaflet.TileLayer.element(url=map_drawer.tiles["url"])] if tiles else []
     )
-    for layer in model_view["layers"]["rasters"]:
-        layers.append(
-            ipyleaflet.ImageOverlay(
-                url=layer["url"],
-                bounds=layer["bounds"],
-            )
-        )
+    layers.extend(_image_overlay_elements(model_view["layers"]["rasters"]))
     for layer in model_view["layers"]["vectors"]:
         layers.append(ipyleaflet.GeoJSON(element=layer))
     ipyleaflet.Map.element(
@@ -77,3 +386,52 @@ def RasterOnlyGeoSpaceLeaflet(model, agent_portrayal, view, tiles, **kwargs):
         ],
         **kwargs,
     )
+
+
+@solara.component
+def SnapshotRasterLeaflet(
+    snapshot,
+    renderer,
+    view=None,
+    tiles=xyzservices.providers.OpenStreetMap.Mapnik,
+    **kwargs,
+):
+    """
+    Raster map of a `SimulationSnapshot` rather than a live model, so the map
+    can be redrawn while the simulation keeps stepping on another thread.
+    """
+    tile_cache = solara.use_memo(RasterTileCache, dependencies=[])
+    map_drawer = solara.use_memo(
+        lambda: RasterOnlyMapModule(portrayal_method=renderer, tiles=tiles),
+        dependencies=[renderer],
+    )
+
+    # Elevation and refugia arrays are shared between snapshots, so the
+    # background only needs rendering once per simulation
+    background = solara.use_memo(
+        lambda: renderer.render_background(snapshot.elevation, snapshot.refugia_status),
+        dependencies=[id(snapshot.elevation), id(snapshot.refugia_status)],
+    )
+    rasters = _render_raster_overlays(
+        renderer=renderer,
+        background=background,
+        max_life_stage=snapshot.max_life_stage,
+        crs=snapshot.crs,
+        total_bounds=snapshot.total_bounds,
+        map_crs=map_drawer._crs,
+        tile_cache=tile_cache,
+    )
+
+    if view is None:
+        # latlong [[min_y, min_x], [max_y, max_x]] of the overlay tiles
+        min_lat = min(raster["bounds"][0][0] for raster in rasters)
+        max_lat = max(raster["bounds"][1][0] for raster in rasters)
+        min_lon = min(raster["bounds"][0][1] for raster in rasters)
+        max_lon = max(raster["bounds"][1][1] for raster in rasters)
+        view = [(min_lat + max_lat) / 2, (min_lon + max_lon) / 2]
+
+    layers = (
+        [ipyleaflet.TileLayer.element(url=map_drawer.tiles["url"])] if tiles else []
+    )
+    layers.extend(_image_overlay_elements(rasters))
+    ipyleaflet.Map.element(center=view, layers=layers, **kwargs)
@@ -0,0 +1,186 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array = np.array(array, copy=True)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class SimulationSnapshot:
+    """
+    Immutable view of the model after a step, safe to read from the UI thread
+    while the simulation keeps stepping. Static rasters (elevation, refugia)
+    are shared between snapshots rather than copied every step.
+    """
+
+    step: int
+    running: bool
+    max_life_stage: np.ndarray
+    elevation: np.ndarray
+    refugia_status: np.ndarray
+    crs: Any
+    total_bounds: Tuple[float, float, float, float]
+    model_vars: Tuple[Dict[str, Any], ...] = field(default_factory=tuple)
+
+
+class BackgroundSimulationRunner:
+    """
+    Steps a model on a worker thread and publishes a `SimulationSnapshot` after
+    every step, so a UI can render the latest snapshot at its own frame rate
+    (skipping any it was too slow to draw) without blocking on the model.
+
+    Anything that mutates the model from outside (e.g. management draws) must
+    go through `submit`, which runs it on the worker thread between steps.
+    """
+
+    def __init__(self, model, on_start: Optional[Callable[[Any], None]] = None):
+        self.model = model
+        self.on_start = on_start
+        self.error = None
+
+        self._condition = threading.Condition()
+        self._playing = False
+        self._steps_requested = 0
+        self._stopped = False
+        self._pending_actions = []
+        self._subscribers = []
+
+        self._model_vars = []
+        self._static_rasters = None
+        self._latest_snapshot = None
+        self._thread = None
+
+    @property
+    def latest_snapshot(self) -> Optional[SimulationSnapshot]:
+        return self._latest_snapshot
+
+    @property
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="simulation-runner", daemon=True
+            )
+            self._thread.start()
+
+    def play(self):
+        with self._condition:
+            self._playing = True
+            self._condition.notify()
+
+    def pause(self):
+        with self._condition:
+            self._playing = False
+            self._steps_requested = 0
+
+    def step(self, n_steps: int = 1):
+        with self._condition:
+            self._steps_requested += n_steps
+            self._condition.notify()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, action: Callable[[Any], None]):
+        """Run `action(model)` on the simulation thread before the next step."""
+        with self._condition:
+            self._pending_actions.append(action)
+            self._condition.notify()
+
+    def subscribe(self, callback: Callable[[SimulationSnapshot], None]):
+        """Call `callback(snapshot)` (on the simulation thread) after each step."""
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def _run(self):
+        try:
+            if self.on_start is not None:
+                self.on_start(self.model)
+            if not self.model._on_start_executed:
+                self.model._on_start()
+            self._publish_snapshot()
+
+            while True:
+                with self._condition:
+                    while not (
+                        self._stopped
+                        or self._pending_actions
+                        or self._steps_requested > 0
+                        or (self._playing and self.model.running)
+                    ):
+                        self._condition.wait()
+
+                    if self._stopped:
+                        return
+
+                    pending_actions, self._pending_actions = self._pending_actions, []
+                    should_step = self.model.running and (
+                        self._playing or self._steps_requested > 0
+                    )
+                    if should_step and self._steps_requested > 0:
+                        self._steps_requested -= 1
+
+                for action in pending_actions:
+                    action(self.model)
+
+                if should_step:
+                    self.model.step()
+                    self._collect_model_vars()
+
+                if should_step or pending_actions:
+                    self._publish_snapshot()
+
+                if not self.model.running:
+                    with self._condition:
+                        self._playing = False
+                        self._steps_requested = 0
+
+        except Exception as e:
+            logging.exception("Simulation runner stopped after an error")
+            self.error = e
+            self._playing = False
+
+    def _collect_model_vars(self):
+        model_vars = self.model.datacollector.model_vars
+        self._model_vars.append(
+            {"Step": self.model.steps}
+            | {reporter: values[-1] for reporter, values in model_vars.items()}
+        )
+
+    def _publish_snapshot(self):
+        space = self.model.space
+
+        if self._static_rasters is None:
+            self._static_rasters = (
+                _read_only(space.raster_layer.get_raster("elevation")[0]),
+                _read_only(space.raster_layer.get_raster("refugia_status")[0]),
+            )
+        elevation, refugia_status = self._static_rasters
+
+        snapshot = SimulationSnapshot(
+            step=self.model.steps,
+            running=self.model.running,
+            max_life_stage=_read_only(space.get_max_life_stage_raster()),
+            elevation=elevation,
+            refugia_status=refugia_status,
+            crs=space.raster_layer.crs,
+            total_bounds=tuple(space.raster_layer.total_bounds),
+            model_vars=tuple(self._model_vars),
+        )
+        self._latest_snapshot = snapshot
+
+        for callback in list(self._subscribers):
+            callback(snapshot)